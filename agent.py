@@ -1,8 +1,9 @@
 from dotenv import load_dotenv
 import os
 import re
+import sys
 from typing import AsyncIterable
-from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
+from prompts import AGENT_INSTRUCTION, session_instruction
 from livekit import agents, rtc
 from livekit.agents import (
     AgentSession,
@@ -18,19 +19,35 @@ from livekit.agents import (
     AgentStateChangedEvent,
     FunctionToolsExecutedEvent,
     ConversationItemAddedEvent,
+    StopResponse,
+    llm,
 )
-from livekit.plugins import (
-    cartesia,
-    groq,
-    noise_cancellation,
-    silero,
-)
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from livekit.plugins.turn_detector.multilingual import MultilingualModel  # noqa: F401  (registers download-files)
 import logging
-import signal
-import sys
 import asyncio
+import time
+from functools import partial
 from tools import open_url, navigate_to_section, get_product_info
+from backchannel import BACKCHANNEL_STATS, AgentSpeech, asked_question, classify
+from leaked_calls import LEAK_STATS, LeakedCall, LeakedCallFilter, argument_models
+from providers import PROVIDER_STATS, HedgedLLM, build_llm, build_stt, build_tts
+from session_store import get_session_store
+from dispatch import AGENT_NAME, read_metadata, start_timing
+from room_pool import WARM_ROOM_MAX_IDLE
+from drain import (
+    AGENT_DRAIN_TIMEOUT, drain_aware_load, install_drain_marker, wait_for_worker_drain,
+    write_pid_file,
+)
+from session_density import SHARED_PROCESS, track_session, worker_options
+from session_recorder import SessionRecorder
+from startup_profile import current_rss_mb
+from turn_service import TURN_SERVICE_ENABLED, install_worker_service, make_turn_detector
+
+if SHARED_PROCESS:
+    # Jobs run on threads of this process and plugins only register on the
+    # main thread, so load the job-side plugins now. In process mode they
+    # are left to preload.py: the worker process itself never needs them.
+    import preload  # noqa: F401
 
 # Set up logging
 logging.basicConfig(
@@ -39,21 +56,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global variable to track if shutdown is requested
-shutdown_requested = False
-
-
-def signal_handler(signum, frame):
-    """Handle shutdown signals gracefully"""
-    global shutdown_requested
-    logger.info(f"Received signal {signum}. Initiating graceful shutdown...")
-    shutdown_requested = True
-    sys.exit(0)
-
-
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+# Shutdown signals are handled by the LiveKit CLI: on SIGTERM the worker
+# drains (stops accepting jobs, waits up to AGENT_DRAIN_TIMEOUT for live
+# conversations to end) before exiting. Job processes ignore SIGTERM, so no
+# handler is installed here — it would run in every job process and cut
+# conversations short.
 
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
@@ -112,50 +119,177 @@ async def _strip_function_calls(text: AsyncIterable[str]) -> AsyncIterable[str]:
             yield cleaned
 
 
+def _leaked_tool_calls(calls: list[LeakedCall]) -> list[llm.FunctionToolCall]:
+    return [
+        llm.FunctionToolCall(
+            name=c.name, arguments=c.arguments, call_id=agents.utils.shortuuid("leaked_"))
+        for c in calls
+    ]
+
+
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self, llm_chain: HedgedLLM, language: str = "en",
+        recorder: SessionRecorder | None = None,
+    ) -> None:
         logger.info(
             "Initializing Assistant agent with tools: [open_url, navigate_to_section, get_product_info]")
         super().__init__(
             instructions=AGENT_INSTRUCTION,
             tools=[open_url, navigate_to_section, get_product_info],
         )
+        self._llm_chain = llm_chain
+        self._language = language
+        self._recorder = recorder or SessionRecorder(None)
+        self.suppressed_turns = 0
+        self.recovered_calls = 0
+        # Checked against on every turn, so built once rather than per reply
+        self._argument_models = argument_models(
+            [t for t in self.tools if isinstance(t, llm.FunctionTool)])
+        # Fed from agent_state_changed, to tell talk-over from replies
+        self.agent_speech = AgentSpeech()
         logger.info("Assistant agent initialized successfully")
 
     async def on_user_turn_completed(
         self, turn_ctx: ChatContext, new_message: ChatMessage,
     ) -> None:
-        """Prune old conversation messages to keep context window bounded."""
+        """Prune old conversation messages to keep context window bounded,
+        and drop backchannel/filler turns before they reach the LLM."""
         turn_ctx.truncate(max_items=MAX_HISTORY_ITEMS)
 
+        last_agent = next(
+            (item for item in reversed(turn_ctx.items)
+             if getattr(item, "role", None) == "assistant"), None)
+        metrics = new_message.metrics
+        duration = None
+        if "started_speaking_at" in metrics and "stopped_speaking_at" in metrics:
+            duration = metrics["stopped_speaking_at"] - metrics["started_speaking_at"]
+        text = new_message.text_content or ""
+        self._recorder.user_turn(text, dict(metrics))
+        decision = classify(
+            text, self._language,
+            agent_asked_question=asked_question(
+                last_agent.text_content if last_agent else None, self._language),
+            speech_duration=duration,
+            overlapped_agent=self.agent_speech.overlapped(
+                metrics.get("started_speaking_at"), metrics.get("stopped_speaking_at")),
+        )
+        BACKCHANNEL_STATS["turns"] += 1
+        if not decision.suppress:
+            return
+        if last_agent is not None and last_agent.interrupted:
+            # The agent was cut off mid-sentence; only the LLM can pick the
+            # thought back up
+            BACKCHANNEL_STATS["kept_after_interruption"] += 1
+            return
+
+        BACKCHANNEL_STATS["llm_calls_avoided"] += 1
+        BACKCHANNEL_STATS[decision.label] += 1
+        self.suppressed_turns += 1
+        logger.info(f"[BACKCHANNEL] Ignoring {decision.label} turn {text!r} ({decision.reason})")
+        raise StopResponse()
+
+    async def llm_node(
+        self, chat_ctx: ChatContext, tools: list[llm.Tool], model_settings: ModelSettings,
+    ) -> AsyncIterable[llm.ChatChunk]:
+        """Race the per-language model chain, hedging when the primary is slow.
+
+        Tool calls the model leaks into its text are turned back into real
+        tool calls, so the session runs them instead of dropping them.
+        """
+        recoverable = {}
+        if model_settings.tool_choice != "none":
+            offered = {t.info.name for t in tools if isinstance(t, llm.FunctionTool)}
+            recoverable = {
+                name: model for name, model in self._argument_models.items() if name in offered}
+        leaks = LeakedCallFilter(recoverable)
+        recovered: list[str] = []
+        chunk_id = "leaked"
+        async for chunk in self._recorder.record_llm(self._llm_chain.stream(
+            chat_ctx, tools, model_settings.tool_choice
+        )):
+            chunk_id = chunk.id
+            if chunk.delta is not None and chunk.delta.content:
+                text, calls = leaks.feed(chunk.delta.content)
+                recovered += [c.name for c in calls]
+                chunk = chunk.model_copy(update={"delta": chunk.delta.model_copy(update={
+                    "content": text or None,
+                    "tool_calls": chunk.delta.tool_calls + _leaked_tool_calls(calls),
+                })})
+            yield chunk
+
+        text, calls = leaks.close()
+        recovered += [c.name for c in calls]
+        if text or calls:
+            yield llm.ChatChunk(id=chunk_id, delta=llm.ChoiceDelta(
+                role="assistant", content=text or None, tool_calls=_leaked_tool_calls(calls)))
+        self.recovered_calls += len(recovered)
+        if leaks.leaked:
+            logger.info(f"[LEAK] Function-call markup in LLM text, recovered calls: {recovered}")
+
     async def tts_node(
         self, text: AsyncIterable[str], model_settings: ModelSettings,
     ) -> AsyncIterable[rtc.AudioFrame]:
-        """Strip leaked function-call syntax before sending text to TTS."""
+        """Strip leaked function-call syntax before sending text to TTS.
+
+        llm_node already takes leaked calls out of the text; this catches
+        whatever reaches TTS another way.
+        """
         async for frame in Agent.default.tts_node(
             self, _strip_function_calls(text), model_settings
         ):
             yield frame
 
 
-async def entrypoint(ctx: agents.JobContext):
-    global shutdown_requested
+def prewarm(proc: agents.JobProcess):
+    """Attach the preloaded VAD to each job process before it takes a job."""
+    started = time.perf_counter()
+    # A no-op import under forkserver, where preload.py already ran pre-fork
+    import preload
+    proc.userdata["vad"] = preload.VAD
+    logger.info(
+        f"[STARTUP] Job process prewarmed in {time.perf_counter() - started:.3f}s "
+        f"(VAD load {preload.VAD_LOAD_SECONDS:.3f}s, RSS {current_rss_mb():.0f} MB)")
 
+
+async def entrypoint(ctx: agents.JobContext):
     logger.info("Starting agent entrypoint")
     logger.info(f"Job context: {ctx}")
 
+    # Under explicit dispatch the token carried the session settings here
+    metadata = read_metadata(ctx.job.metadata)
+    timing = start_timing(metadata)
+    # Pre-warmed by the token server's room pool: no visitor until one is
+    # handed this room
+    warm = bool(metadata.get("warm"))
+    visitor_arrived = asyncio.Event()
+    if not warm:
+        visitor_arrived.set()
+
     try:
-        # Wait for participant to connect and read their language attribute
         await ctx.connect()
+        timing.mark("connected")
         logger.info("Connected to context successfully")
 
-        # Get language from the first remote participant's attributes
-        language = "en"
-        for p in ctx.room.remote_participants.values():
-            lang_attr = p.attributes.get("language", "en")
-            if lang_attr in LANGUAGE_CONFIG:
-                language = lang_attr
-            break
+        # How long the visitor waited in the room for the agent
+        def on_visitor(participant: rtc.RemoteParticipant) -> None:
+            timing.joined(ctx.room.local_participant, participant)
+
+        visitor = next(iter(ctx.room.remote_participants.values()), None)
+        if visitor is not None:
+            on_visitor(visitor)
+        else:
+            ctx.room.once("participant_connected", on_visitor)
+
+        language = metadata.get("language", "en")
+        if not metadata:
+            # Automatic dispatch: get language from the first remote participant's attributes
+            for p in ctx.room.remote_participants.values():
+                lang_attr = p.attributes.get("language", "en")
+                if lang_attr in LANGUAGE_CONFIG:
+                    language = lang_attr
+                timing.set_issued_at(p.attributes.get("issued_at"))
+                break
 
         # If no remote participant yet, also check local participant
         if language == "en" and ctx.room.local_participant:
@@ -168,21 +302,21 @@ async def entrypoint(ctx: agents.JobContext):
         logger.info(
             f"Language detected: {language}, STT: {config['stt_lang']}, TTS voice: {config['tts_voice']}")
 
+        # Provider chains are configured per language in providers.py:
+        # the LLM is hedged in Assistant.llm_node, STT/TTS fail over.
+        vad = ctx.proc.userdata.get("vad")
+        if vad is None:
+            from livekit.plugins import silero
+            vad = silero.VAD.load()
+        llm_chain = build_llm(language)
+
         session = AgentSession(
-            stt=cartesia.STT(model="ink-whisper", language=config["stt_lang"]),
-            llm=groq.LLM(
-                model="llama-3.3-70b-versatile",
-                temperature=0.6,
-                parallel_tool_calls=False,
-            ),
-            tts=cartesia.TTS(
-                model="sonic-3",
-                voice=config["tts_voice"],
-                language=config["tts_lang"],
-            ),
-            vad=silero.VAD.load(),
+            stt=build_stt(language, config["stt_lang"], vad),
+            llm=llm_chain.primary,
+            tts=build_tts(language, config["tts_voice"], config["tts_lang"]),
+            vad=vad,
             turn_handling=TurnHandlingOptions(
-                turn_detection=MultilingualModel(),
+                turn_detection=make_turn_detector(),
                 interruption=InterruptionOptions(
                     enabled=True,
                     mode="adaptive",
@@ -194,12 +328,63 @@ async def entrypoint(ctx: agents.JobContext):
             ),
             # 5.4 — Emit "away" state after 30s of user silence
             user_away_timeout=30.0,
+            # Read by tools, e.g. to narrate pages in the session language
+            userdata={
+                "language": language,
+                "campaign": metadata.get("campaign"),
+                "page": metadata.get("page"),
+            },
         )
 
+        # Opt-in capture for offline replay (RECORD_SESSIONS=1)
+        recorder = SessionRecorder.for_job(ctx.job.id)
+        recorder.event(
+            "meta", language=language, room=ctx.room.name,
+            models=[m.model for m in llm_chain.llms], hedge_after=llm_chain.hedge_after,
+            max_history_items=MAX_HISTORY_ITEMS, instructions=AGENT_INSTRUCTION)
+        ctx.add_shutdown_callback(recorder.aclose)
+        agent = Assistant(llm_chain, language, recorder)
+        logger.info("Assistant agent created")
+
         # ── Session Event Listeners for observability ──
 
+        # Analytics records are buffered and written off the event loop.
+        store = get_session_store()
+        record = partial(
+            store.record, ctx.job.id, room=ctx.room.name, language=language)
+        if not SHARED_PROCESS:
+            # The job process exits with this session; in shared mode the
+            # store outlives it and is flushed at exit
+            ctx.add_shutdown_callback(store.aclose)
+        track_session(ctx, record)
+
+        def on_llm_metrics(metrics):
+            # Subscribed per model so hedged secondaries are counted too
+            if getattr(metrics, "type", None) != "llm_metrics":
+                return
+            record(
+                "llm_usage",
+                prompt_tokens=metrics.prompt_tokens,
+                completion_tokens=metrics.completion_tokens,
+                payload={
+                    "model": metrics.metadata.model_name if metrics.metadata else None,
+                    "request_id": metrics.request_id,
+                    "speech_id": metrics.speech_id,
+                    "ttft": metrics.ttft,
+                    "duration": metrics.duration,
+                    "cached_tokens": metrics.prompt_cached_tokens,
+                    "cancelled": metrics.cancelled,
+                },
+            )
+
+        for model in llm_chain.llms:
+            model.on("metrics_collected", on_llm_metrics)
+
+        session_closed = asyncio.Event()
+
         @session.on("close")
         def on_session_close(ev=None):
+            session_closed.set()
             # 5.10 — Log session close reason and usage metrics
             reason = getattr(ev, "reason", "unknown") if ev else "unknown"
             error = getattr(ev, "error", None) if ev else None
@@ -210,6 +395,19 @@ async def entrypoint(ctx: agents.JobContext):
             if usage and usage.model_usage:
                 for mu in usage.model_usage:
                     logger.info(f"[USAGE] Session totals: {mu}")
+                record("session_usage", payload={
+                    "reason": str(reason),
+                    "error": str(error) if error else None,
+                    "model_usage": [mu.model_dump() for mu in usage.model_usage],
+                    "suppressed_turns": agent.suppressed_turns,
+                    "recovered_calls": agent.recovered_calls,
+                })
+            if PROVIDER_STATS:
+                logger.info(f"[PROVIDER] Process totals: {dict(PROVIDER_STATS)}")
+            if BACKCHANNEL_STATS:
+                logger.info(f"[BACKCHANNEL] Process totals: {dict(BACKCHANNEL_STATS)}")
+            if LEAK_STATS["leaked_responses"]:
+                logger.info(f"[LEAK] Process totals: {dict(LEAK_STATS)}")
 
         @session.on("conversation_item_added")
         def on_conversation_item(ev: ConversationItemAddedEvent):
@@ -218,16 +416,30 @@ async def entrypoint(ctx: agents.JobContext):
             text = getattr(item, "text_content", None)
             if role is not None:
                 logger.info(f"[CONVERSATION] {role}: {text}")
+                metrics = dict(getattr(item, "metrics", None) or {})
+                record("message", role=role, text=text,
+                       payload={"metrics": metrics} if metrics else None)
+                if role == "assistant":
+                    recorder.event("agent_message", text=text,
+                                   interrupted=item.interrupted, metrics=metrics)
 
         @session.on("agent_state_changed")
         def on_agent_state(ev: AgentStateChangedEvent):
             logger.info(f"[STATE] Agent: {ev.old_state} → {ev.new_state}")
+            recorder.event("state", who="agent", state=ev.new_state, at=ev.created_at)
+            agent.agent_speech.update(ev.new_state, ev.created_at)
+            if ev.new_state == "speaking" and timing.first_audio is None:
+                timing.mark("first_audio")
+                since_issue = timing.since_issue()
+                logger.info(f"[DISPATCH] Seconds since token issue: {since_issue}")
+                record("dispatch_timing", payload=since_issue)
 
         @session.on("user_state_changed")
         def on_user_state(ev: UserStateChangedEvent):
             logger.info(f"[STATE] User: {ev.old_state} → {ev.new_state}")
+            recorder.event("state", who="user", state=ev.new_state)
             # 5.4 — Prompt idle users before they ghost
-            if ev.new_state == "away":
+            if ev.new_state == "away" and visitor_arrived.is_set():
                 asyncio.ensure_future(
                     session.generate_reply(
                         instructions="The user has been silent for a while. Ask if they're still there or need any help."
@@ -239,19 +451,33 @@ async def entrypoint(ctx: agents.JobContext):
             for call, output in ev.zipped():
                 logger.info(
                     f"[TOOL] {call.name}({call.arguments}) → {output.output if output else 'None'}")
+                record(
+                    "tool_call",
+                    tool_name=call.name,
+                    payload={
+                        "arguments": call.arguments,
+                        "output": output.output if output else None,
+                        "is_error": output.is_error if output else None,
+                    },
+                )
+                recorder.event(
+                    "tool_call", name=call.name, arguments=call.arguments,
+                    output=output.output if output else None,
+                    is_error=output.is_error if output else None)
 
         @session.on("user_input_transcribed")
         def on_transcription(ev):
             if ev.is_final:
                 logger.info(f"[STT] Final: {ev.transcript}")
+                recorder.event("transcript", text=ev.transcript)
 
         logger.info(
-            f"AgentSession created with Cartesia STT ({config['stt_lang']}) + Groq LLM (llama-3.3-70b-versatile) + Cartesia TTS (sonic-3) pipeline")
-
-        agent = Assistant()
-        logger.info("Assistant agent created")
+            f"AgentSession created with STT ({config['stt_lang']}) + Groq LLM chain "
+            f"{[m.model for m in llm_chain.llms]} (hedge after {llm_chain.hedge_after}s) + Cartesia TTS pipeline")
 
         logger.info("Starting session with room and agent")
+        from livekit.plugins import noise_cancellation
+
         await session.start(
             room=ctx.room,
             agent=agent,
@@ -265,16 +491,39 @@ async def entrypoint(ctx: agents.JobContext):
             ),
         )
         logger.info("Session started successfully")
+        await recorder.start_audio(session)
+
+        if warm:
+            logger.info("[POOL] Warm room ready, waiting for a visitor")
+            joined = asyncio.ensure_future(ctx.wait_for_participant())
+            drained = asyncio.ensure_future(wait_for_worker_drain())
+            await asyncio.wait({joined, drained}, timeout=WARM_ROOM_MAX_IDLE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            drained.cancel()
+            if not joined.done():
+                # Leaving takes the agent out of the room, so the token
+                # server no longer leases it
+                joined.cancel()
+                reason = "worker draining" if drained.done() else "warm room unused"
+                logger.info(f"[POOL] No visitor was handed this room; leaving ({reason})")
+                ctx.shutdown(reason=reason)
+                return
+            visitor = joined.result()
+            timing.leased(visitor.attributes.get("issued_at"))
+            session.userdata["campaign"] = visitor.attributes.get("campaign")
+            session.userdata["page"] = visitor.attributes.get("page")
+            visitor_arrived.set()
+            logger.info(f"[POOL] Visitor {visitor.identity} joined warm room {ctx.room.name}")
 
         logger.info("Generating initial reply with session instructions")
         await session.generate_reply(
-            instructions=SESSION_INSTRUCTION,
+            instructions=session_instruction(),
         )
         logger.info("Initial reply generated successfully")
 
-        # Keep the session alive until shutdown is requested
-        while not shutdown_requested:
-            await asyncio.sleep(1)
+        # Keep the job alive until the conversation ends; during a drain the
+        # worker waits for this before exiting
+        await session_closed.wait()
 
     except Exception as e:
         logger.error(f"Error in agent entrypoint: {e}")
@@ -284,9 +533,25 @@ async def entrypoint(ctx: agents.JobContext):
 
 
 if __name__ == "__main__":
+    write_pid_file("agent")
+    install_drain_marker()
+    if TURN_SERVICE_ENABLED and "download-files" not in sys.argv:
+        # One batched end-of-turn model for all sessions on this worker
+        install_worker_service()
+    options = worker_options()
     agents.cli.run_app(
         agents.WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Imported once in the forkserver and shared copy-on-write
+            preload_modules=["preload"],
             port=8081,  # Explicitly set port 8081 for web agent
+            # Dispatched by the tokens web_agnet_server.py mints; empty for automatic dispatch
+            agent_name=AGENT_NAME,
+            drain_timeout=AGENT_DRAIN_TIMEOUT,
+            # Also tells idle warm-room jobs when the worker drains
+            load_fnc=drain_aware_load(options.pop("load_fnc", None)),
+            # AGENT_EXECUTOR=thread hosts several sessions per process
+            **options,
         )
     )
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Local backchannel and filler detection for finished user turns.
+
+Assistant.on_user_turn_completed asks `classify` about every final
+transcript. Turns that are only acknowledgements ("mm-hmm", "d'accord",
+"تمام") or hesitation sounds ("um", "euh", "يعني") are dropped there, before
+any LLM request is made. Only acknowledgements said while the agent was
+talking are dropped; these signals keep real answers through:
+
+- an acknowledgement after the agent asked a question or made an offer
+  ("Want me to show you? It has the full picture." - "yeah") is an answer;
+- an acknowledgement given once the agent had finished speaking is a reply
+  (`AgentSpeech` keeps the timing);
+- anything transcribed as a question ("Really?") is a question;
+- a long stretch of speech that transcribed to a single "ok" probably lost
+  words in STT, so it is passed on.
+
+    python backchannel.py eval   # accuracy on backchannel_corpus.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backchannel_corpus.jsonl")
+
+# Process-wide counters: turns seen, llm_calls_avoided, per label, and
+# kept_after_interruption (would have been dropped, but the agent was cut off)
+BACKCHANNEL_STATS: Counter[str] = Counter()
+
+# Longer speech than this is never treated as a backchannel
+MAX_BACKCHANNEL_SECONDS = 2.0
+MAX_PHRASE_WORDS = 3
+
+# Phrases are written normalized (see _normalize): lowercase, no punctuation,
+# Arabic without diacritics and with a bare alef.
+BACKCHANNELS: dict[str, set[str]] = {
+    "en": {
+        "mm hmm", "mhm", "mm", "uh huh", "uh hu", "yeah", "yea", "yep", "yup", "ya",
+        "yes", "ok", "okay", "k", "right", "alright", "all right", "sure", "i see",
+        "got it", "cool", "nice", "great", "oh", "ah", "wow", "true", "exactly",
+        "totally", "fine", "good", "i know", "makes sense", "oh really", "really",
+    },
+    "ar": {
+        "نعم", "ايوه", "ايوا", "اه", "ايه", "طيب", "تمام", "اوكي", "اوك", "صح", "صحيح",
+        "ماشي", "حسنا", "اكيد", "فهمت", "والله", "يب", "جميل", "ممتاز", "عظيم",
+        "زين", "حلو", "مم",
+    },
+    "fr": {
+        "oui", "ouais", "ok", "d accord", "dac", "ah", "oh", "ah oui", "ah bon", "je vois",
+        "c est ca", "voila", "exactement", "super", "bien", "tres bien", "mouais",
+        "hum hum", "mm", "carrement", "bon", "parfait", "genial", "entendu", "ok d accord",
+    },
+}
+
+FILLERS: dict[str, set[str]] = {
+    "en": {"um", "umm", "uh", "uhh", "uhm", "er", "erm", "hmm", "hm", "ehm", "mmm", "so", "well"},
+    "ar": {"امم", "ام", "يعني", "ممم", "اا", "هممم", "همم", "اممم"},
+    "fr": {"euh", "euuh", "heu", "hum", "bah", "ben", "eh", "mmm"},
+}
+
+# Words that answer a yes/no question; after one, they are a real turn
+ANSWERS: dict[str, set[str]] = {
+    "en": {"yes", "yeah", "yea", "yep", "yup", "ya", "sure", "ok", "okay", "k", "alright",
+           "all right", "right", "fine", "good", "great", "cool", "exactly"},
+    "ar": {"نعم", "ايوه", "ايوا", "اه", "ايه", "طيب", "تمام", "اوكي", "اوك", "ماشي",
+           "اكيد", "حسنا", "يب", "زين"},
+    "fr": {"oui", "ouais", "ok", "d accord", "dac", "bien", "tres bien", "parfait",
+           "entendu", "ok d accord", "carrement", "exactement", "super", "bon"},
+}
+
+# The agent is asking when one of its last sentences has a question mark or
+# one of these offers in it
+QUESTION_SENTENCES = 2
+OFFERS: dict[str, set[str]] = {
+    "en": {"want me to", "would you like", "do you want", "shall i", "should i", "if you like",
+           "if you want", "if you d like", "let me know", "i can show you", "i can take you",
+           "happy to show", "how about"},
+    "ar": {"هل تريد", "هل تحب", "تحب", "تبي", "تريد", "اذا حبيت", "اذا تحب", "اذا اردت",
+           "اذا تريد", "ممكن اوريك", "اقدر اوريك", "ممكن اخذك", "اقدر اخذك", "ما رايك"},
+    "fr": {"voulez vous", "vous voulez", "souhaitez vous", "si vous voulez", "si vous le souhaitez",
+           "je peux vous", "ca vous dit", "tu veux", "aimeriez vous", "que diriez vous"},
+}
+
+_ARABIC_DIACRITICS = re.compile(r"[\u064B-\u0652\u0670\u0640]")
+_ALEF = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي", "ة": "ه"})
+_NON_WORD = re.compile(r"[^\w\s]|_")
+_SENTENCE_END = re.compile(r"(?<=[.!?؟…])\s+")
+_QUESTION_MARKS = ("?", "؟")
+
+
+@dataclass
+class Decision:
+    label: str  # "backchannel", "filler" or "content"
+    reason: str
+
+    @property
+    def suppress(self) -> bool:
+        return self.label != "content"
+
+
+def _normalize(text: str) -> list[str]:
+    text = _ARABIC_DIACRITICS.sub("", text.lower()).translate(_ALEF)
+    # Drop Latin accents so "très" and "tres" match
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).split()
+
+
+def _match(words: list[str], phrases: set[str]) -> list[str] | None:
+    """Split words into lexicon phrases (longest first), or None if any word is left over."""
+    found, i = [], 0
+    while i < len(words):
+        for n in range(min(MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+            phrase = " ".join(words[i:i + n])
+            if phrase in phrases:
+                found.append(phrase)
+                i += n
+                break
+        else:
+            return None
+    return found
+
+
+def _lexicon(table: dict[str, set[str]], language: str) -> set[str]:
+    # English acknowledgements ("ok", "yeah") turn up in every language
+    return table.get(language, set()) | table["en"]
+
+
+def asked_question(agent_text: str | None, language: str = "en") -> bool:
+    """Whether the agent's last sentences ask something or offer to do something."""
+    if not agent_text:
+        return False
+    sentences = _SENTENCE_END.split(agent_text.strip())[-QUESTION_SENTENCES:]
+    if any(mark in s for s in sentences for mark in _QUESTION_MARKS):
+        return True
+    words = f" {' '.join(_normalize(' '.join(sentences)))} "
+    return any(f" {offer} " in words for offer in _lexicon(OFFERS, language))
+
+
+class AgentSpeech:
+    """When the agent last spoke, fed from the session's agent_state_changed events."""
+
+    def __init__(self) -> None:
+        self.speaking_since: float | None = None
+        # The last finished stretch of speech
+        self.spoke_from: float | None = None
+        self.stopped_at: float | None = None
+
+    def update(self, state: str, at: float | None = None) -> None:
+        at = at if at is not None else time.time()
+        if state == "speaking":
+            if self.speaking_since is None:
+                self.speaking_since = at
+        elif self.speaking_since is not None:
+            self.spoke_from, self.stopped_at = self.speaking_since, at
+            self.speaking_since = None
+
+    def overlapped(self, started_at: float | None, stopped_at: float | None) -> bool | None:
+        """Whether the agent spoke while the user did (wall-clock times), None if unknown."""
+        if started_at is None or stopped_at is None:
+            return None
+        if self.speaking_since is not None:
+            if self.speaking_since <= stopped_at:
+                return True
+            # The reply to this turn has already started; judge the speech before it
+        if self.stopped_at is None:
+            return None
+        return self.spoke_from <= stopped_at and self.stopped_at > started_at
+
+
+def classify(
+    text: str,
+    language: str = "en",
+    *,
+    agent_asked_question: bool = False,
+    speech_duration: float | None = None,
+    overlapped_agent: bool | None = None,
+) -> Decision:
+    words = _normalize(text)
+    if not words:
+        return Decision("filler", "empty transcript")
+    if text.rstrip().endswith(_QUESTION_MARKS):
+        return Decision("content", "asks a question")
+    if speech_duration is not None and speech_duration > MAX_BACKCHANNEL_SECONDS:
+        return Decision("content", f"spoke for {speech_duration:.1f}s")
+
+    fillers = _lexicon(FILLERS, language)
+    phrases = _match(words, _lexicon(BACKCHANNELS, language) | fillers)
+    if phrases is None:
+        return Decision("content", "has content words")
+    if all(p in fillers for p in phrases):
+        return Decision("filler", "only hesitation sounds")
+    if agent_asked_question and any(p in _lexicon(ANSWERS, language) for p in phrases):
+        return Decision("content", "answers the agent's question")
+    if overlapped_agent is False:
+        return Decision("content", "replied after the agent finished")
+    return Decision("backchannel", "only acknowledgements")
+
+
+# ── Corpus evaluation ──
+
+
+def evaluate(path: str = CORPUS_PATH, verbose: bool = False) -> float:
+    confusion: Counter[tuple[str, str, str]] = Counter()
+    misses = []
+    with open(path, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    for case in cases:
+        decision = classify(
+            case["text"], case["language"],
+            agent_asked_question=asked_question(case.get("agent"), case["language"]),
+            speech_duration=case.get("duration"),
+            overlapped_agent=case.get("overlap"))
+        # Only the drop/keep outcome matters to the agent
+        expected = case["label"] != "content"
+        confusion[(case["language"], str(expected), str(decision.suppress))] += 1
+        if decision.suppress != expected:
+            misses.append((case, decision))
+
+    correct = sum(n for (_, exp, got), n in confusion.items() if exp == got)
+    print(f"{'lang':<6}{'cases':>7}{'accuracy':>10}{'dropped real turns':>20}{'missed backchannels':>21}")
+    for lang in sorted({k[0] for k in confusion}):
+        rows = {(e, g): n for (l, e, g), n in confusion.items() if l == lang}
+        total = sum(rows.values())
+        ok = rows.get(("True", "True"), 0) + rows.get(("False", "False"), 0)
+        print(f"{lang:<6}{total:>7}{ok / total:>10.1%}{rows.get(('False', 'True'), 0):>20}"
+              f"{rows.get(('True', 'False'), 0):>21}")
+    accuracy = correct / len(cases)
+    print(f"{'all':<6}{len(cases):>7}{accuracy:>10.1%}")
+    if verbose:
+        for case, decision in misses:
+            print(f"  MISS [{case['language']}] {case['text']!r} expected {case['label']}, "
+                  f"got {decision.label} ({decision.reason})")
+    return accuracy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backchannel and filler classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ev = sub.add_parser("eval", help="accuracy on the labelled corpus")
+    ev.add_argument("--corpus", default=CORPUS_PATH)
+    ev.add_argument("-v", "--verbose", action="store_true", help="list misclassified cases")
+    ev.add_argument("--min-accuracy", type=float, default=0.95)
+    args = parser.parse_args()
+    accuracy = evaluate(args.corpus, args.verbose)
+    raise SystemExit(0 if accuracy >= args.min_accuracy else 1)
+
+
+if __name__ == "__main__":
+    main()
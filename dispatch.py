@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Explicit agent dispatch, shared by the token server and the agent worker.
+
+With AGENT_NAME set (the default), the worker registers under that name
+and LiveKit no longer dispatches it to every new room automatically.
+Instead, each token minted by /getToken carries a room configuration that
+dispatches the agent, and the dispatch metadata holds the visitor's
+session settings:
+
+    {"language": "fr", "campaign": "spring-launch", "page": "/pricing", "issued_at": ...}
+
+The agent therefore knows the language in `ctx.job.metadata` before it
+connects, and does not have to wait for the visitor's participant
+attributes. Setting AGENT_NAME= (empty) in both processes' environment
+switches back to automatic dispatch. The same settings are also participant
+attributes on the token, which is where the agent reads them under
+automatic dispatch and in rooms warmed by room_pool.py.
+
+Every session stores a `dispatch_timing` record with the time from token
+issue (the visitor connects right after fetching it) to the job starting,
+to the agent joining the room, and to the agent's first audio. In a warm
+room the agent was there before the token, so only first audio is timed.
+It also holds the time from the visitor joining the room to the agent
+joining and to first audio. Both join times are stamped by the LiveKit
+server. The agent-join delay is negative when the agent was there first, as
+in warm rooms.
+
+    python dispatch.py report   # join and first-audio latency per mode
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+AGENT_NAME = os.getenv("AGENT_NAME", "autonomiq-web-agent")
+EXPLICIT_DISPATCH = bool(AGENT_NAME)
+
+LANGUAGES = ("en", "ar", "fr")
+# Campaign and page come straight from the query string
+MAX_FIELD_CHARS = 200
+
+
+def session_metadata(language: str, campaign: str | None = None, page: str | None = None) -> dict[str, Any]:
+    """Per-session settings minted into the token, stamped with the issue time."""
+    return {
+        "language": language if language in LANGUAGES else "en",
+        "campaign": (campaign or "")[:MAX_FIELD_CHARS] or None,
+        "page": (page or "")[:MAX_FIELD_CHARS] or None,
+        "issued_at": round(time.time(), 3),
+    }
+
+
+def read_metadata(raw: str | None) -> dict[str, Any]:
+    """Parse dispatch metadata; an empty dict under automatic dispatch or if malformed."""
+    if not raw:
+        return {}
+    try:
+        metadata = json.loads(raw)
+    except ValueError:
+        logger.warning(f"[DISPATCH] Ignoring malformed job metadata: {raw[:100]!r}")
+        return {}
+    if not isinstance(metadata, dict):
+        return {}
+    if metadata.get("language") not in LANGUAGES:
+        metadata.pop("language", None)
+    return metadata
+
+
+@dataclass
+class DispatchTiming:
+    """Wall-clock time of each step of the agent joining a visitor's room."""
+
+    mode: str
+    issued_at: float | None = None
+    job_started: float | None = None
+    connected: float | None = None
+    first_audio: float | None = None
+    # Server-side join times of the visitor and the agent
+    visitor_joined: float | None = None
+    agent_joined: float | None = None
+
+    def mark(self, step: str) -> None:
+        if getattr(self, step) is None:
+            setattr(self, step, time.time())
+
+    def set_issued_at(self, value: Any) -> None:
+        try:
+            self.issued_at = float(value)
+        except (TypeError, ValueError):
+            pass
+
+    def joined(self, agent: Any, visitor: Any) -> None:
+        """Take the join times of the agent and the visitor (rtc.Participant) once both are in."""
+        if self.visitor_joined is not None or visitor.joined_at is None:
+            return
+        self.visitor_joined = visitor.joined_at.timestamp()
+        # Our own clock if the server did not stamp the agent
+        self.agent_joined = agent.joined_at.timestamp() if agent.joined_at else self.connected
+
+    def leased(self, issued_at: Any) -> None:
+        """The visitor was handed a warm room; time from their token only."""
+        self.mode = "warm"
+        self.job_started = self.connected = None
+        self.set_issued_at(issued_at)
+
+    def since_issue(self) -> dict[str, Any]:
+        """Seconds from token issue to each step, and from the visitor joining
+        to the agent joining and first audio, as stored in `dispatch_timing`."""
+        def delta(start: float | None, t: float | None) -> float | None:
+            if t is None or start is None:
+                return None
+            return round(t - start, 3)
+
+        return {
+            "mode": self.mode,
+            "job_started": delta(self.issued_at, self.job_started),
+            "connected": delta(self.issued_at, self.connected),
+            "first_audio": delta(self.issued_at, self.first_audio),
+            "visitor_to_agent": delta(self.visitor_joined, self.agent_joined),
+            "visitor_to_audio": delta(self.visitor_joined, self.first_audio),
+        }
+
+
+def start_timing(metadata: dict[str, Any]) -> DispatchTiming:
+    """Begin timing a job; call at the top of the entrypoint."""
+    timing = DispatchTiming("explicit" if EXPLICIT_DISPATCH else "automatic")
+    timing.set_issued_at(metadata.get("issued_at"))
+    timing.mark("job_started")
+    return timing
+
+
+# ── Report ──
+
+
+def _percentiles(values: list[float]) -> tuple[str, str]:
+    if not values:
+        return "-", "-"
+    values = sorted(values)
+    p50 = values[len(values) // 2]
+    p95 = values[min(int(len(values) * 0.95), len(values) - 1)]
+    return f"{p50 * 1000:.0f}ms", f"{p95 * 1000:.0f}ms"
+
+
+def report(db_path: str, hours: float | None) -> None:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    since = time.time() - hours * 3600 if hours else 0.0
+    by_mode: dict[str, list[dict]] = {}
+    for (payload,) in conn.execute(
+            "SELECT payload FROM events WHERE kind = 'dispatch_timing' AND ts >= ?", (since,)):
+        timing = json.loads(payload)
+        by_mode.setdefault(timing["mode"], []).append(timing)
+    if not by_mode:
+        print("No dispatch_timing records yet; run sessions with and without AGENT_NAME or ROOM_POOL")
+        return
+
+    steps = ("job_started", "connected", "first_audio", "visitor_to_agent", "visitor_to_audio")
+    print(f"{'mode':<11}{'sessions':>9}" + "".join(f"{s + ' p50':>22}{'p95':>9}" for s in steps))
+    for mode, timings in sorted(by_mode.items()):
+        row = f"{mode:<11}{len(timings):>9}"
+        for step in steps:
+            p50, p95 = _percentiles([t[step] for t in timings if t.get(step) is not None])
+            row += f"{p50:>22}{p95:>9}"
+        print(row)
+    print("Times are from token issue, which the visitor connects right after, except"
+          " visitor_to_*: from the visitor joining the room, by the server's clock.")
+
+
+def main() -> None:
+    from session_store import DEFAULT_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Agent dispatch latency")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="join and first-audio latency per mode")
+    rep.add_argument("--db", default=DEFAULT_DB_PATH)
+    rep.add_argument("--hours", type=float, default=None, help="only the last N hours")
+    args = parser.parse_args()
+    report(args.db, args.hours)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+PID files and drain settings shared by the agent worker, the token server
+and shutdown_agent.py.
+
+Each long-running process writes `<RUN_DIR>/<name>.pid` on startup so the
+shutdown controller can signal exactly that process instead of matching
+process names.
+
+Jobs are not told when their worker starts draining. The agent worker
+therefore leaves a marker file once it drains (see `drain_aware_load`), and
+jobs with nothing to finish, such as idle warm rooms, wait on it with
+`wait_for_worker_drain` and leave instead of holding the drain open.
+"""
+import asyncio
+import atexit
+import logging
+import os
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+RUN_DIR = os.getenv(
+    "WEB_AGENT_RUN_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "run"),
+)
+
+# How long in-flight conversations may continue after SIGTERM.
+# Keep systemd's TimeoutStopSec above this value.
+AGENT_DRAIN_TIMEOUT = int(os.getenv("AGENT_DRAIN_TIMEOUT", "600"))
+
+# The token server only has short requests in flight; after this many seconds
+# of refusing new tokens it exits.
+TOKEN_SERVER_DRAIN_GRACE = float(os.getenv("TOKEN_SERVER_DRAIN_GRACE", "5"))
+
+# Set in the worker's environment so its jobs find its drain marker
+DRAIN_MARKER_ENV = "AGENT_DRAIN_MARKER"
+DRAIN_POLL_INTERVAL = 1.0
+
+# Script each PID file is expected to belong to, used to detect stale files
+# whose PID has been reused by an unrelated process.
+PROCESS_SCRIPTS: dict[str, str] = {
+    "agent": "agent.py",
+    "server": "web_agnet_server.py",
+}
+
+
+def pid_file(name: str) -> str:
+    return os.path.join(RUN_DIR, f"{name}.pid")
+
+
+def write_pid_file(name: str) -> str:
+    """Record this process's PID and remove the file again on exit."""
+    os.makedirs(RUN_DIR, exist_ok=True)
+    path = pid_file(name)
+    pid = os.getpid()
+    with open(path, "w") as f:
+        f.write(str(pid))
+
+    def _remove() -> None:
+        # Only remove the file if it still points at this process
+        if read_pid_file(name) == pid:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    atexit.register(_remove)
+    logger.info(f"Wrote PID file {path} (pid={pid})")
+    return path
+
+
+def read_pid_file(name: str) -> int | None:
+    try:
+        with open(pid_file(name)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def drain_marker() -> str:
+    """This worker's drain marker: inherited by job processes, else per worker PID."""
+    return os.getenv(DRAIN_MARKER_ENV) or os.path.join(RUN_DIR, f"agent-{os.getpid()}.draining")
+
+
+def _remove_marker(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def install_drain_marker() -> str:
+    """Called once in the worker process, before any job process starts."""
+    path = drain_marker()
+    os.makedirs(RUN_DIR, exist_ok=True)
+    # Left over from a worker that was killed with the same PID
+    _remove_marker(path)
+    os.environ[DRAIN_MARKER_ENV] = path
+    atexit.register(_remove_marker, path)
+    return path
+
+
+def drain_aware_load(load_fnc: Callable[[Any], float] | None = None) -> Callable[[Any], float]:
+    """Wrap the worker's load function to write the drain marker once it drains.
+
+    The worker keeps calling it every half second while it drains; it is the
+    one hook that sees the worker's state. The load itself comes from
+    load_fnc, or from the framework's default (averaged, cgroup-aware CPU).
+    """
+    from livekit.agents.worker import _DefaultLoadCalc
+
+    load_fnc = load_fnc or _DefaultLoadCalc.get_load
+    marked = False
+
+    def load(worker: Any) -> float:
+        nonlocal marked
+        if worker.draining and not marked:
+            marked = True
+            with open(drain_marker(), "w") as f:
+                f.write(str(os.getpid()))
+            logger.info("[DRAIN] Worker draining, told idle jobs to leave")
+        return load_fnc(worker)
+
+    return load
+
+
+def worker_draining() -> bool:
+    return os.path.exists(drain_marker())
+
+
+async def wait_for_worker_drain() -> None:
+    """Return once the worker hosting this job starts draining."""
+    while not worker_draining():
+        await asyncio.sleep(DRAIN_POLL_INTERVAL)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Recovery of tool calls that Llama models leak into their text output.
+
+llama-3.3-70b on Groq sometimes writes a tool call as text, e.g.
+
+    Sure, let me show you. <function=navigate_to_section>{"section": "pricing"}</function>
+
+or in Llama 3's own <|python_tag|>{"name": ..., "parameters": ...} form,
+instead of returning it as a tool call. Assistant.llm_node runs the text
+stream through a `LeakedCallFilter`, which cuts the markup out of what is
+spoken and hands back the calls it could parse. Calls to a registered tool
+whose arguments match that tool's parameters are turned into real tool
+calls, so the session executes them and the reply continues from the
+result. Anything else is dropped, as before.
+
+    python leaked_calls.py eval   # check the filter on leaked_calls_corpus.jsonl
+"""
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+import pydantic
+from livekit.agents import llm
+from livekit.agents.llm.utils import function_arguments_to_pydantic_model
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaked_calls_corpus.jsonl")
+
+# Process-wide counters: responses, leaked_responses, recovered_calls,
+# rejected_calls (unknown tool, or arguments that do not fit its parameters),
+# special_tokens
+LEAK_STATS: Counter[str] = Counter()
+
+# Markup held back longer than this is given up on and dropped
+MAX_HELD_CHARS = 2000
+
+_OPEN = "<function"
+_CLOSE = "</function>"
+# The model writes "<function=name>", and now and then "<function/name>" or
+# "<function name("
+_OPEN_RE = re.compile(r"<function\s*[=/ ]\s*(\w+)")
+_SPECIAL_TOKEN_RE = re.compile(r"<\|[^<>]*?\|>")
+_PYTHON_TAG = "<|python_tag|>"
+_JSON = json.JSONDecoder()
+
+
+@dataclass
+class LeakedCall:
+    name: str
+    arguments: str  # JSON object
+
+
+class _Incomplete(Exception):
+    """The held markup needs more text before it can be parsed."""
+
+
+def _skip(buf: str, pos: int, chars: str) -> int:
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+def _parse_call(buf: str, final: bool) -> tuple[int, str | None, dict | None]:
+    """Parse the markup at the start of buf into (end, name, arguments).
+
+    name and arguments are None when the markup is not a usable call.
+    Raises _Incomplete when more text could still complete it.
+    """
+    match = _OPEN_RE.match(buf)
+    if match is None or (match.end() == len(buf) and not final):
+        if not final and len(buf) < len(_OPEN) + 2:
+            raise _Incomplete
+        # Not a call we can read: drop it up to its closing tag, if any
+        close = buf.find(_CLOSE)
+        if close < 0 and not final:
+            raise _Incomplete
+        return (close + len(_CLOSE) if close >= 0 else len(buf)), None, None
+
+    name = match.group(1)
+    pos = _skip(buf, match.end(), " \n>(")
+    arguments: dict | None = {}
+    if pos < len(buf) and buf[pos] != "<":
+        try:
+            arguments, pos = _JSON.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            close = buf.find(_CLOSE, pos)
+            if close < 0 and not final:
+                raise _Incomplete
+            return (close + len(_CLOSE) if close >= 0 else len(buf)), name, None
+    elif pos == len(buf) and not final:
+        raise _Incomplete
+
+    pos = _skip(buf, pos, " \n)>/")
+    rest = buf[pos:]
+    if rest.startswith(_CLOSE):
+        pos += len(_CLOSE)
+    elif _CLOSE.startswith(rest) and not final:
+        # Wait for the closing tag, or for proof that there is none
+        raise _Incomplete
+    elif rest.startswith("</"):
+        # A mangled closing tag such as "</function_call>"
+        end = rest.find(">")
+        if end < 0 and not final:
+            raise _Incomplete
+        pos = pos + end + 1 if end >= 0 else len(buf)
+    return pos, name, arguments if isinstance(arguments, dict) else None
+
+
+def _parse_python_tag(buf: str, pos: int, final: bool) -> tuple[int, str | None, dict | None]:
+    """Parse Llama 3's built-in call format, <|python_tag|>{"name": ..., "parameters": {...}}.
+
+    name is None when no call object follows the tag.
+    """
+    pos = _skip(buf, pos, " \n")
+    if pos == len(buf) and not final:
+        raise _Incomplete
+    if pos == len(buf) or buf[pos] != "{":
+        return pos, None, None
+    try:
+        call, end = _JSON.raw_decode(buf, pos)
+    except json.JSONDecodeError:
+        if not final:
+            raise _Incomplete
+        return len(buf), "", None
+    if not isinstance(call, dict) or not isinstance(call.get("name"), str):
+        return end, "", None
+    arguments = call.get("parameters", call.get("arguments", {}))
+    return end, call["name"], arguments if isinstance(arguments, dict) else None
+
+
+def argument_models(tools: list[llm.FunctionTool]) -> dict[str, type[pydantic.BaseModel]]:
+    """Argument models leaked calls are checked against, by tool name.
+
+    Creating a pydantic model per tool costs far more than filtering a reply,
+    so build these once per tool list and share them between filters.
+    """
+    return {t.info.name: function_arguments_to_pydantic_model(t) for t in tools}
+
+
+class LeakedCallFilter:
+    """Streaming filter that separates speakable text from leaked call markup."""
+
+    def __init__(self, arguments: dict[str, type[pydantic.BaseModel]]) -> None:
+        # From argument_models(); only these tools can be recovered
+        self._arguments = arguments
+        self.leaked = False
+        self._buf = ""
+
+    def feed(self, text: str) -> tuple[str, list[LeakedCall]]:
+        """Add a text chunk; return the text that is safe to speak and any finished calls."""
+        self._buf += text
+        return self._drain(final=False)
+
+    def close(self) -> tuple[str, list[LeakedCall]]:
+        """End of stream: resolve whatever is still held back."""
+        text, calls = self._drain(final=True)
+        LEAK_STATS["responses"] += 1
+        if self.leaked:
+            LEAK_STATS["leaked_responses"] += 1
+        return text, calls
+
+    def _drain(self, final: bool) -> tuple[str, list[LeakedCall]]:
+        out: list[str] = []
+        calls: list[LeakedCall] = []
+        buf = self._buf
+        while buf:
+            idx = buf.find("<")
+            if idx < 0:
+                out.append(buf)
+                buf = ""
+                break
+            out.append(buf[:idx])
+            buf = buf[idx:]
+
+            if buf.startswith("<|"):
+                token = _SPECIAL_TOKEN_RE.match(buf)
+                if token is None and not final and len(buf) < MAX_HELD_CHARS:
+                    break
+                if token is not None and token.group() == _PYTHON_TAG:
+                    try:
+                        end, name, arguments = _parse_python_tag(
+                            buf, token.end(), final or len(buf) >= MAX_HELD_CHARS)
+                    except _Incomplete:
+                        break
+                    if name is not None:
+                        self.leaked = True
+                        buf = buf[end:]
+                        self._accept(name, arguments, calls)
+                        continue
+                self.leaked = True
+                LEAK_STATS["special_tokens"] += 1
+                buf = buf[token.end():] if token else ""
+                continue
+            if buf.startswith(_CLOSE):
+                # A stray closing tag
+                self.leaked = True
+                buf = buf[len(_CLOSE):]
+                continue
+            if _CLOSE.startswith(buf) and not final:
+                break
+            if not (buf.startswith(_OPEN) or _OPEN.startswith(buf)):
+                # An ordinary "<" in the text
+                out.append("<")
+                buf = buf[1:]
+                continue
+
+            try:
+                end, name, arguments = _parse_call(buf, final or len(buf) >= MAX_HELD_CHARS)
+            except _Incomplete:
+                break
+            if name is None and not buf.startswith(_OPEN):
+                # A lone "<f..." at the end of the stream was just text
+                out.append(buf)
+                buf = ""
+                break
+            self.leaked = True
+            buf = buf[end:]
+            self._accept(name, arguments, calls)
+
+        self._buf = buf
+        return "".join(out), calls
+
+    def _accept(self, name: str | None, arguments: dict | None, calls: list[LeakedCall]) -> None:
+        if self._valid(name, arguments):
+            LEAK_STATS["recovered_calls"] += 1
+            calls.append(LeakedCall(name, json.dumps(arguments, ensure_ascii=False)))
+        else:
+            LEAK_STATS["rejected_calls"] += 1
+
+    def _valid(self, name: str | None, arguments: dict | None) -> bool:
+        model = self._arguments.get(name)
+        if model is None or arguments is None:
+            return False
+        # A parameter the tool does not take means the model confused its tools
+        if not arguments.keys() <= model.model_fields.keys():
+            return False
+        try:
+            model.model_validate(arguments)
+        except pydantic.ValidationError:
+            return False
+        return True
+
+
+# ── Corpus evaluation ──
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def evaluate(path: str = CORPUS_PATH, verbose: bool = False) -> bool:
+    """Each sample is a chunked stream with the calls and spoken text it should yield."""
+    with open(path, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    from tools import get_product_info, navigate_to_section, open_url
+
+    arguments = argument_models([open_url, navigate_to_section, get_product_info])
+    failures = 0
+    before = LEAK_STATS.copy()
+    for case in cases:
+        leak_filter = LeakedCallFilter(arguments)
+        spoken, calls = [], []
+        for chunk in case["chunks"]:
+            text, found = leak_filter.feed(chunk)
+            spoken.append(text)
+            calls.extend(found)
+        text, found = leak_filter.close()
+        spoken.append(text)
+        calls.extend(found)
+
+        got_calls = [[c.name, json.loads(c.arguments)] for c in calls]
+        got_text = _normalize_text("".join(spoken))
+        ok = got_calls == case["calls"] and got_text == _normalize_text(case["text"])
+        failures += not ok
+        if verbose or not ok:
+            print(f"{'ok  ' if ok else 'FAIL'} {case['note']}")
+            if not ok:
+                print(f"     calls {got_calls} expected {case['calls']}")
+                print(f"     text  {got_text!r} expected {case['text']!r}")
+
+    stats = LEAK_STATS - before
+    print(f"{len(cases) - failures}/{len(cases)} samples handled as expected; "
+          f"{stats['leaked_responses']} leaked, {stats['recovered_calls']} calls recovered, "
+          f"{stats['rejected_calls']} rejected, {stats['special_tokens']} special tokens")
+    return failures == 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Leaked tool-call recovery")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ev = sub.add_parser("eval", help="run the filter over the captured leak samples")
+    ev.add_argument("--corpus", default=CORPUS_PATH)
+    ev.add_argument("-v", "--verbose", action="store_true", help="list every sample")
+    args = parser.parse_args()
+    raise SystemExit(0 if evaluate(args.corpus, args.verbose) else 1)
+
+
+if __name__ == "__main__":
+    main()
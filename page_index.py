@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Page-content index for post-navigation narration.
+
+`PAGES` describes what a visitor sees on each route and section of the
+website, in every session language, and is the only copy: `load_index`
+renders it once per process (preload.py does so before the job processes
+fork). At runtime only the entry for the page being navigated to is handed
+to the LLM, in the navigate_to_section result, so none of it has to ride
+along in the system prompt or in an extra tool schema.
+
+There is no built index file: rendering PAGES takes about a
+millisecond once per process, and a generated copy checked in next to it
+only drifted from the source.
+
+    python page_index.py check   # PAGES covers every tools.SECTION_MAP target
+    python page_index.py bench   # per-turn prompt tokens against the baseline
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+from functools import lru_cache
+from types import ModuleType
+
+LANGUAGES = ("en", "ar", "fr")
+
+# Keyed by route, then by section id (None = the page as a whole)
+PAGES: dict[str, dict[str | None, dict[str, dict[str, str | list[str]]]]] = {
+    "/": {
+        None: {
+            "en": {
+                "summary": "The avatar landing page: just you, full screen, and the conversation. There are no sections to scroll.",
+                "key_points": ["All content lives on separate pages", "You can take the user anywhere from here"],
+            },
+            "ar": {
+                "summary": "صفحة البداية مع الأفاتار: أنت فقط على كامل الشاشة مع المحادثة، ولا توجد أقسام للتمرير.",
+                "key_points": ["كل المحتوى موجود في صفحات منفصلة", "يمكنك أخذ المستخدم إلى أي صفحة من هنا"],
+            },
+            "fr": {
+                "summary": "La page d'accueil avec l'avatar : vous en plein écran et la conversation, sans sections à faire défiler.",
+                "key_points": ["Tout le contenu se trouve sur des pages séparées", "Vous pouvez emmener l'utilisateur partout depuis ici"],
+            },
+        },
+    },
+    "/about": {
+        None: {
+            "en": {
+                "summary": "Who Autonomiq is: the company story, its vision of AI agents working as digital employees, the mission, and what clients say.",
+                "key_points": ["Vision and mission near the top", "Why businesses choose Autonomiq", "Client testimonials further down"],
+            },
+            "ar": {
+                "summary": "من هي Autonomiq: قصة الشركة، ورؤيتها لوكلاء ذكاء اصطناعي يعملون كموظفين رقميين، والمهمة، وآراء العملاء.",
+                "key_points": ["الرؤية والمهمة في أعلى الصفحة", "لماذا تختار الشركات Autonomiq", "شهادات العملاء في الأسفل"],
+            },
+            "fr": {
+                "summary": "Qui est Autonomiq : l'histoire de l'entreprise, sa vision d'agents IA travaillant comme employés numériques, sa mission et les avis clients.",
+                "key_points": ["Vision et mission en haut de page", "Pourquoi les entreprises choisissent Autonomiq", "Témoignages clients plus bas"],
+            },
+        },
+    },
+    "/ai-assistants": {
+        None: {
+            "en": {
+                "summary": "The AI Assistants page: a featured real estate demo, the AI workforce grid, detail sections for the web and WhatsApp agents, and the industries served.",
+                "key_points": ["Telecalling, web and WhatsApp agents side by side", "Each agent card opens its details", "Industries section at the bottom"],
+            },
+            "ar": {
+                "summary": "صفحة المساعدين الأذكياء: عرض توضيحي مميز للعقارات، وشبكة فريق العمل الذكي، وأقسام تفصيلية لوكيل الويب ووكيل واتساب، والقطاعات التي نخدمها.",
+                "key_points": ["وكلاء الاتصال والويب وواتساب جنبًا إلى جنب", "كل بطاقة وكيل تفتح تفاصيله", "قسم القطاعات في الأسفل"],
+            },
+            "fr": {
+                "summary": "La page Assistants IA : une démo immobilière mise en avant, la grille de l'équipe IA, des sections détaillées sur les agents web et WhatsApp, et les secteurs servis.",
+                "key_points": ["Agents d'appel, web et WhatsApp côte à côte", "Chaque carte d'agent ouvre ses détails", "Section secteurs en bas de page"],
+            },
+        },
+        "demo": {
+            "en": {
+                "summary": "The featured real estate demo: an AI agent answering a property enquiry, qualifying the lead and booking a viewing.",
+                "key_points": ["Shows a full conversation end to end", "Lead details captured automatically"],
+            },
+            "ar": {
+                "summary": "العرض التوضيحي المميز للعقارات: وكيل ذكي يرد على استفسار عن عقار، ويؤهل العميل المحتمل ويحجز موعد معاينة.",
+                "key_points": ["يعرض محادثة كاملة من البداية للنهاية", "يتم حفظ بيانات العميل تلقائيًا"],
+            },
+            "fr": {
+                "summary": "La démo immobilière : un agent IA répond à une demande sur un bien, qualifie le prospect et réserve une visite.",
+                "key_points": ["Montre une conversation complète de bout en bout", "Les coordonnées du prospect sont saisies automatiquement"],
+            },
+        },
+        "ai-workforce": {
+            "en": {
+                "summary": "The AI workforce grid: one card each for the telecalling, web and WhatsApp agents with what they handle.",
+                "key_points": ["Compare the three agents at a glance", "Agents can be combined"],
+            },
+            "ar": {
+                "summary": "شبكة فريق العمل الذكي: بطاقة لكل من وكيل الاتصال ووكيل الويب ووكيل واتساب مع مهام كل منها.",
+                "key_points": ["قارن بين الوكلاء الثلاثة بنظرة واحدة", "يمكن الجمع بين الوكلاء"],
+            },
+            "fr": {
+                "summary": "La grille de l'équipe IA : une carte pour l'agent d'appel, l'agent web et l'agent WhatsApp, avec leurs missions.",
+                "key_points": ["Comparez les trois agents d'un coup d'œil", "Les agents peuvent être combinés"],
+            },
+        },
+        "web-agent": {
+            "en": {
+                "summary": "The web agent details: an interactive avatar, like you, that guides visitors around a website by voice or chat.",
+                "key_points": ["Navigates pages for the visitor", "Answers product questions", "Turns visitors into leads"],
+            },
+            "ar": {
+                "summary": "تفاصيل وكيل الويب: أفاتار تفاعلي مثلك يرشد الزوار في الموقع بالصوت أو الدردشة.",
+                "key_points": ["يتنقل بين الصفحات للزائر", "يجيب عن أسئلة المنتجات", "يحوّل الزوار إلى عملاء محتملين"],
+            },
+            "fr": {
+                "summary": "Les détails de l'agent web : un avatar interactif, comme vous, qui guide les visiteurs sur un site par la voix ou le chat.",
+                "key_points": ["Navigue sur les pages pour le visiteur", "Répond aux questions produits", "Transforme les visiteurs en prospects"],
+            },
+        },
+        "whatsapp-agent": {
+            "en": {
+                "summary": "The WhatsApp agent details: automated, multilingual customer conversations on WhatsApp around the clock.",
+                "key_points": ["Support, FAQs and order intake", "Updates and notifications", "Live demo icon in the bottom corner"],
+            },
+            "ar": {
+                "summary": "تفاصيل وكيل واتساب: محادثات آلية متعددة اللغات مع العملاء على واتساب على مدار الساعة.",
+                "key_points": ["الدعم والأسئلة الشائعة واستلام الطلبات", "التحديثات والإشعارات", "أيقونة العرض المباشر في الزاوية السفلية"],
+            },
+            "fr": {
+                "summary": "Les détails de l'agent WhatsApp : des conversations clients automatisées et multilingues sur WhatsApp, jour et nuit.",
+                "key_points": ["Support, FAQ et prise de commandes", "Mises à jour et notifications", "Icône de démo en direct dans le coin inférieur"],
+            },
+        },
+        "industries": {
+            "en": {
+                "summary": "The industries section: the sectors Autonomiq agents already serve, such as real estate, e-commerce, services and local businesses.",
+                "key_points": ["Examples per industry", "Ask which one matches the user's business"],
+            },
+            "ar": {
+                "summary": "قسم القطاعات: المجالات التي تخدمها وكلاء Autonomiq بالفعل مثل العقارات والتجارة الإلكترونية والخدمات والأعمال المحلية.",
+                "key_points": ["أمثلة لكل قطاع", "اسأل أي قطاع يناسب عمل المستخدم"],
+            },
+            "fr": {
+                "summary": "La section secteurs : les domaines déjà servis par les agents Autonomiq, comme l'immobilier, l'e-commerce, les services et les commerces locaux.",
+                "key_points": ["Des exemples par secteur", "Demandez lequel correspond à l'activité de l'utilisateur"],
+            },
+        },
+    },
+    "/solutions": {
+        None: {
+            "en": {
+                "summary": "The Solutions page: additional services around the agents, from custom agent builds to integrations with existing tools and workflows.",
+                "key_points": ["Custom agents for specific needs", "CRM and workflow integration", "Ongoing support and scaling"],
+            },
+            "ar": {
+                "summary": "صفحة الحلول: خدمات إضافية حول الوكلاء، من بناء وكلاء مخصصين إلى التكامل مع الأدوات وسير العمل الحالية.",
+                "key_points": ["وكلاء مخصصون لاحتياجات محددة", "التكامل مع أنظمة إدارة العملاء وسير العمل", "دعم مستمر وقابلية للتوسع"],
+            },
+            "fr": {
+                "summary": "La page Solutions : des services complémentaires autour des agents, des agents sur mesure aux intégrations avec les outils existants.",
+                "key_points": ["Agents sur mesure pour des besoins précis", "Intégration CRM et workflows", "Accompagnement et montée en charge"],
+            },
+        },
+    },
+    "/careers": {
+        None: {
+            "en": {
+                "summary": "The Careers page: what it is like to work at Autonomiq and the currently open positions.",
+                "key_points": ["Open roles listed with details", "How to apply"],
+            },
+            "ar": {
+                "summary": "صفحة الوظائف: كيف هو العمل في Autonomiq والوظائف المتاحة حاليًا.",
+                "key_points": ["الوظائف المتاحة مع التفاصيل", "طريقة التقديم"],
+            },
+            "fr": {
+                "summary": "La page Carrières : la vie chez Autonomiq et les postes actuellement ouverts.",
+                "key_points": ["Postes ouverts avec leurs détails", "Comment postuler"],
+            },
+        },
+    },
+    "/blog": {
+        None: {
+            "en": {
+                "summary": "The Blog: articles on AI agents, customer experience and automation, newest first.",
+                "key_points": ["Latest posts at the top", "Each card opens the full article"],
+            },
+            "ar": {
+                "summary": "المدونة: مقالات عن وكلاء الذكاء الاصطناعي وتجربة العملاء والأتمتة، الأحدث أولًا.",
+                "key_points": ["أحدث المقالات في الأعلى", "كل بطاقة تفتح المقال كاملًا"],
+            },
+            "fr": {
+                "summary": "Le Blog : des articles sur les agents IA, l'expérience client et l'automatisation, du plus récent au plus ancien.",
+                "key_points": ["Les derniers articles en haut", "Chaque carte ouvre l'article complet"],
+            },
+        },
+    },
+}
+
+
+def page_key(path: str, section_id: str | None) -> str:
+    return f"{path}#{section_id}" if section_id else path
+
+
+def _render(entry: dict[str, str | list[str]]) -> str:
+    points = "; ".join(str(p) for p in entry["key_points"])
+    return f"{entry['summary']} Key points: {points}."
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count (words and punctuation, ~1.3 tokens per word)."""
+    words = re.findall(r"\w+|[^\w\s]", text)
+    return round(len(words) * 1.3)
+
+
+@lru_cache(maxsize=1)
+def load_index() -> dict[str, dict[str, dict]]:
+    """Rendered notes and their token count, by page key and language."""
+    pages = {}
+    for path, sections in PAGES.items():
+        for section_id, by_lang in sections.items():
+            pages[page_key(path, section_id)] = {
+                lang: {"text": _render(entry), "tokens": count_tokens(_render(entry))}
+                for lang, entry in by_lang.items()
+            }
+    return pages
+
+
+def describe(path: str, section_id: str | None, language: str = "en") -> str:
+    """Narration notes for a page section, falling back to the whole page and English."""
+    pages = load_index()
+    entry = pages.get(page_key(path, section_id)) or pages.get(path)
+    if not entry:
+        return ""
+    return (entry.get(language) or entry["en"])["text"]
+
+
+def _validate() -> list[str]:
+    from tools import SECTION_MAP
+
+    problems = []
+    for section, (path, section_id, _) in SECTION_MAP.items():
+        if path not in PAGES or section_id not in PAGES[path]:
+            problems.append(f"section '{section}': no entry for {page_key(path, section_id)}")
+    for path, sections in PAGES.items():
+        for section_id, by_lang in sections.items():
+            for lang in LANGUAGES:
+                if lang not in by_lang:
+                    problems.append(f"{page_key(path, section_id)}: missing language '{lang}'")
+    return problems
+
+
+def _tool_schema_tokens(tools: ModuleType) -> int:
+    """Every tool the module defines; the agent registers all of them."""
+    from livekit.agents import llm
+    from livekit.agents.llm.utils import build_legacy_openai_schema
+
+    return sum(
+        count_tokens(json.dumps(build_legacy_openai_schema(t), ensure_ascii=False))
+        for t in vars(tools).values() if isinstance(t, llm.FunctionTool)
+    )
+
+
+def _git(*args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True).stdout
+
+
+def _module_at(ref: str, filename: str) -> ModuleType:
+    """Load a module as it was at a git revision."""
+    module = ModuleType(f"baseline_{filename.removesuffix('.py')}")
+    exec(compile(_git("show", f"{ref}:{filename}"), f"{ref}:{filename}", "exec"), vars(module))
+    return module
+
+
+def baseline_ref() -> str:
+    """The revision just before the page index was added."""
+    added = _git("log", "--diff-filter=A", "--format=%H", "--", "page_index.py").split()
+    return f"{added[-1]}^"
+
+
+def _bench(navigations_per_turn: float, turns_kept: int, ref: str | None) -> None:
+    import prompts
+    import tools
+
+    ref = ref or baseline_ref()
+    old_instruction = count_tokens(_module_at(ref, "prompts.py").AGENT_INSTRUCTION)
+    old_schemas = _tool_schema_tokens(_module_at(ref, "tools.py"))
+    instruction, schemas = count_tokens(prompts.AGENT_INSTRUCTION), _tool_schema_tokens(tools)
+    baseline = old_instruction + old_schemas
+    fixed = instruction + schemas
+    print("Every turn (AGENT_INSTRUCTION + tool schemas):")
+    print(f"  before the page index ({ref[:12]}): {old_instruction} + {old_schemas} = {baseline}")
+    print(f"  now: {instruction} + {schemas} = {fixed} ({fixed - baseline:+d})")
+    pages = load_index()
+    # A tool result is sent again with every turn until the history
+    # truncation drops it
+    for lang in LANGUAGES:
+        per_nav = sum(by_lang[lang]["tokens"] for by_lang in pages.values()) / len(pages)
+        notes = per_nav * navigations_per_turn * turns_kept
+        print(f"[{lang}] page notes: {per_nav:.0f} per navigation, kept for {turns_kept} turns: "
+              f"~{notes:.0f}/turn at {navigations_per_turn:.0%} of turns -> "
+              f"{fixed - baseline + notes:+.0f} tokens/turn vs baseline")
+    print("Approximate counts (words and punctuation x 1.3)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Page-content index for navigation narration")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check", help="validate PAGES against tools.SECTION_MAP")
+    bench = sub.add_parser("bench", help="per-turn prompt tokens against the baseline")
+    bench.add_argument("--navigation-rate", type=float, default=0.15,
+                       help="fraction of turns that navigate to a page")
+    bench.add_argument("--turns-kept", type=int, default=4,
+                       help="turns a tool result stays in the truncated chat history")
+    bench.add_argument("--baseline", default=None,
+                       help="git revision to compare with (default: before the page index)")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        problems = _validate()
+        if problems:
+            raise SystemExit("\n".join(problems))
+        print(f"PAGES covers every section in {len(LANGUAGES)} languages")
+    else:
+        _bench(args.navigation_rate, args.turns_kept, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
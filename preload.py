@@ -0,0 +1,31 @@
+"""
+Heavy imports and model weights shared by every job process.
+
+agent.py lists this module in `preload_modules`, so with the forkserver start
+method (Linux) it is imported once in the forkserver and every job process
+inherits the loaded modules and the Silero weights copy-on-write. Under
+spawn it is imported again in each job process by `prewarm`.
+
+These plugins are only used by jobs, so the worker process itself does not
+import them (`startup_profile.py imports` shows the split), except with
+AGENT_EXECUTOR=thread, where jobs share the worker process.
+"""
+import time
+
+# Imported for their side effects: the plugin SDKs (openai for Groq,
+# cartesia websockets, the noise-cancellation filter, onnxruntime) dominate
+# a job process's import time, and plugins must register on the main thread
+from livekit.plugins import cartesia, groq, noise_cancellation, silero  # noqa: F401
+
+import page_index
+import providers  # noqa: F401
+import session_store  # noqa: F401
+import tools  # noqa: F401
+
+# Rendered once here rather than on each job's first navigation
+page_index.load_index()
+
+_started = time.perf_counter()
+# Silero's ONNX session is single-threaded, so it is safe to create before fork
+VAD = silero.VAD.load()
+VAD_LOAD_SECONDS = time.perf_counter() - _started
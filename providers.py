@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterable, AsyncIterator, Callable
+
+from livekit.agents import APIConnectOptions, llm, stt, tts
+
+from drain import RUN_DIR
+
+# The provider plugins (groq pulls in the openai SDK) are imported in the
+# build_* functions. Only job processes call them, and preload.py has already
+# imported the plugins there, so the worker process never loads them.
+
+logger = logging.getLogger(__name__)
+
+# Per-language provider chains. The first entry of every list is the primary;
+# later entries are only used when the primary is slow (LLM hedge) or failing.
+# - llm: Groq models, raced after `hedge_after` seconds without a first token
+# - stt: Cartesia streaming STT first, Groq Whisper (VAD-segmented) as fallback
+# - tts: Cartesia models in order of preference
+PROVIDER_CONFIG: dict[str, dict[str, Any]] = {
+    "en": {
+        "llm": ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"],
+        "stt": ["cartesia/ink-whisper", "groq/whisper-large-v3-turbo"],
+        "tts": ["sonic-3", "sonic-2"],
+        "hedge_after": 1.2,
+    },
+    "ar": {
+        "llm": ["llama-3.3-70b-versatile", "meta-llama/llama-4-scout-17b-16e-instruct"],
+        "stt": ["cartesia/ink-whisper", "groq/whisper-large-v3"],
+        "tts": ["sonic-3"],
+        "hedge_after": 1.5,
+    },
+    "fr": {
+        "llm": ["llama-3.3-70b-versatile", "meta-llama/llama-4-scout-17b-16e-instruct"],
+        "stt": ["cartesia/ink-whisper", "groq/whisper-large-v3-turbo"],
+        "tts": ["sonic-3", "sonic-2"],
+        "hedge_after": 1.5,
+    },
+}
+
+# Hedged LLM calls must fail fast: the race replaces the SDK's own retries.
+LLM_ATTEMPT_OPTIONS = APIConnectOptions(max_retry=0, timeout=8.0)
+
+# Circuit breaker tuning, shared by every provider label.
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_AFTER = 30.0
+# Open circuits are kept here for every job process on the host. In process
+# mode each session has a process of its own, and would otherwise pay the
+# failures again before skipping a provider the others already found down.
+CIRCUIT_STATE_PATH = os.path.join(RUN_DIR, "circuits.json")
+
+# Process-wide counters, logged by the session close handler:
+# hedges fired, wins per provider, failures per provider, circuits opened.
+PROVIDER_STATS: Counter[str] = Counter()
+
+
+class SharedCircuits:
+    """Open circuits by provider label, in a JSON file every job process reads.
+
+    Re-read only when the file changes. Writes replace the whole file, so a
+    concurrent write from another process can be lost; the worst case is a
+    circuit that stays open until its next probe.
+    """
+
+    def __init__(self, path: str = CIRCUIT_STATE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: int | None = None
+        self._circuits: dict[str, dict[str, float]] = {}
+
+    def get(self, label: str) -> dict[str, float]:
+        with self._lock:
+            self._refresh()
+            return dict(self._circuits.get(label, {}))
+
+    def set(self, label: str, entry: dict[str, float] | None) -> None:
+        with self._lock:
+            self._refresh()
+            circuits = dict(self._circuits)
+            if entry is None:
+                circuits.pop(label, None)
+            else:
+                circuits[label] = entry
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(circuits, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"[PROVIDER] Could not share circuit state: {e}")
+            self._circuits = circuits
+
+    def _refresh(self) -> None:
+        # Caller holds the lock
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._mtime, self._circuits = None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self._circuits = json.load(f)
+        except (OSError, ValueError):
+            self._circuits = {}
+        self._mtime = mtime
+
+
+class CircuitBreaker:
+    """Skip a provider after repeated failures, then let one probe through.
+
+    Failures are counted per process; once a circuit opens, every process
+    sharing `circuits` skips the provider until one of them probes it.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_after: float = CIRCUIT_RESET_AFTER,
+        circuits: SharedCircuits | None = None,
+    ) -> None:
+        self.label = label
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.circuits = circuits or SharedCircuits()
+        # Whether this process holds the half-open probe
+        self._probing = False
+
+    @property
+    def opened_at(self) -> float | None:
+        """Wall-clock time the circuit opened, None while closed."""
+        return self.circuits.get(self.label).get("opened_at")
+
+    @opened_at.setter
+    def opened_at(self, value: float | None) -> None:
+        self.circuits.set(self.label, None if value is None else {"opened_at": value})
+
+    @property
+    def state(self) -> str:
+        opened_at = self.opened_at
+        if opened_at is None:
+            return "closed"
+        if time.time() - opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether to call the provider now; in half-open, claims the one probe."""
+        entry = self.circuits.get(self.label)
+        if "opened_at" not in entry:
+            return True
+        now = time.time()
+        if now - entry["opened_at"] < self.reset_after:
+            return False
+        # A probe that never reported back (its process died) expires
+        if now - entry.get("probe_at", 0.0) < self.reset_after:
+            return False
+        self.circuits.set(self.label, {**entry, "probe_at": now})
+        self._probing = True
+        return True
+
+    def release(self) -> None:
+        """The call was abandoned without a result; let someone else probe."""
+        if not self._probing:
+            return
+        self._probing = False
+        entry = self.circuits.get(self.label)
+        if "probe_at" in entry:
+            del entry["probe_at"]
+            self.circuits.set(self.label, entry)
+
+    def record_success(self) -> None:
+        self._probing = False
+        if self.opened_at is not None:
+            logger.info(f"[PROVIDER] Circuit closed for {self.label}")
+            self.opened_at = None
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        PROVIDER_STATS[f"failure:{self.label}"] += 1
+        state = self.state
+        if state == "half-open" or (state == "closed" and self.failures >= self.failure_threshold):
+            self.opened_at = time.time()
+            PROVIDER_STATS[f"circuit_open:{self.label}"] += 1
+            logger.warning(
+                f"[PROVIDER] Circuit opened for {self.label} after {self.failures} failures")
+
+
+_circuits: SharedCircuits | None = None
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(label: str) -> CircuitBreaker:
+    """Return this process's breaker for a provider label; state is host-wide."""
+    global _circuits
+    if label not in _breakers:
+        if _circuits is None:
+            _circuits = SharedCircuits(CIRCUIT_STATE_PATH)
+        _breakers[label] = CircuitBreaker(label, circuits=_circuits)
+    return _breakers[label]
+
+
+async def _first_items(stream: AsyncIterator[Any]) -> list[Any]:
+    # Metadata-only chunks (role, usage) don't prove the provider is answering,
+    # so buffer them until the first chunk that carries content or a tool call.
+    items: list[Any] = []
+    async for item in stream:
+        items.append(item)
+        has_response = getattr(item, "has_response", None)
+        if has_response is None or has_response():
+            break
+    return items
+
+
+async def _close(stream: AsyncIterator[Any]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is None:
+        return
+    try:
+        await aclose()
+    except Exception:
+        logger.debug("[PROVIDER] Error closing losing stream", exc_info=True)
+
+
+async def hedged_stream(
+    candidates: list[tuple[str, Callable[[], AsyncIterator[Any]]]],
+    hedge_after: float,
+) -> AsyncIterable[Any]:
+    """Stream from the first candidate to produce an item.
+
+    The next candidate is started when the current ones have been silent for
+    `hedge_after` seconds, or immediately when one fails before its first item.
+    Providers with an open circuit are skipped unless every circuit is open,
+    and a half-open one only gets the request that holds its probe.
+    """
+    allowed = [c for c in candidates if get_breaker(c[0]).state != "open"]
+    pending: dict[asyncio.Task, tuple[str, AsyncIterator[Any], float]] = {}
+    next_idx = 0
+    forced = False
+    last_error: BaseException | None = None
+
+    def launch() -> bool:
+        nonlocal next_idx
+        while next_idx < len(allowed):
+            label, factory = allowed[next_idx]
+            next_idx += 1
+            if not forced and not get_breaker(label).allow():
+                continue  # another request is probing it
+            stream = factory()
+            task = asyncio.ensure_future(_first_items(stream))
+            pending[task] = (label, stream, time.monotonic())
+            return True
+        return False
+
+    winner: tuple[str, AsyncIterator[Any], float] | None = None
+    first: list[Any] = []
+    try:
+        if not launch():
+            logger.warning("[PROVIDER] All circuits open, trying every provider anyway")
+            allowed, next_idx, forced = candidates, 0, True
+            launch()
+        while pending and winner is None:
+            timeout = hedge_after if next_idx < len(allowed) else None
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if launch():
+                    PROVIDER_STATS["hedge"] += 1
+                    logger.info(f"[PROVIDER] No response after {hedge_after}s, "
+                                f"hedged to {list(pending.values())[-1][0]}")
+                continue
+            for task in done:
+                label, stream, started = pending.pop(task)
+                if winner is None and task.exception() is None:
+                    winner = (label, stream, started)
+                    first = task.result()
+                    continue
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    get_breaker(label).record_failure()
+                    logger.warning(f"[PROVIDER] {label} failed: {last_error}")
+                else:
+                    get_breaker(label).release()
+                await _close(stream)
+            if winner is None and not pending and next_idx < len(allowed):
+                launch()
+    finally:
+        for task, (label, stream, _) in pending.items():
+            task.cancel()
+            get_breaker(label).release()
+            await _close(stream)
+
+    if winner is None:
+        raise last_error or RuntimeError("no provider produced a response")
+
+    label, stream, started = winner
+    PROVIDER_STATS[f"win:{label}"] += 1
+    logger.info(
+        f"[PROVIDER] {label} answered first in {time.monotonic() - started:.2f}s")
+    try:
+        for item in first:
+            yield item
+        async for item in stream:
+            yield item
+    except Exception:
+        get_breaker(label).record_failure()
+        raise
+    else:
+        get_breaker(label).record_success()
+    finally:
+        # The reader stopped early: no verdict either way
+        get_breaker(label).release()
+        await _close(stream)
+
+
+class HedgedLLM:
+    """Ordered LLM chain raced by `hedged_stream` from `Assistant.llm_node`."""
+
+    def __init__(self, llms: list[llm.LLM], hedge_after: float) -> None:
+        self.llms = llms
+        self.hedge_after = hedge_after
+
+    @property
+    def primary(self) -> llm.LLM:
+        return self.llms[0]
+
+    def stream(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool],
+        tool_choice: Any,
+    ) -> AsyncIterable[llm.ChatChunk]:
+        candidates = [
+            (f"groq/{model.model}", _chat_factory(model, chat_ctx, tools, tool_choice))
+            for model in self.llms
+        ]
+        return hedged_stream(candidates, self.hedge_after)
+
+
+def _chat_factory(
+    model: llm.LLM, chat_ctx: llm.ChatContext, tools: list[llm.Tool], tool_choice: Any,
+) -> Callable[[], AsyncIterator[llm.ChatChunk]]:
+    def factory() -> AsyncIterator[llm.ChatChunk]:
+        return model.chat(
+            chat_ctx=chat_ctx,
+            tools=tools,
+            tool_choice=tool_choice,
+            conn_options=LLM_ATTEMPT_OPTIONS,
+        )
+    return factory
+
+
+def build_llm(language: str) -> HedgedLLM:
+    from livekit.plugins import groq
+
+    config = PROVIDER_CONFIG.get(language, PROVIDER_CONFIG["en"])
+    llms = [
+        groq.LLM(model=model, temperature=0.6, parallel_tool_calls=False)
+        for model in config["llm"]
+    ]
+    return HedgedLLM(llms, hedge_after=config["hedge_after"])
+
+
+def build_stt(language: str, stt_lang: str, vad: Any) -> stt.STT:
+    """Cartesia STT with failover; the adapter parks a failing provider and
+    probes it in the background, which acts as the STT circuit breaker."""
+    from livekit.plugins import cartesia, groq
+
+    config = PROVIDER_CONFIG.get(language, PROVIDER_CONFIG["en"])
+    chain: list[stt.STT] = []
+    for entry in config["stt"]:
+        provider, model = entry.split("/", 1)
+        if provider == "cartesia":
+            chain.append(cartesia.STT(model=model, language=stt_lang))
+        elif provider == "groq":
+            chain.append(groq.STT(model=model, language=stt_lang))
+    return stt_fallback(chain, vad)
+
+
+def stt_fallback(chain: list[stt.STT], vad: Any) -> stt.STT:
+    if len(chain) == 1:
+        return chain[0]
+    return stt.FallbackAdapter(chain, vad=vad, attempt_timeout=5.0)
+
+
+def build_tts(language: str, voice: str, tts_lang: str) -> tts.TTS:
+    """Cartesia TTS with failover across models (same circuit semantics as STT)."""
+    from livekit.plugins import cartesia
+
+    config = PROVIDER_CONFIG.get(language, PROVIDER_CONFIG["en"])
+    chain = [
+        cartesia.TTS(model=model, voice=voice, language=tts_lang)
+        for model in config["tts"]
+    ]
+    return tts_fallback(chain)
+
+
+def tts_fallback(chain: list[tts.TTS]) -> tts.TTS:
+    if len(chain) == 1:
+        return chain[0]
+    return tts.FallbackAdapter(chain, max_retry_per_tts=1)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Offline replay of sessions captured with RECORD_SESSIONS=1 (see
+session_recorder.py).
+
+A capture is fed back through Assistant with every provider stubbed from
+the recording, so no network is needed:
+
+- STT: each recorded user turn, with its ChatMessage.metrics, goes straight
+  to on_user_turn_completed (history pruning, backchannel filtering);
+- agent state: the recorded speaking/listening changes up to each user turn
+  feed Assistant.agent_speech, so talk-over is judged as it was live;
+- LLM: each request gets the recorded stream back, chunk timing included;
+- TTS: the first frame of every sentence arrives after the recorded
+  tts_node_ttfb.
+
+llm_node, tts_node and the tools run for real, so a change to any of them
+shows up as a latency or behaviour difference against the recording. The
+tools' browser RPCs are collected instead of sent.
+
+    python replay.py run data/recordings/<job id>
+    python replay.py bench data/recordings
+
+Turn latency is end of user speech to first agent audio: the recorded
+end-of-turn delay plus the measured time to the first TTS frame.
+
+Limitations: endpointing and turn-detection settings act on audio rather
+than transcripts; captures keep audio.ogg for that, but this driver starts at
+the transcript. Replies are not interrupted during replay: a reply the visitor
+talked over live is carried into the history as interrupted, the way it was
+recorded. Captures made before state events had `at` replay with no agent
+speech, so every acknowledgement counts as talk-over.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, AsyncIterable
+
+from livekit.agents import (
+    AgentSession,
+    ChatContext,
+    ChatMessage,
+    ModelSettings,
+    StopResponse,
+    llm,
+    tts,
+)
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions
+
+from agent import Assistant
+from session_recorder import EVENTS_FILE, RECORDINGS_DIR, load_events
+
+logger = logging.getLogger(__name__)
+
+# Used when a recorded reply has no TTS metrics (e.g. it was interrupted
+# before the first frame)
+DEFAULT_TTS_TTFB = 0.2
+SAMPLE_RATE = 24000
+# Same bound the session applies to tool rounds within one reply
+MAX_TOOL_STEPS = 3
+
+
+class ReplayChain:
+    """Stands in for providers.HedgedLLM, returning each turn's recorded streams in order."""
+
+    def __init__(self, llm_events: list[dict[str, Any]]) -> None:
+        self._pending: dict[int, list[dict[str, Any]]] = {}
+        for event in llm_events:
+            self._pending.setdefault(event["turn"], []).append(event)
+        self.turn = 0
+        self.missing = 0
+
+    def stream(
+        self, chat_ctx: ChatContext, tools: list[llm.Tool], tool_choice: Any = None,
+    ) -> AsyncIterable[llm.ChatChunk]:
+        pending = self._pending.get(self.turn)
+        if not pending:
+            # The replay made a request the recording never saw
+            self.missing += 1
+            return self._replay([])
+        return self._replay(pending.pop(0)["chunks"])
+
+    async def _replay(self, chunks: list[list[Any]]) -> AsyncIterable[llm.ChatChunk]:
+        started = time.perf_counter()
+        for offset, content, calls in chunks:
+            delay = offset - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield llm.ChatChunk(
+                id="replay",
+                delta=llm.ChoiceDelta(
+                    role="assistant", content=content or None,
+                    tool_calls=[llm.FunctionToolCall(name=name, arguments=args, call_id=call_id)
+                                for name, args, call_id in calls]))
+
+
+class ReplayTTS(tts.TTS):
+    """Silent TTS whose first byte takes the recorded time-to-first-byte."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=SAMPLE_RATE, num_channels=1)
+        self.ttfb = DEFAULT_TTS_TTFB
+
+    def synthesize(
+        self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "_ReplayStream":
+        return _ReplayStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _ReplayStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id="replay", sample_rate=SAMPLE_RATE, num_channels=1,
+            mime_type="audio/pcm")
+        await asyncio.sleep(self._tts.ttfb)
+        # 100ms of silence stands in for the audio
+        output_emitter.push(b"\x00\x00" * (SAMPLE_RATE // 10))
+        output_emitter.flush()
+
+
+class _ReplayRoom:
+    """Just enough of rtc.Room for the tools: one visitor, RPCs collected."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.remote_participants = {"visitor": SimpleNamespace(identity="visitor")}
+        self.local_participant = self
+        self.rpcs: list[dict[str, Any]] = []
+
+    async def perform_rpc(self, *, destination_identity: str, method: str, payload: str) -> str:
+        self.rpcs.append({"method": method, "payload": payload})
+        return ""
+
+
+@dataclass
+class TurnResult:
+    turn: int
+    text: str
+    suppressed: bool = False
+    latency: float | None = None
+    recorded_latency: float | None = None
+    llm_calls: int = 0
+    tool_calls: list[str] = field(default_factory=list)
+    recorded_tool_calls: list[str] = field(default_factory=list)
+    reply: str = ""
+
+
+@dataclass
+class ReplayResult:
+    directory: str
+    language: str
+    turns: list[TurnResult]
+    unmatched_llm_requests: int = 0
+    rpcs: int = 0
+
+
+def _recorded_latency(user_metrics: dict[str, Any], reply_metrics: dict[str, Any]) -> float | None:
+    # The same sum session_density.report uses for live sessions
+    eot = user_metrics.get("end_of_turn_delay")
+    if eot is None or "llm_node_ttft" not in reply_metrics:
+        return None
+    return eot + reply_metrics["llm_node_ttft"] + reply_metrics.get("tts_node_ttfb", 0.0)
+
+
+async def _run_tool(agent: Assistant, call: llm.FunctionToolCall, context: Any) -> llm.FunctionCallOutput:
+    tool = next((t for t in agent.tools if getattr(t, "info", None) and t.info.name == call.name), None)
+    try:
+        if tool is None:
+            raise ValueError(f"unknown tool {call.name}")
+        output, is_error = str(await tool(**json.loads(call.arguments or "{}"), context=context)), False
+    except Exception as e:
+        output, is_error = str(e), True
+    return llm.FunctionCallOutput(
+        name=call.name, call_id=call.call_id, output=output, is_error=is_error)
+
+
+async def _reply(
+    agent: Assistant, chain: ReplayChain, chat_ctx: ChatContext, context: Any,
+    result: TurnResult, started: float,
+) -> None:
+    """One reply: LLM into TTS concurrently, then tool rounds, as AgentSession does."""
+    for _ in range(MAX_TOOL_STEPS):
+        result.llm_calls += 1
+        text_ch: asyncio.Queue[str | None] = asyncio.Queue()
+        calls: list[llm.FunctionToolCall] = []
+
+        async def text() -> AsyncIterable[str]:
+            while (chunk := await text_ch.get()) is not None:
+                yield chunk
+
+        async def speak() -> None:
+            async for _frame in agent.tts_node(text(), ModelSettings()):
+                if result.latency is None:
+                    result.latency = time.perf_counter() - started
+
+        speaker = asyncio.create_task(speak())
+        try:
+            async for chunk in agent.llm_node(chat_ctx, agent.tools, ModelSettings()):
+                if chunk.delta is None:
+                    continue
+                if chunk.delta.content:
+                    result.reply += chunk.delta.content
+                    text_ch.put_nowait(chunk.delta.content)
+                calls.extend(chunk.delta.tool_calls)
+        finally:
+            text_ch.put_nowait(None)
+            await speaker
+
+        if not calls:
+            return
+        for call in calls:
+            result.tool_calls.append(call.name)
+            chat_ctx.items.append(llm.FunctionCall(
+                call_id=call.call_id, name=call.name, arguments=call.arguments))
+            chat_ctx.items.append(await _run_tool(agent, call, context))
+
+
+async def replay(directory: str) -> ReplayResult:
+    events = load_events(directory)
+    meta = next((e for e in events if e["type"] == "meta"), {})
+    language = meta.get("language", "en")
+    replies: dict[int, dict[str, Any]] = {}
+    recorded_tools: dict[int, list[str]] = {}
+    for event in events:
+        if event["type"] == "agent_message":
+            replies.setdefault(event["turn"], event)
+        elif event["type"] == "tool_call":
+            recorded_tools.setdefault(event["turn"], []).append(event["name"])
+
+    chain = ReplayChain([e for e in events if e["type"] == "llm"])
+    tts_stub = ReplayTTS()
+    agent = Assistant(chain, language)
+    session = AgentSession(tts=tts_stub, userdata={"language": language})
+    await session.start(agent, record=False)
+    room = _ReplayRoom(meta.get("room", "replay"))
+    context = SimpleNamespace(
+        session=SimpleNamespace(_room_io=SimpleNamespace(room=room)),
+        userdata={"language": language})
+
+    chat_ctx = agent.chat_ctx.copy()
+    greeting = replies.get(0)
+    if greeting:
+        chat_ctx.add_message(role="assistant", content=greeting["text"])
+
+    turns = []
+    try:
+        for event in events:
+            if event["type"] == "state" and event.get("who") == "agent" and "at" in event:
+                agent.agent_speech.update(event["state"], event["at"])
+            if event["type"] != "user_turn":
+                continue
+            recorded = replies.get(event["turn"], {})
+            result = TurnResult(
+                turn=event["turn"], text=event["text"],
+                recorded_latency=_recorded_latency(event["metrics"], recorded.get("metrics") or {}),
+                recorded_tool_calls=recorded_tools.get(event["turn"], []))
+            turns.append(result)
+            chain.turn = event["turn"]
+            tts_stub.ttfb = (recorded.get("metrics") or {}).get("tts_node_ttfb", DEFAULT_TTS_TTFB)
+
+            message = ChatMessage(role="user", content=[event["text"]], metrics=event["metrics"])
+            turn_ctx = chat_ctx.copy()
+            started = time.perf_counter()
+            try:
+                await agent.on_user_turn_completed(turn_ctx, message)
+            except StopResponse:
+                result.suppressed = True
+                chat_ctx.items.append(message)
+                continue
+            turn_ctx.items.append(message)
+            await _reply(agent, chain, turn_ctx, context, result, started)
+            if result.latency is not None:
+                result.latency += event["metrics"].get("end_of_turn_delay", 0.0)
+
+            # Carry the conversation on as it actually went, interruptions included
+            chat_ctx = turn_ctx
+            chat_ctx.add_message(
+                role="assistant", content=recorded.get("text", result.reply),
+                interrupted=recorded.get("interrupted", False))
+    finally:
+        await session.aclose()
+
+    return ReplayResult(
+        directory=directory, language=language, turns=turns,
+        unmatched_llm_requests=chain.missing, rpcs=len(room.rpcs))
+
+
+# ── Reports ──
+
+
+def _ms(seconds: float | None) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+
+def print_result(result: ReplayResult) -> None:
+    print(f"{result.directory} ({result.language})")
+    print(f"{'turn':>5}  {'replayed':>9}{'recorded':>10}{'llm':>5}  {'tools':<30}text")
+    for t in result.turns:
+        tools = ",".join(t.tool_calls)
+        if t.tool_calls != t.recorded_tool_calls:
+            tools += f" (was {','.join(t.recorded_tool_calls) or 'none'})"
+        latency = "dropped" if t.suppressed else _ms(t.latency)
+        print(f"{t.turn:>5}  {latency:>9}{_ms(t.recorded_latency):>10}{t.llm_calls:>5}  "
+              f"{tools:<30}{t.text[:40]!r}")
+    if result.unmatched_llm_requests:
+        print(f"  {result.unmatched_llm_requests} LLM requests had no recorded stream")
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else None
+
+
+def print_summary(results: list[ReplayResult]) -> None:
+    turns = [t for r in results for t in r.turns]
+    replayed = [t.latency for t in turns if t.latency is not None]
+    recorded = [t.recorded_latency for t in turns if t.recorded_latency is not None]
+    # Pairs only count turns answered both times
+    deltas = [t.latency - t.recorded_latency for t in turns
+              if t.latency is not None and t.recorded_latency is not None]
+    print(f"\n{len(results)} sessions, {len(turns)} user turns, "
+          f"{sum(t.suppressed for t in turns)} dropped before the LLM, "
+          f"{sum(t.llm_calls for t in turns)} LLM requests")
+    print(f"{'':<10}{'p50':>9}{'p95':>9}")
+    print(f"{'replayed':<10}{_ms(_percentile(replayed, 0.5)):>9}{_ms(_percentile(replayed, 0.95)):>9}")
+    print(f"{'recorded':<10}{_ms(_percentile(recorded, 0.5)):>9}{_ms(_percentile(recorded, 0.95)):>9}")
+    if deltas:
+        print(f"median change per turn: {statistics.median(deltas) * 1000:+.0f}ms")
+    changed = sum(t.tool_calls != t.recorded_tool_calls for t in turns if not t.suppressed)
+    print(f"turns whose tool calls differ from the recording: {changed}")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Replay recorded sessions offline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="replay one capture turn by turn")
+    run.add_argument("directory")
+    bench = sub.add_parser("bench", help="replay every capture under a directory")
+    bench.add_argument("directory", nargs="?", default=RECORDINGS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        result = asyncio.run(replay(args.directory))
+        print_result(result)
+        print_summary([result])
+        return
+
+    results = []
+    for name in sorted(os.listdir(args.directory)):
+        capture = os.path.join(args.directory, name)
+        if os.path.exists(os.path.join(capture, EVENTS_FILE)):
+            results.append(asyncio.run(replay(capture)))
+            print_result(results[-1])
+    if not results:
+        print(f"No captures under {args.directory}; record some with RECORD_SESSIONS=1")
+        return
+    print_summary(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Pool of pre-created rooms with an agent already waiting in them.
+
+With ROOM_POOL=1 the token server keeps, per language, a few rooms whose
+agent has been dispatched, has started its session and is idling. /getToken
+leases one of them instead of naming a fresh room. The visitor then skips
+room creation, job assignment and session start, and the agent greets as
+soon as the visitor joins.
+
+Rooms are warmed on a background thread with its own event loop:
+
+    create_room → create_dispatch(metadata {"language", "warm": true})
+      → wait until the agent's lk.agent.state attribute is "listening"
+
+Pool size per language follows the token request rate over the last
+RATE_WINDOW seconds. The pool holds enough rooms for the visitors expected
+while a replacement warms up, doubled for bursts, and always keeps between
+ROOM_POOL_MIN and ROOM_POOL_MAX rooms. Rooms unused for ROOM_POOL_TTL
+seconds are deleted and replaced. The agent in a warm room gives up on its
+own shortly after, in case the token server is gone, and leaves at once
+when its worker starts draining.
+
+Before handing a room out, `lease` checks that its agent is still
+listening. Rooms whose agent has left (a drained or crashed worker) are
+deleted, and when none is left /getToken falls back to a fresh room with
+explicit dispatch.
+
+Every idle room holds one agent session (see `python session_density.py
+report` for its memory). `stats()` reports idle room-minutes, which is
+that cost, next to the lease hit rate; /health includes it.
+
+    python room_pool.py bench --server http://localhost:5001 --sessions 20
+
+measures greeting latency (token request to the first audible agent
+frame) against a running token server and LiveKit server. For a local
+run, start `livekit-server --dev`, point LIVEKIT_URL/KEY/SECRET at it
+(ws://localhost:7880, devkey, secret), start agent.py and the token
+server, and run the bench once with ROOM_POOL=0 and once with ROOM_POOL=1.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any
+
+from dispatch import AGENT_NAME, EXPLICIT_DISPATCH
+
+logger = logging.getLogger(__name__)
+
+ROOM_POOL_ENABLED = os.getenv("ROOM_POOL", "0") in ("1", "true", "yes")
+ROOM_POOL_LANGUAGES = [
+    lang.strip() for lang in os.getenv("ROOM_POOL_LANGUAGES", "en").split(",") if lang.strip()
+]
+ROOM_POOL_MIN = int(os.getenv("ROOM_POOL_MIN", "1"))
+ROOM_POOL_MAX = int(os.getenv("ROOM_POOL_MAX", "4"))
+ROOM_POOL_TTL = float(os.getenv("ROOM_POOL_TTL", "600"))
+# The agent in a warm room leaves on its own this long after the pool would
+# have recycled the room
+WARM_ROOM_MAX_IDLE = ROOM_POOL_TTL + 60
+
+RATE_WINDOW = 600.0
+BURST_FACTOR = 2.0
+# Surplus rooms (after the request rate drops) are kept at least this long
+SURPLUS_GRACE = 60.0
+WARM_TIMEOUT = 30.0
+# Longest a lease waits on the agent-presence check before using a fresh room
+LEASE_CHECK_TIMEOUT = 1.0
+# Rooms this close to their TTL are no longer leased
+LEASE_MARGIN = 30.0
+POLL_INTERVAL = 0.25
+RECONCILE_INTERVAL = 5.0
+
+
+@dataclass
+class WarmRoom:
+    name: str
+    language: str
+    ready_at: float  # time.monotonic()
+
+
+class RoomPool:
+    """Per-language pool of agent-warmed rooms, leased by /getToken."""
+
+    def __init__(
+        self,
+        languages: list[str],
+        min_size: int = ROOM_POOL_MIN,
+        max_size: int = ROOM_POOL_MAX,
+        ttl: float = ROOM_POOL_TTL,
+    ) -> None:
+        self.languages = languages
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ready: dict[str, deque[WarmRoom]] = {lang: deque() for lang in languages}
+        self._warming: Counter[str] = Counter()
+        self._requests: dict[str, deque[float]] = {lang: deque() for lang in languages}
+        # Moving average of create → agent listening, seeded with a guess
+        self._warmup_seconds = 5.0
+        self._started_at = time.monotonic()
+        self._stats: Counter[str] = Counter()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._api: Any = None
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    # ── Called from request handlers ──
+
+    async def lease(self, language: str) -> str | None:
+        """Hand out a warm room whose agent is still listening, or None if none is ready."""
+        with self._lock:
+            if language not in self._ready:
+                return None
+            self._requests[language].append(time.monotonic())
+        self._wakeup()
+        while (room := self._take(language)) is not None:
+            try:
+                present = await self._on_pool_loop(_agent_listening(self._api, room.name))
+            except Exception as e:
+                logger.warning(f"[POOL] Could not check the agent in {room.name}: {e!r}")
+                with self._lock:
+                    self._ready[language].appendleft(room)
+                    self._stats["lease_check_failed"] += 1
+                return None
+            with self._lock:
+                self._retire(room, time.monotonic(), "leased" if present else "agent_gone")
+            if present:
+                return room.name
+            logger.warning(f"[POOL] Agent left {room.name}; deleting it")
+            if not self._stopping:
+                asyncio.run_coroutine_threadsafe(_delete_room(self._api, room.name), self._loop)
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            idle = stats.get("idle_room_seconds", 0.0) + sum(
+                now - r.ready_at for rooms in self._ready.values() for r in rooms)
+            ready = {lang: len(rooms) for lang, rooms in self._ready.items()}
+            targets = {lang: self._target(lang, now) for lang in self.languages}
+            warming = dict(self._warming)
+        leases = stats.get("leased", 0) + stats.get("misses", 0)
+        hours = max(now - self._started_at, 1.0) / 3600
+        return {
+            "ready": ready,
+            "warming": warming,
+            "target": targets,
+            "warmup_seconds": round(self._warmup_seconds, 2),
+            "hit_rate": round(stats.get("leased", 0) / leases, 3) if leases else None,
+            # Agent sessions held idle, per hour the pool has been running
+            "idle_room_minutes_per_hour": round(idle / 60 / hours, 1),
+            **{k: v for k, v in stats.items() if k != "idle_room_seconds"},
+        }
+
+    # ── Lifecycle ──
+
+    def start(self) -> None:
+        if not EXPLICIT_DISPATCH:
+            logger.warning("[POOL] Room pool needs explicit dispatch (AGENT_NAME); not starting")
+            return
+        self._thread = threading.Thread(target=self._thread_main, name="room-pool", daemon=True)
+        self._thread.start()
+        logger.info(f"[POOL] Warming rooms for {self.languages} "
+                    f"(min {self.min_size}, max {self.max_size}, ttl {self.ttl:.0f}s)")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop warming and delete the rooms nobody leased."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping = True
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        thread.join(timeout)
+
+    def _take(self, language: str) -> WarmRoom | None:
+        now = time.monotonic()
+        with self._lock:
+            # Oldest first, skipping rooms about to be recycled (their agent
+            # may be leaving); the pool thread deletes those
+            ready = self._ready[language]
+            fresh_for = self.ttl - min(LEASE_MARGIN, self.ttl / 4)
+            room = next((r for r in ready if now - r.ready_at < fresh_for), None)
+            if room is not None:
+                ready.remove(room)
+            return room
+
+    async def _on_pool_loop(self, coro: Any) -> Any:
+        """Run a LiveKit API call on the pool thread, whose loop owns the API session."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return await asyncio.wait_for(asyncio.wrap_future(future), LEASE_CHECK_TIMEOUT)
+
+    def _wakeup(self) -> None:
+        if self._loop is not None and self._wake is not None and not self._stopping:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _retire(self, room: WarmRoom, now: float, outcome: str) -> None:
+        # Caller holds the lock
+        self._stats[outcome] += 1
+        self._stats["idle_room_seconds"] += now - room.ready_at
+
+    def _target(self, language: str, now: float) -> int:
+        # Caller holds the lock
+        requests = self._requests[language]
+        while requests and now - requests[0] > RATE_WINDOW:
+            requests.popleft()
+        expected = len(requests) / RATE_WINDOW * self._warmup_seconds * BURST_FACTOR
+        return max(self.min_size, min(self.max_size, math.ceil(expected)))
+
+    # ── Pool thread ──
+
+    def _thread_main(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        from livekit.api import LiveKitAPI
+
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        api = self._api = LiveKitAPI(
+            url=os.getenv("LIVEKIT_URL"),
+            api_key=os.getenv("LIVEKIT_API_KEY"),
+            api_secret=os.getenv("LIVEKIT_API_SECRET"),
+        )
+        tasks: set[asyncio.Task] = set()
+        try:
+            while not self._stopping:
+                for name in self._reconcile(tasks, api):
+                    tasks.add(asyncio.create_task(_delete_room(api, name)))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), RECONCILE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                tasks = {t for t in tasks if not t.done()}
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            now = time.monotonic()
+            with self._lock:
+                leftover = [r for rooms in self._ready.values() for r in rooms]
+                for room in leftover:
+                    self._retire(room, now, "closed")
+                for rooms in self._ready.values():
+                    rooms.clear()
+            await asyncio.gather(*(_delete_room(api, r.name) for r in leftover),
+                                 return_exceptions=True)
+            await api.aclose()
+            logger.info(f"[POOL] Stopped: {self.stats()}")
+
+    def _reconcile(self, tasks: set[asyncio.Task], api: Any) -> list[str]:
+        """Start warming up to each target; return the rooms to delete."""
+        now = time.monotonic()
+        doomed = []
+        with self._lock:
+            for lang in self.languages:
+                ready = self._ready[lang]
+                while ready and now - ready[0].ready_at > self.ttl:
+                    room = ready.popleft()
+                    self._retire(room, now, "expired")
+                    doomed.append(room.name)
+                target = self._target(lang, now)
+                while len(ready) > target and now - ready[0].ready_at > SURPLUS_GRACE:
+                    room = ready.popleft()
+                    self._retire(room, now, "surplus")
+                    doomed.append(room.name)
+                for _ in range(target - len(ready) - self._warming[lang]):
+                    self._warming[lang] += 1
+                    tasks.add(asyncio.create_task(self._warm(api, lang)))
+        return doomed
+
+    async def _warm(self, api: Any, language: str) -> None:
+        from livekit.api import CreateAgentDispatchRequest, CreateRoomRequest
+
+        name = f"warm-{language}-{uuid.uuid4().hex[:8]}"
+        started = time.monotonic()
+        try:
+            await api.room.create_room(CreateRoomRequest(name=name))
+            await api.agent_dispatch.create_dispatch(CreateAgentDispatchRequest(
+                agent_name=AGENT_NAME, room=name,
+                metadata=json.dumps({"language": language, "warm": True})))
+            while not await _agent_listening(api, name):
+                if time.monotonic() - started > WARM_TIMEOUT:
+                    raise TimeoutError(f"agent not listening after {WARM_TIMEOUT:.0f}s")
+                await asyncio.sleep(POLL_INTERVAL)
+        except Exception as e:
+            logger.warning(f"[POOL] Could not warm {name}: {e}")
+            await _delete_room(api, name)
+            # Still counted as warming while backing off, so a down agent or
+            # server is not retried in a tight loop
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            with self._lock:
+                self._warming[language] -= 1
+                self._stats["warm_failed"] += 1
+            return
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._warming[language] -= 1
+            self._warmup_seconds = 0.8 * self._warmup_seconds + 0.2 * elapsed
+            self._ready[language].append(WarmRoom(name, language, time.monotonic()))
+            self._stats["warmed"] += 1
+        logger.info(f"[POOL] {name} ready in {elapsed:.2f}s")
+
+
+async def _agent_listening(api: Any, room: str) -> bool:
+    from livekit.api import ListParticipantsRequest
+
+    res = await api.room.list_participants(ListParticipantsRequest(room=room))
+    # RoomIO publishes the session state as lk.agent.state; "listening" means
+    # the session has started and is idle
+    return any(p.attributes.get("lk.agent.state") == "listening" for p in res.participants)
+
+
+async def _delete_room(api: Any, name: str) -> None:
+    from livekit.api import DeleteRoomRequest
+
+    try:
+        await api.room.delete_room(DeleteRoomRequest(room=name))
+    except Exception as e:
+        logger.debug(f"[POOL] Deleting {name} failed: {e}")
+
+
+# ── Greeting latency bench ──
+
+
+async def _greeting_latency(server: str, language: str, timeout: float) -> tuple[float | None, str]:
+    """Seconds from requesting a token to the first audible frame from the agent."""
+    import aiohttp
+    from livekit import rtc
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{server}/getToken",
+                            params={"name": f"bench-{uuid.uuid4().hex[:6]}", "language": language}) as resp:
+            resp.raise_for_status()
+            token = await resp.text()
+
+    room = rtc.Room()
+    heard: asyncio.Future[float] = asyncio.get_running_loop().create_future()
+
+    async def listen(track: rtc.Track) -> None:
+        async for event in rtc.AudioStream(track):
+            samples = event.frame.data
+            if samples and max(abs(min(samples)), max(samples)) > 300:
+                if not heard.done():
+                    heard.set_result(time.perf_counter() - started)
+                return
+
+    @room.on("track_subscribed")
+    def on_track(track: rtc.Track, publication: Any, participant: rtc.RemoteParticipant) -> None:
+        if track.kind == rtc.TrackKind.KIND_AUDIO:
+            asyncio.ensure_future(listen(track))
+
+    await room.connect(os.environ["LIVEKIT_URL"], token)
+    try:
+        return await asyncio.wait_for(heard, timeout), room.name
+    except asyncio.TimeoutError:
+        return None, room.name
+    finally:
+        await room.disconnect()
+
+
+async def bench(server: str, sessions: int, language: str, interval: float, timeout: float) -> None:
+    import aiohttp
+
+    latencies = []
+    for i in range(sessions):
+        latency, room = await _greeting_latency(server, language, timeout)
+        pooled = room.startswith("warm-")
+        print(f"{i + 1:>3} {room:<24} {'pooled' if pooled else 'fresh ':<7} "
+              f"{f'{latency * 1000:.0f}ms' if latency is not None else 'no greeting'}")
+        if latency is not None:
+            latencies.append(latency)
+        await asyncio.sleep(interval)
+
+    if latencies:
+        latencies.sort()
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        print(f"greeting latency over {len(latencies)}/{sessions} sessions: "
+              f"p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, "
+              f"max {latencies[-1] * 1000:.0f}ms")
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{server}/health") as resp:
+            pool = (await resp.json()).get("room_pool")
+    print(f"room pool: {json.dumps(pool) if pool else 'disabled'}")
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+    parser = argparse.ArgumentParser(description="Warm room pool")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="greeting latency through the token server")
+    b.add_argument("--server", default="http://localhost:5001")
+    b.add_argument("--sessions", type=int, default=20)
+    b.add_argument("--language", default="en")
+    b.add_argument("--interval", type=float, default=2.0, help="seconds between visitors")
+    b.add_argument("--timeout", type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(bench(args.server, args.sessions, args.language, args.interval, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
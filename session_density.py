@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Sessions-per-process execution mode and per-session resource accounting.
+
+By default every job runs in its own process (AGENT_EXECUTOR=process). With
+AGENT_EXECUTOR=thread the worker runs each job on its own thread and event
+loop inside one process, so the runtimes, plugins and models are loaded
+once and shared. A session that raises only ends its own job; the
+framework's thread executor contains the failure.
+
+In shared mode the worker reports itself full once it hosts
+AGENT_MAX_SESSIONS sessions or its memory reaches AGENT_MEMORY_BUDGET_MB,
+whichever comes first.
+
+Every session samples its asyncio task count and the memory of the process
+hosting it, logs a [DENSITY] summary when it ends and stores it as a
+`session_resources` record. Each process hosting sessions also stores a
+`process_resources` sample (PSS and session count) every SAMPLE_INTERVAL;
+the report derives memory per session from those.
+
+    python session_density.py report   # sessions per GiB and turn latency per mode
+    python session_density.py bench    # the same for N synthetic sessions, offline
+
+The bench hosts N sessions in each mode without LiveKit: every session replays
+a capture (replay.py) through the real Assistant, tools and AgentSession, with
+the providers stubbed from the recording. Process mode forks one process per
+session from a host that imported preload.py, as the forkserver does; thread
+mode runs them on threads of that one host. It reports the hosts' combined
+peak PSS and the replayed turn latency.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
+
+from startup_profile import current_pss_mb, current_rss_mb
+
+logger = logging.getLogger(__name__)
+
+AGENT_EXECUTOR = os.getenv("AGENT_EXECUTOR", "process")
+SHARED_PROCESS = AGENT_EXECUTOR == "thread"
+AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "8"))
+# Leave headroom on the 4 GiB instance for the token server and the OS
+AGENT_MEMORY_BUDGET_MB = float(os.getenv("AGENT_MEMORY_BUDGET_MB", "3072"))
+
+SAMPLE_INTERVAL = 5.0
+# A session holding more tasks than this is probably leaking them
+TASK_WARN = 500
+
+_lock = threading.Lock()
+_active: dict[str, "SessionResources"] = {}
+# When this process last stored a process_resources sample
+_process_sampled_at = 0.0
+
+
+@dataclass
+class SessionResources:
+    job_id: str
+    executor: str
+    started_at: float
+    rss_start_mb: float
+    peak_tasks: int = 0
+    peak_rss_mb: float = 0.0
+    peak_pss_mb: float = 0.0
+    peak_sessions: int = 1
+    # Process PSS divided by the sessions it hosted, averaged over the
+    # session's sampling intervals
+    mean_pss_share_mb: float = 0.0
+    samples: int = 0
+
+
+def active_sessions() -> int:
+    with _lock:
+        return len(_active)
+
+
+def load(worker: Any = None) -> float:
+    """Worker load for shared mode: the highest of CPU, session slots and memory.
+
+    CPU is the framework's own load figure, averaged over the last few seconds
+    and aware of cgroup limits.
+    """
+    from livekit.agents.worker import _DefaultLoadCalc
+
+    return max(
+        _DefaultLoadCalc.get_load(worker),
+        active_sessions() / AGENT_MAX_SESSIONS,
+        current_rss_mb() / AGENT_MEMORY_BUDGET_MB,
+    )
+
+
+def worker_options() -> dict[str, Any]:
+    """Extra WorkerOptions for the configured executor mode."""
+    if not SHARED_PROCESS:
+        return {}
+    from livekit.agents import JobExecutorType
+
+    return {
+        "job_executor_type": JobExecutorType.THREAD,
+        "load_fnc": load,
+        # load() already encodes the limits; only refuse jobs when one is hit
+        "load_threshold": 1.0,
+    }
+
+
+def _sample(usage: SessionResources, record: Callable[..., None], final: bool = False) -> None:
+    global _process_sampled_at
+    tasks = len(asyncio.all_tasks())  # this job's own loop
+    rss, pss = current_rss_mb(), current_pss_mb()
+    sessions = active_sessions() or 1
+    if tasks > TASK_WARN and usage.peak_tasks <= TASK_WARN:
+        logger.warning(f"[DENSITY] Session {usage.job_id} has {tasks} asyncio tasks")
+    usage.peak_tasks = max(usage.peak_tasks, tasks)
+    usage.peak_rss_mb = max(usage.peak_rss_mb, rss)
+    usage.peak_pss_mb = max(usage.peak_pss_mb, pss)
+    usage.peak_sessions = max(usage.peak_sessions, sessions)
+    if final:
+        # Taken as the session leaves, so it would count the moment it is
+        # alone in the process rather than an interval it spent there
+        return
+    # Samples are SAMPLE_INTERVAL apart, so each carries equal weight
+    usage.samples += 1
+    usage.mean_pss_share_mb += (pss / sessions - usage.mean_pss_share_mb) / usage.samples
+
+    # One process sample per interval, from whichever session gets there first
+    with _lock:
+        now = time.monotonic()
+        due = now - _process_sampled_at >= SAMPLE_INTERVAL * 0.9
+        if due:
+            _process_sampled_at = now
+    if due:
+        record("process_resources", payload={
+            "pid": os.getpid(), "executor": AGENT_EXECUTOR, "sessions": sessions,
+            "pss_mb": round(pss, 1), "rss_mb": round(rss, 1),
+        })
+
+
+def track_session(ctx: Any, record: Callable[..., None]) -> SessionResources:
+    """Sample this session's resources until the job shuts down."""
+    usage = SessionResources(
+        job_id=ctx.job.id, executor=AGENT_EXECUTOR,
+        started_at=time.time(), rss_start_mb=current_rss_mb())
+    with _lock:
+        _active[usage.job_id] = usage
+
+    async def sampler() -> None:
+        while True:
+            _sample(usage, record)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    task = asyncio.create_task(sampler())
+
+    async def finish() -> None:
+        task.cancel()
+        _sample(usage, record, final=True)
+        with _lock:
+            _active.pop(usage.job_id, None)
+        logger.info(
+            f"[DENSITY] Session {usage.job_id} ({usage.executor}): peak {usage.peak_tasks} tasks, "
+            f"process RSS {usage.peak_rss_mb:.0f} MiB (+{usage.peak_rss_mb - usage.rss_start_mb:.0f} "
+            f"since start), {usage.peak_sessions} sessions in process, "
+            f"~{usage.mean_pss_share_mb:.0f} MiB PSS per session")
+        record("session_resources", payload=asdict(usage))
+
+    ctx.add_shutdown_callback(finish)
+    return usage
+
+
+# ── Report ──
+
+
+def _turn_latencies(conn: sqlite3.Connection, session_ids: set[str]) -> list[float]:
+    """End of user speech to first agent audio: end-of-turn delay plus LLM
+    time-to-first-token plus TTS time-to-first-byte, per assistant reply."""
+    latencies = []
+    rows = conn.execute(
+        "SELECT session_id, role, payload FROM events WHERE kind = 'message' "
+        "AND payload IS NOT NULL ORDER BY session_id, ts")
+    last_user: dict[str, dict] = {}
+    for session_id, role, payload in rows:
+        if session_id not in session_ids:
+            continue
+        metrics = json.loads(payload).get("metrics") or {}
+        if role == "user":
+            last_user[session_id] = metrics
+        elif role == "assistant" and "llm_node_ttft" in metrics:
+            eot = last_user.pop(session_id, {}).get("end_of_turn_delay")
+            if eot is None:
+                continue  # greeting or a reply not triggered by the user
+            latencies.append(eot + metrics["llm_node_ttft"] + metrics.get("tts_node_ttfb", 0.0))
+    return latencies
+
+
+def _records(conn: sqlite3.Connection, kind: str, since: float) -> dict[str, list[dict]]:
+    by_mode: dict[str, list[dict]] = {}
+    for (payload,) in conn.execute(
+            "SELECT payload FROM events WHERE kind = ? AND ts >= ?", (kind, since)):
+        record = json.loads(payload)
+        by_mode.setdefault(record["executor"], []).append(record)
+    return by_mode
+
+
+def report(db_path: str, hours: float | None) -> None:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    since = time.time() - hours * 3600 if hours else 0.0
+    by_mode = _records(conn, "session_resources", since)
+    process_samples = _records(conn, "process_resources", since)
+    if not by_mode:
+        print("No session_resources records yet; run a load test in each AGENT_EXECUTOR mode")
+        return
+
+    print(f"{'mode':<10}{'sessions':>9}{'peak/proc':>10}{'MiB/sess':>10}{'sess/GiB':>10}"
+          f"{'tasks':>7}{'turn p50':>10}{'turn p95':>10}")
+    for mode, sessions in sorted(by_mode.items()):
+        # Total PSS over total sessions across all process samples: each
+        # sample covers one interval, so this weights by time and by load
+        samples = process_samples.get(mode, [])
+        hosted = sum(p["sessions"] for p in samples)
+        share = sum(p["pss_mb"] for p in samples) / hosted if hosted else 0.0
+        latencies = sorted(_turn_latencies(conn, {s["job_id"] for s in sessions}))
+        p50 = f"{latencies[len(latencies) // 2] * 1000:.0f}ms" if latencies else "-"
+        p95 = f"{latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms" if latencies else "-"
+        print(f"{mode:<10}{len(sessions):>9}{max(s['peak_sessions'] for s in sessions):>10}"
+              f"{share:>10.0f}{1024 / share if share else 0:>10.1f}"
+              f"{max(s['peak_tasks'] for s in sessions):>7}{p50:>10}{p95:>10}")
+    print("MiB/sess is process PSS over the sessions hosted, summed across every process"
+          " sample; process mode excludes the main worker and idle job processes.")
+
+
+# ── Bench ──
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else None
+
+
+def _replay_session(capture: str, results: Any) -> None:
+    """Replay one session on its own event loop; put its turn latencies, or None if it failed."""
+    from replay import replay
+
+    try:
+        result = asyncio.run(replay(capture))
+    except Exception:
+        logger.exception("[DENSITY] Bench session failed")
+        results.put(None)
+        return
+    results.put([t.latency for t in result.turns if t.latency is not None])
+
+
+def host(capture: str, sessions: int, executor: str) -> dict[str, Any]:
+    """Run `sessions` replays at once in one executor mode, sampling total PSS."""
+    import multiprocessing
+    import queue
+
+    # What the worker has loaded before any job starts: plugins register on
+    # the main thread, and prewarm loads preload.py
+    import preload  # noqa: F401
+    import replay  # noqa: F401
+
+    if executor == "process":
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_replay_session, args=(capture, results))
+                   for _ in range(sessions)]
+    else:
+        results = queue.Queue()
+        workers = [threading.Thread(target=_replay_session, args=(capture, results))
+                   for _ in range(sessions)]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    pids = [os.getpid()] + [w.pid for w in workers if executor == "process"]
+    outcomes: list[list[float] | None] = []
+    peak_pss = 0.0
+    while len(outcomes) < sessions:
+        peak_pss = max(peak_pss, sum(current_pss_mb(pid) for pid in pids))
+        try:
+            outcomes.append(results.get(timeout=0.1))
+        except queue.Empty:
+            if not any(w.is_alive() for w in workers) and results.empty():
+                break
+    seconds = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+    return {"executor": executor, "sessions": sessions, "peak_pss_mb": round(peak_pss, 1),
+            "seconds": round(seconds, 2),
+            "failed": sessions - sum(o is not None for o in outcomes),
+            "latencies": [latency for o in outcomes if o for latency in o]}
+
+
+def bench(capture: str, sessions: int) -> None:
+    print(f"{sessions} sessions replaying {capture}")
+    print(f"{'mode':<10}{'PSS MiB':>9}{'MiB/sess':>10}{'sess/GiB':>10}"
+          f"{'turn p50':>10}{'turn p95':>10}{'wall':>8}{'failed':>8}")
+    for executor in ("process", "thread"):
+        # A fresh host per mode, so neither inherits the other's heap
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "host", capture,
+             "--sessions", str(sessions), "--executor", executor],
+            capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        share = result["peak_pss_mb"] / sessions
+        p50, p95 = (_percentile(result["latencies"], q) for q in (0.5, 0.95))
+        print(f"{executor:<10}{result['peak_pss_mb']:>9.0f}{share:>10.0f}{1024 / share:>10.1f}"
+              f"{f'{p50 * 1000:.0f}ms' if p50 is not None else '-':>10}"
+              f"{f'{p95 * 1000:.0f}ms' if p95 is not None else '-':>10}"
+              f"{result['seconds']:>7.1f}s{result['failed']:>8}")
+    print("PSS is the peak over the whole run, host included; turn latency is replayed"
+          " end of speech to first audio with the recorded provider timings.")
+
+
+def _first_capture() -> str | None:
+    from session_recorder import EVENTS_FILE, RECORDINGS_DIR
+
+    if not os.path.isdir(RECORDINGS_DIR):
+        return None
+    for name in sorted(os.listdir(RECORDINGS_DIR)):
+        if os.path.exists(os.path.join(RECORDINGS_DIR, name, EVENTS_FILE)):
+            return os.path.join(RECORDINGS_DIR, name)
+    return None
+
+
+def main() -> None:
+    from session_store import DEFAULT_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Session density per executor mode")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="sessions per GiB and turn latency per mode")
+    rep.add_argument("--db", default=DEFAULT_DB_PATH)
+    rep.add_argument("--hours", type=float, default=None, help="only the last N hours")
+    b = sub.add_parser("bench", help="N synthetic sessions in each executor mode")
+    b.add_argument("capture", nargs="?", help="capture to replay (default: the first recorded)")
+    b.add_argument("--sessions", type=int, default=AGENT_MAX_SESSIONS)
+    h = sub.add_parser("host")  # one bench run, in a fresh process
+    h.add_argument("capture")
+    h.add_argument("--sessions", type=int, required=True)
+    h.add_argument("--executor", choices=["process", "thread"], required=True)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.db, args.hours)
+    elif args.command == "host":
+        print(json.dumps(host(args.capture, args.sessions, args.executor)))
+    else:
+        capture = args.capture or _first_capture()
+        if capture is None:
+            print("No captures to replay; record some with RECORD_SESSIONS=1")
+            return
+        bench(capture, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Opt-in per-session capture for offline replay (see replay.py).
+
+With RECORD_SESSIONS=1 every session writes a directory under
+RECORDINGS_DIR (default data/recordings/<job id>/):
+
+    audio.ogg          stereo Opus: channel 0 the visitor, channel 1 the agent
+    events.jsonl.gz    timeline of the session, one JSON object per line
+
+Every event has `t` (seconds since the recorder started), `type` and
+`turn`, the number of user turns seen so far:
+
+    meta           language, room, models and turn-handling settings
+    transcript     final STT transcripts as they arrive
+    user_turn      each transcript handed to on_user_turn_completed, with
+                   its ChatMessage.metrics; it starts a new `turn`
+    llm            one LLM request: the raw stream chunks, function-call
+                   markup included, as [offset, text, tool calls]
+    tool_call      name, arguments, output and error flag
+    agent_message  what the agent said, whether it was interrupted, metrics
+    state          agent/user state changes; agent ones carry `at`, the
+                   wall-clock time the framework stamped them with, which
+                   is what the user turn metrics are measured in
+
+Audio is encoded by the framework's RecorderIO on its own thread. Events are
+kept in memory and written once when the session ends, so recording adds no
+disk I/O to the conversation itself.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterable
+
+logger = logging.getLogger(__name__)
+
+RECORD_SESSIONS = os.getenv("RECORD_SESSIONS", "0") in ("1", "true", "yes")
+RECORDINGS_DIR = os.getenv(
+    "RECORDINGS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "recordings"),
+)
+
+EVENTS_FILE = "events.jsonl.gz"
+AUDIO_FILE = "audio.ogg"
+
+
+class SessionRecorder:
+    """Collects one session's timeline; every method is a no-op when disabled."""
+
+    def __init__(self, directory: str | None) -> None:
+        self.directory = directory
+        self.turn = 0
+        self._t0 = time.perf_counter()
+        self._events: list[dict[str, Any]] = []
+        self._audio: Any = None
+
+    @classmethod
+    def for_job(cls, job_id: str) -> "SessionRecorder":
+        return cls(os.path.join(RECORDINGS_DIR, job_id) if RECORD_SESSIONS else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - self._t0, 4)
+
+    def event(self, type: str, **fields: Any) -> None:
+        if self.enabled:
+            self._events.append({"t": self._now(), "type": type, "turn": self.turn, **fields})
+
+    def user_turn(self, text: str, metrics: dict[str, Any]) -> None:
+        self.turn += 1
+        self.event("user_turn", text=text, metrics=metrics)
+
+    async def record_llm(self, stream: AsyncIterable[Any]) -> AsyncIterable[Any]:
+        """Pass an LLM chunk stream through, keeping its chunks and timing."""
+        if not self.enabled:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        started = self._now()
+        chunks: list[list[Any]] = []
+        completed = False
+        try:
+            async for chunk in stream:
+                delta = getattr(chunk, "delta", None)
+                if delta is not None:
+                    calls = [[c.name, c.arguments, c.call_id] for c in delta.tool_calls or []]
+                    chunks.append([round(self._now() - started, 4), delta.content or "", calls])
+                yield chunk
+            completed = True
+        finally:
+            # Also kept when the turn is interrupted mid-stream
+            self._events.append({"t": started, "type": "llm", "turn": self.turn,
+                                 "chunks": chunks, "completed": completed})
+
+    async def start_audio(self, session: Any) -> None:
+        """Tee the session's audio input and output into audio.ogg."""
+        if not self.enabled or not (session.input.audio and session.output.audio):
+            return
+        from livekit.agents.voice.recorder_io import RecorderIO
+
+        self._audio = RecorderIO(agent_session=session)
+        session.input.audio = self._audio.record_input(session.input.audio)
+        session.output.audio = self._audio.record_output(session.output.audio)
+        await self._audio.start(output_path=os.path.join(self.directory, AUDIO_FILE))
+
+    async def aclose(self) -> None:
+        if not self.enabled:
+            return
+        if self._audio is not None:
+            await self._audio.aclose()
+        await asyncio.get_running_loop().run_in_executor(None, self._write)
+
+    def _write(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, EVENTS_FILE)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for event in sorted(self._events, key=lambda e: e["t"]):
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        logger.info(f"[RECORDER] Wrote {len(self._events)} events to {self.directory}")
+
+
+def load_events(directory: str) -> list[dict[str, Any]]:
+    with gzip.open(os.path.join(directory, EVENTS_FILE), "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
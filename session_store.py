@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Append-only store for conversation transcripts, tool calls and token usage.
+
+Sessions call `SessionStore.record()` from the event loop; records go into a
+bounded in-memory buffer and a background thread writes them to SQLite in
+batches, so a slow disk never stalls audio or LLM streaming.
+
+Query from the command line:
+    python session_store.py sessions --language en --hours 24
+    python session_store.py events --room room-1a2b3c4d
+    python session_store.py usage --hours 168
+    python session_store.py bench --records 50000
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.getenv(
+    "SESSION_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.sqlite3"),
+)
+
+# Buffer and batching limits. When the buffer is full new records are dropped
+# (and counted) rather than blocking the caller.
+MAX_BUFFERED_RECORDS = 10_000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+_COLUMNS = (
+    "ts", "session_id", "room", "language", "kind", "role", "text",
+    "tool_name", "prompt_tokens", "completion_tokens", "payload",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    session_id TEXT NOT NULL,
+    room TEXT,
+    language TEXT,
+    kind TEXT NOT NULL,
+    role TEXT,
+    text TEXT,
+    tool_name TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_room_ts ON events (room, ts);
+CREATE INDEX IF NOT EXISTS idx_events_language_ts ON events (language, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_session ON events (session_id, ts);
+"""
+
+
+_INSERT = f"INSERT INTO events ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+def _row(session_id: str, kind: str, fields: dict[str, Any]) -> tuple:
+    payload = fields.pop("payload", None)
+    extra = {k: v for k, v in fields.items() if k not in _COLUMNS}
+    if extra:
+        payload = {**(payload or {}), **extra}
+    return (
+        fields.get("ts") or time.time(),
+        session_id,
+        fields.get("room"),
+        fields.get("language"),
+        kind,
+        fields.get("role"),
+        fields.get("text"),
+        fields.get("tool_name"),
+        fields.get("prompt_tokens"),
+        fields.get("completion_tokens"),
+        json.dumps(payload, default=str) if payload is not None else None,
+    )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    # WAL lets several job processes append to the same file concurrently.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class SessionStore:
+    """Bounded buffer drained into SQLite by a background writer thread."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        max_buffered: int = MAX_BUFFERED_RECORDS,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue: queue.Queue[tuple | None] = queue.Queue(maxsize=max_buffered)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="session-store-writer", daemon=True)
+                self._thread.start()
+
+    def record(self, session_id: str, kind: str, **fields: Any) -> None:
+        """Queue one record; never blocks. Unknown fields go into `payload`."""
+        self.start()
+        try:
+            self._queue.put_nowait(_row(session_id, kind, fields))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"[STORE] Buffer full, dropped {self.dropped} records so far")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything buffered and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    async def aclose(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        stopping = False
+        try:
+            while not stopping:
+                batch: list[tuple] = []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if item is None:
+                    stopping = True
+                if batch:
+                    try:
+                        with conn:
+                            conn.executemany(_INSERT, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error as e:
+                        logger.error(f"[STORE] Failed to write {len(batch)} records: {e}")
+        finally:
+            conn.close()
+
+
+_store: SessionStore | None = None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store, created on first use so job processes own their writer."""
+    global _store
+    if _store is None:
+        _store = SessionStore()
+        # Flushes what is left when sessions share a process and none of
+        # them owns the store
+        atexit.register(_store.close)
+    return _store
+
+
+# ── Query CLI ──
+
+
+def _since(hours: float | None) -> float:
+    return time.time() - hours * 3600 if hours else 0.0
+
+
+def _print_rows(cursor: sqlite3.Cursor) -> None:
+    columns = [d[0] for d in cursor.description]
+    for row in cursor:
+        print(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+
+
+def _cmd_sessions(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    sql = """
+        SELECT session_id, room, language,
+               datetime(MIN(ts), 'unixepoch') AS started,
+               ROUND(MAX(ts) - MIN(ts), 1) AS duration_s,
+               SUM(kind = 'message' AND role = 'user') AS user_turns,
+               SUM(kind = 'tool_call') AS tool_calls,
+               SUM(COALESCE(prompt_tokens, 0)) AS prompt_tokens,
+               SUM(COALESCE(completion_tokens, 0)) AS completion_tokens
+        FROM events
+        WHERE ts >= ? AND (? IS NULL OR room = ?) AND (? IS NULL OR language = ?)
+        GROUP BY session_id ORDER BY MIN(ts) DESC LIMIT ?
+    """
+    _print_rows(conn.execute(sql, (
+        _since(args.hours), args.room, args.room, args.language, args.language, args.limit)))
+
+
+def _cmd_events(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    sql = """
+        SELECT datetime(ts, 'unixepoch') AS time, session_id, room, language, kind,
+               role, text, tool_name, prompt_tokens, completion_tokens, payload
+        FROM events
+        WHERE ts >= ? AND (? IS NULL OR room = ?) AND (? IS NULL OR language = ?)
+          AND (? IS NULL OR kind = ?) AND (? IS NULL OR session_id = ?)
+        ORDER BY ts LIMIT ?
+    """
+    _print_rows(conn.execute(sql, (
+        _since(args.hours), args.room, args.room, args.language, args.language,
+        args.kind, args.kind, args.session, args.session, args.limit)))
+
+
+def _cmd_usage(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    sql = """
+        SELECT date(ts, 'unixepoch') AS day, language,
+               COUNT(DISTINCT session_id) AS sessions,
+               COUNT(*) AS llm_requests,
+               SUM(prompt_tokens) AS prompt_tokens,
+               SUM(completion_tokens) AS completion_tokens,
+               ROUND(AVG(prompt_tokens), 0) AS avg_prompt_tokens_per_turn
+        FROM events
+        WHERE kind = 'llm_usage' AND ts >= ? AND (? IS NULL OR language = ?)
+        GROUP BY day, language ORDER BY day DESC, language
+    """
+    _print_rows(conn.execute(sql, (_since(args.hours), args.language, args.language)))
+
+
+async def _bench(args: argparse.Namespace) -> None:
+    """Measure event-loop lag while sessions record at a high rate."""
+    path = args.db or os.path.join(os.path.dirname(DEFAULT_DB_PATH), "bench.sqlite3")
+    if os.path.exists(path):
+        os.remove(path)
+
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def monitor() -> None:
+        tick = 0.005
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - started - tick)
+
+    async def produce(record) -> None:
+        for i in range(args.records):
+            record(
+                f"bench-{i % 50}", "message", room=f"room-{i % 50}", language="en",
+                role="user", text="how much does the web agent cost " * 4)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+    def report(label: str, elapsed: float) -> None:
+        ordered = sorted(lags)
+        p99 = ordered[int(len(ordered) * 0.99) - 1] if ordered else 0.0
+        print(f"{label}: {args.records} records in {elapsed:.2f}s "
+              f"({args.records / elapsed:.0f}/s), loop lag p99={p99 * 1000:.1f}ms "
+              f"max={max(ordered, default=0.0) * 1000:.1f}ms")
+
+    # Baseline: synchronous commit per record on the event loop.
+    conn = _connect(path)
+
+    def inline(session_id: str, kind: str, **fields: Any) -> None:
+        with conn:
+            conn.execute(_INSERT, _row(session_id, kind, fields))
+
+    monitor_task = asyncio.create_task(monitor())
+    started = time.perf_counter()
+    await produce(inline)
+    report("inline sqlite", time.perf_counter() - started)
+    done.set()
+    await monitor_task
+    conn.close()
+
+    lags.clear()
+    done.clear()
+    store = SessionStore(path)
+    monitor_task = asyncio.create_task(monitor())
+    started = time.perf_counter()
+    await produce(store.record)
+    report("buffered store", time.perf_counter() - started)
+    done.set()
+    await monitor_task
+    await store.aclose()
+    print(f"buffered store: written={store.written} dropped={store.dropped}")
+    os.remove(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the session analytics store")
+    parser.add_argument("--db", default=None, help=f"SQLite path (default {DEFAULT_DB_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("sessions", "events", "usage"):
+        p = sub.add_parser(name)
+        p.add_argument("--language")
+        p.add_argument("--hours", type=float, help="only records from the last N hours")
+        if name != "usage":
+            p.add_argument("--room")
+            p.add_argument("--limit", type=int, default=100)
+        if name == "events":
+            p.add_argument("--kind", help="message, tool_call, llm_usage or session_usage")
+            p.add_argument("--session")
+
+    bench = sub.add_parser("bench", help="measure event-loop lag at high write rates")
+    bench.add_argument("--records", type=int, default=20_000)
+
+    args = parser.parse_args()
+    if args.command == "bench":
+        asyncio.run(_bench(args))
+        return
+
+    conn = _connect(args.db or DEFAULT_DB_PATH)
+    try:
+        {"sessions": _cmd_sessions, "events": _cmd_events, "usage": _cmd_usage}[args.command](conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 """
-Script to properly shutdown the agent and server processes
+Script to drain and shutdown the agent and server processes
+
+Processes are found through the PID files they write on startup (see
+drain.py), never by process name. Each one gets SIGTERM, which puts it in
+drain mode: the token server stops issuing tokens and the agent worker stops
+accepting jobs while in-flight conversations finish. Only a process that is
+still alive after the deadline is force-killed.
 """
+import argparse
+import json
 import os
 import signal
-import subprocess
-import sys
 import time
 import logging
+import urllib.request
+
+from drain import (
+    AGENT_DRAIN_TIMEOUT,
+    PROCESS_SCRIPTS,
+    RUN_DIR,
+    TOKEN_SERVER_DRAIN_GRACE,
+    pid_file,
+    read_pid_file,
+)
 
 # Set up logging
 logging.basicConfig(
@@ -16,88 +32,130 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def find_processes_by_name(process_name):
-    """Find processes by name"""
+# LiveKit worker HTTP endpoint (WorkerOptions port) reporting active jobs
+WORKER_INFO_URL = os.getenv("AGENT_WORKER_INFO_URL", "http://127.0.0.1:8081/worker")
+
+POLL_INTERVAL = 2.0
+
+# Drain progress is written here on every poll so dashboards or deploy
+# scripts can follow it without parsing logs.
+DRAIN_STATUS_FILE = os.path.join(RUN_DIR, "drain.json")
+
+
+def is_running(pid):
+    """Check whether a PID is alive"""
     try:
-        if os.name == 'nt':  # Windows
-            result = subprocess.run(['tasklist', '/FI', f'IMAGENAME eq {process_name}', '/FO', 'CSV'], 
-                                  capture_output=True, text=True)
-            lines = result.stdout.strip().split('\n')[1:]  # Skip header
-            processes = []
-            for line in lines:
-                if line.strip():
-                    parts = line.split(',')
-                    if len(parts) >= 2:
-                        pid = parts[1].strip('"')
-                        processes.append(pid)
-            return processes
-        else:  # Unix-like
-            result = subprocess.run(['pgrep', '-f', process_name], capture_output=True, text=True)
-            return result.stdout.strip().split('\n') if result.stdout.strip() else []
-    except Exception as e:
-        logger.error(f"Error finding processes: {e}")
-        return []
-
-def kill_process(pid):
-    """Kill a process by PID"""
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def pid_matches(pid, name):
+    """Guard against stale PID files whose PID now belongs to another process"""
+    cmdline_path = f"/proc/{pid}/cmdline"
+    if not os.path.exists(cmdline_path):
+        return True  # No procfs (e.g. macOS/Windows): trust the PID file
     try:
-        if os.name == 'nt':  # Windows
-            subprocess.run(['taskkill', '/PID', str(pid), '/F'], check=True)
-        else:  # Unix-like
-            os.kill(int(pid), signal.SIGTERM)
-        logger.info(f"Killed process {pid}")
+        with open(cmdline_path, "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return False
+    return PROCESS_SCRIPTS[name] in cmdline
+
+
+def active_jobs():
+    """Number of conversations still running on the agent worker, if reachable"""
+    try:
+        with urllib.request.urlopen(WORKER_INFO_URL, timeout=1) as resp:
+            return int(json.loads(resp.read()).get("active_jobs", 0))
+    except Exception:
+        return None
+
+
+def write_status(status):
+    os.makedirs(RUN_DIR, exist_ok=True)
+    tmp = DRAIN_STATUS_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, DRAIN_STATUS_FILE)
+
+
+def drain_process(name, deadline):
+    """SIGTERM one process, wait for it to drain, SIGKILL it after the deadline"""
+    pid = read_pid_file(name)
+    if pid is None:
+        logger.info(f"No PID file for {name} at {pid_file(name)}, skipping")
+        return True
+    if not is_running(pid):
+        logger.info(f"{name} (pid {pid}) is not running, removing stale PID file")
+        os.remove(pid_file(name))
         return True
-    except Exception as e:
-        logger.error(f"Failed to kill process {pid}: {e}")
+    if not pid_matches(pid, name):
+        logger.warning(
+            f"PID {pid} from {pid_file(name)} is not {PROCESS_SCRIPTS[name]}, refusing to signal it")
         return False
 
-def shutdown_agent_and_server():
-    """Shutdown agent and server processes"""
+    logger.info(f"Sending SIGTERM to {name} (pid {pid}), drain deadline {deadline:.0f}s")
+    os.kill(pid, signal.SIGTERM)
+
+    started = time.monotonic()
+    initial_jobs = active_jobs() if name == "agent" else None
+    while is_running(pid):
+        elapsed = time.monotonic() - started
+        jobs = active_jobs() if name == "agent" else None
+        write_status({
+            "process": name,
+            "pid": pid,
+            "state": "draining",
+            "elapsed_s": round(elapsed, 1),
+            "deadline_s": deadline,
+            "active_jobs": jobs,
+            "initial_jobs": initial_jobs,
+            "updated_at": time.time(),
+        })
+        if jobs is not None:
+            logger.info(f"[DRAIN] {name}: {jobs} active conversations, {elapsed:.0f}s elapsed")
+        if elapsed >= deadline:
+            logger.warning(
+                f"[DRAIN] {name} still running after {deadline:.0f}s, sending SIGKILL to pid {pid}")
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            write_status({"process": name, "pid": pid, "state": "killed",
+                          "elapsed_s": round(elapsed, 1), "active_jobs": jobs,
+                          "initial_jobs": initial_jobs, "updated_at": time.time()})
+            return False
+        time.sleep(POLL_INTERVAL)
+
+    elapsed = time.monotonic() - started
+    write_status({"process": name, "pid": pid, "state": "exited",
+                  "elapsed_s": round(elapsed, 1), "active_jobs": 0,
+                  "initial_jobs": initial_jobs, "updated_at": time.time()})
+    logger.info(f"[DRAIN] {name} (pid {pid}) exited cleanly after {elapsed:.1f}s")
+    return True
+
+
+def shutdown_agent_and_server(targets=("server", "agent"), agent_deadline=AGENT_DRAIN_TIMEOUT):
+    """Drain the token server first so no new visitors are sent to the agent"""
     logger.info("Starting shutdown process...")
-    
-    # Find Python processes that might be running our scripts
-    python_processes = find_processes_by_name('python.exe' if os.name == 'nt' else 'python')
-    logger.info(f"Found {len(python_processes)} Python processes")
-    
-    # Find processes using port 5001 (our server port)
-    try:
-        if os.name == 'nt':  # Windows
-            result = subprocess.run(['netstat', '-ano'], capture_output=True, text=True)
-            lines = result.stdout.split('\n')
-            port_processes = []
-            for line in lines:
-                if ':5001' in line and 'LISTENING' in line:
-                    parts = line.split()
-                    if len(parts) >= 5:
-                        pid = parts[-1]
-                        port_processes.append(pid)
-        else:  # Unix-like
-            result = subprocess.run(['lsof', '-ti:5001'], capture_output=True, text=True)
-            port_processes = result.stdout.strip().split('\n') if result.stdout.strip() else []
-        
-        logger.info(f"Found {len(port_processes)} processes using port 5001")
-        
-        # Kill processes using port 5001
-        for pid in port_processes:
-            if pid.strip():
-                logger.info(f"Killing process {pid} using port 5001")
-                kill_process(pid.strip())
-                
-    except Exception as e:
-        logger.error(f"Error checking port 5001: {e}")
-    
-    # Give processes time to shutdown gracefully
-    time.sleep(2)
-    
-    # Check if any processes are still running
-    remaining_processes = find_processes_by_name('python.exe' if os.name == 'nt' else 'python')
-    if remaining_processes:
-        logger.warning(f"Still {len(remaining_processes)} Python processes running")
-        for pid in remaining_processes:
-            logger.info(f"Force killing remaining process {pid}")
-            kill_process(pid)
-    
+    deadlines = {
+        "server": TOKEN_SERVER_DRAIN_GRACE + 10,
+        # The worker enforces its own drain timeout; allow it time to exit
+        "agent": agent_deadline + 30,
+    }
+    ok = True
+    for name in targets:
+        ok = drain_process(name, deadlines[name]) and ok
     logger.info("Shutdown process completed")
+    return ok
+
 
 if __name__ == "__main__":
-    shutdown_agent_and_server()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=["agent", "server", "all"], default="all")
+    parser.add_argument("--deadline", type=float, default=AGENT_DRAIN_TIMEOUT,
+                        help="seconds to let in-flight conversations finish")
+    args = parser.parse_args()
+    targets = ("server", "agent") if args.target == "all" else (args.target,)
+    raise SystemExit(0 if shutdown_agent_and_server(targets, args.deadline) else 1)
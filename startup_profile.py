@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiler for the agent worker.
+
+    python startup_profile.py imports   # per-module import and model-load time
+    python startup_profile.py worker    # time-to-ready and per-process memory
+
+`imports` runs in a fresh interpreter and imports the agent's dependencies
+one by one, reporting wall time and RSS growth for each: first what the
+worker process loads before its first job, then the plugins only job
+processes load, then the model loads a job needs (Silero VAD,
+turn-detector weights).
+
+`worker` starts `agent.py start`, waits for the "registered worker" log line
+and then reports RSS and PSS for every process in the worker tree. PSS
+splits pages shared copy-on-write between processes, so comparing the PSS
+total with the RSS total shows how much the forkserver preload is sharing.
+Run it before and after a change on the same host to compare.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# What the worker process imports before it takes a job: agent.py and the
+# modules it pulls in, in that order
+WORKER_IMPORTS = [
+    "dotenv",
+    "livekit.rtc",
+    "livekit.agents",
+    "livekit.plugins.turn_detector.multilingual",
+    "prompts",
+    "tools",
+    "providers",
+    "session_store",
+    "agent",
+]
+
+# Only job processes import these, through preload.py
+JOB_IMPORTS = [
+    "livekit.plugins.cartesia",
+    "livekit.plugins.groq",
+    "livekit.plugins.noise_cancellation",
+    "livekit.plugins.silero",
+]
+
+
+def current_rss_mb(pid: int | None = None) -> float:
+    """Resident set size of a process in MiB (0 when /proc is unavailable)."""
+    return _proc_status_kb(pid or os.getpid(), "VmRSS") / 1024
+
+
+def current_pss_mb(pid: int | None = None) -> float:
+    """Proportional set size in MiB: shared pages split between their users."""
+    return _pss_kb(pid or os.getpid()) / 1024
+
+
+def _proc_status_kb(pid: int, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _pss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid: int) -> list[int]:
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+            found.extend(_children(int(entry)))
+    return found
+
+
+def _cmdline(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace").strip()[:80]
+    except OSError:
+        return "?"
+
+
+def profile_imports() -> None:
+    import importlib
+
+    print(f"{'step':<48}{'seconds':>10}{'RSS +MiB':>10}")
+    total_started = time.perf_counter()
+
+    def import_all(names: list[str]) -> None:
+        for name in names:
+            rss_before = current_rss_mb()
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"import {name:<41}{'failed':>10}  ({e})")
+                continue
+            print(f"import {name:<41}{time.perf_counter() - started:>10.3f}"
+                  f"{current_rss_mb() - rss_before:>10.1f}")
+
+    import_all(WORKER_IMPORTS)
+    print(f"{'worker process (final RSS)':<48}{time.perf_counter() - total_started:>10.3f}"
+          f"{current_rss_mb():>10.1f}")
+    import_all(JOB_IMPORTS)
+
+    def load_vad():
+        from livekit.plugins import silero
+        silero.VAD.load()
+
+    def load_turn_detector():
+        from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+        _EUORunnerMultilingual().initialize()
+
+    for label, fnc in (("load silero VAD", load_vad),
+                       ("load turn-detector weights", load_turn_detector)):
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        try:
+            fnc()
+        except Exception as e:
+            print(f"{label:<48}{'failed':>10}  ({e})")
+            continue
+        print(f"{label:<48}{time.perf_counter() - started:>10.3f}"
+              f"{current_rss_mb() - rss_before:>10.1f}")
+
+    print(f"{'total (final RSS)':<48}{time.perf_counter() - total_started:>10.3f}"
+          f"{current_rss_mb():>10.1f}")
+
+
+def profile_worker(timeout: float, settle: float) -> int:
+    agent_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent.py")
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, agent_path, "start"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    ready_after = None
+    try:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            if "registered worker" in line:
+                ready_after = time.perf_counter() - started
+                break
+            if time.perf_counter() - started > timeout:
+                break
+        if ready_after is None:
+            print(f"worker did not register within {timeout:.0f}s")
+            return 1
+        print(f"time-to-ready: {ready_after:.2f}s")
+        # Keep draining the worker's output so it never blocks on a full pipe
+        threading.Thread(target=proc.stdout.read, daemon=True).start()
+
+        # Idle job processes are spawned right after registration
+        time.sleep(settle)
+        pids = [proc.pid] + _children(proc.pid)
+        total_rss = total_pss = 0
+        print(f"{'pid':>8}{'RSS MiB':>10}{'PSS MiB':>10}  command")
+        for pid in pids:
+            rss, pss = _proc_status_kb(pid, "VmRSS"), _pss_kb(pid)
+            total_rss += rss
+            total_pss += pss
+            print(f"{pid:>8}{rss / 1024:>10.1f}{pss / 1024:>10.1f}  {_cmdline(pid)}")
+        print(f"{'total':>8}{total_rss / 1024:>10.1f}{total_pss / 1024:>10.1f}"
+              f"  ({len(pids)} processes)")
+        return 0
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile agent worker cold start")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("imports", help="per-module import and model-load time")
+    worker = sub.add_parser("worker", help="time-to-ready and per-process memory")
+    worker.add_argument("--timeout", type=float, default=120.0)
+    worker.add_argument("--settle", type=float, default=10.0,
+                        help="seconds to wait for idle job processes before sampling")
+    args = parser.parse_args()
+
+    if args.command == "imports":
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        profile_imports()
+    else:
+        raise SystemExit(profile_worker(args.timeout, args.settle))
+
+
+if __name__ == "__main__":
+    main()
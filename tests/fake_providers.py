@@ -0,0 +1,149 @@
+"""
+Offline stand-ins for the Groq and Cartesia providers used by providers.py.
+
+Each fake waits `delay` seconds before answering (forever with `hang`, until
+the request is cancelled) and raises APIConnectionError instead when `fail`
+is set, so the hedge, the circuit
+breakers and the STT/TTS fallback chains can be driven without a network.
+Both attributes may be changed between calls to script an outage and a
+recovery. `calls` holds the monotonic time of every request.
+"""
+import asyncio
+import time
+
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectionError,
+    APIConnectOptions,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+
+
+class FakeLLM(llm.LLM):
+    def __init__(
+        self, model: str = "fake-llm", *, delay: float = 0.0, fail: bool = False,
+        hang: bool = False, reply: str = "Happy to help with that.",
+    ) -> None:
+        super().__init__()
+        self._model = model
+        self.delay = delay
+        self.hang = hang
+        self.fail = fail
+        self.reply = reply
+        self.calls: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls=NOT_GIVEN,
+        tool_choice=NOT_GIVEN,
+        extra_kwargs=NOT_GIVEN,
+    ) -> "FakeLLMStream":
+        self.calls.append(time.monotonic())
+        return FakeLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        fake: FakeLLM = self._llm
+        request_id = utils.shortuuid()
+        # Like Groq, the role arrives before any content
+        self._event_ch.send_nowait(
+            llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant")))
+        await asyncio.sleep(fake.delay)
+        if fake.hang:
+            await asyncio.Event().wait()
+        if fake.fail:
+            raise APIConnectionError(f"{fake.model} is unavailable", retryable=False)
+        for word in fake.reply.split(" "):
+            self._event_ch.send_nowait(
+                llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=word + " ")))
+
+
+class FakeSTT(stt.STT):
+    def __init__(
+        self, model: str = "fake-stt", *, delay: float = 0.0, fail: bool = False,
+        transcript: str = "what does it cost",
+    ) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=False, interim_results=False))
+        self._model = model
+        self.delay = delay
+        self.fail = fail
+        self.transcript = transcript
+        self.calls: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    async def _recognize_impl(
+        self, buffer: utils.AudioBuffer, *, language=NOT_GIVEN, conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        self.calls.append(time.monotonic())
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise APIConnectionError(f"{self.model} is unavailable", retryable=False)
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language=language or "en", text=self.transcript)],
+        )
+
+
+class FakeTTS(tts.TTS):
+    def __init__(self, model: str = "fake-tts", *, delay: float = 0.0, fail: bool = False) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False), sample_rate=24000, num_channels=1)
+        self._model = model
+        self.delay = delay
+        self.fail = fail
+        self.calls: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def synthesize(
+        self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "FakeChunkedStream":
+        self.calls.append(time.monotonic())
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        fake: FakeTTS = self._tts
+        await asyncio.sleep(fake.delay)
+        if fake.fail:
+            raise APIConnectionError(f"{fake.model} is unavailable", retryable=False)
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=fake.sample_rate,
+            num_channels=fake.num_channels,
+            mime_type="audio/pcm",
+        )
+        # 50ms of silence per character
+        output_emitter.push(b"\x00\x00" * (fake.sample_rate // 20) * len(self.input_text))
+        output_emitter.flush()
@@ -0,0 +1,34 @@
+from backchannel import AgentSpeech, asked_question, classify
+
+
+def test_question_mark_before_trailing_statement_counts():
+    assert asked_question("Want me to take you there? It has the full picture.")
+    assert asked_question("Voulez-vous voir la page ? Elle est super.", "fr")
+
+
+def test_offer_without_question_mark_counts():
+    assert asked_question("I can show you our careers page if you like.")
+    assert not asked_question("Our web agent answers visitors around the clock.")
+
+
+def test_user_question_is_never_suppressed():
+    assert not classify("Really?", "en").suppress
+    assert not classify("Ah bon ?", "fr").suppress
+
+
+def test_only_acknowledgements_over_agent_speech_are_dropped():
+    assert classify("Okay.", "en", overlapped_agent=True).suppress
+    assert not classify("Okay.", "en", overlapped_agent=False).suppress
+
+
+def test_agent_speech_overlap():
+    speech = AgentSpeech()
+    assert speech.overlapped(1.0, 2.0) is None
+    speech.update("speaking", 10.0)
+    assert speech.overlapped(11.0, 11.5)
+    speech.update("listening", 20.0)
+    assert speech.overlapped(19.5, 20.5)
+    assert not speech.overlapped(21.0, 21.5)
+    # The reply to a turn that came after the agent went quiet
+    speech.update("speaking", 22.0)
+    assert not speech.overlapped(21.0, 21.5)
@@ -0,0 +1,83 @@
+import datetime
+import json
+import logging
+from types import SimpleNamespace
+
+import dispatch
+import session_store
+from dispatch import MAX_FIELD_CHARS, DispatchTiming, read_metadata, session_metadata
+
+
+def _participant(at: float | None) -> SimpleNamespace:
+    joined = datetime.datetime.fromtimestamp(at, tz=datetime.timezone.utc) if at else None
+    return SimpleNamespace(joined_at=joined)
+
+
+def test_session_metadata_is_sanitised():
+    metadata = session_metadata("de", campaign="x" * 500, page="")
+    assert metadata["language"] == "en"
+    assert len(metadata["campaign"]) == MAX_FIELD_CHARS
+    assert metadata["page"] is None
+    assert isinstance(metadata["issued_at"], float)
+
+
+def test_metadata_round_trips_through_the_token():
+    metadata = session_metadata("fr", campaign="spring-launch", page="/pricing")
+    assert read_metadata(json.dumps(metadata)) == metadata
+
+
+def test_read_metadata_under_automatic_dispatch_or_bad_input(caplog):
+    assert read_metadata(None) == {}
+    assert read_metadata("") == {}
+    assert read_metadata('["fr"]') == {}
+    with caplog.at_level(logging.WARNING, logger="dispatch"):
+        assert read_metadata("{not json") == {}
+    assert "malformed job metadata" in caplog.text
+
+
+def test_read_metadata_drops_unknown_language_only():
+    assert read_metadata('{"language": "xx", "page": "/blog"}') == {"page": "/blog"}
+
+
+def test_visitor_to_agent_uses_server_join_times():
+    timing = DispatchTiming("automatic", issued_at=100.0, connected=103.0, first_audio=104.5)
+    timing.joined(_participant(102.8), _participant(101.0))
+    # Only the first visitor counts
+    timing.joined(_participant(102.8), _participant(102.0))
+    assert timing.since_issue() == {
+        "mode": "automatic", "job_started": None, "connected": 3.0, "first_audio": 4.5,
+        "visitor_to_agent": 1.8, "visitor_to_audio": 3.5,
+    }
+
+
+def test_agent_waiting_in_a_warm_room_is_negative():
+    timing = DispatchTiming("explicit", connected=50.0)
+    timing.joined(_participant(None), _participant(80.0))
+    timing.leased(79.5)
+    timing.mark("first_audio")
+    since = timing.since_issue()
+    assert since["mode"] == "warm"
+    # Unstamped agent join falls back to our own connect time
+    assert since["visitor_to_agent"] == -30.0
+
+
+def test_report_shows_visitor_wait_per_mode(tmp_path, capsys):
+    path = str(tmp_path / "sessions.sqlite3")
+    conn = session_store._connect(path)
+    rows = [
+        {"mode": "automatic", "job_started": 1.2, "connected": 1.6, "first_audio": 3.0,
+         "visitor_to_agent": 1.1, "visitor_to_audio": 2.5},
+        {"mode": "explicit", "job_started": 0.2, "connected": 0.5, "first_audio": 1.9,
+         "visitor_to_agent": -0.3, "visitor_to_audio": 1.2},
+    ]
+    with conn:
+        for payload in rows:
+            conn.execute(session_store._INSERT,
+                         session_store._row("s", "dispatch_timing", {"payload": payload}))
+    conn.close()
+
+    dispatch.report(path, None)
+    lines = {l.split()[0]: l.split() for l in capsys.readouterr().out.splitlines()[1:3]}
+    assert lines["automatic"][8] == "1100ms"
+    assert lines["explicit"][8] == "-300ms"
+    assert lines["explicit"][10] == "1200ms"
@@ -0,0 +1,116 @@
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import drain
+import shutdown_agent
+
+# Importing the token server installs its drain handlers; keep pytest's
+_handlers = {s: signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM)}
+import web_agnet_server as server  # noqa: E402
+for _signum, _handler in _handlers.items():
+    signal.signal(_signum, _handler)
+
+# Exits cleanly on SIGTERM; the trailing argument is what pid_matches looks for
+DRAINING_PROCESS = (
+    "import signal, sys, time\n"
+    "signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))\n"
+    "print('ready', flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(drain, "RUN_DIR", str(tmp_path))
+    monkeypatch.setattr(shutdown_agent, "DRAIN_STATUS_FILE", str(tmp_path / "drain.json"))
+    monkeypatch.setattr(shutdown_agent, "POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(shutdown_agent, "WORKER_INFO_URL", "http://127.0.0.1:9/worker")
+    return tmp_path
+
+
+def _spawn(*args: str) -> subprocess.Popen:
+    proc = subprocess.Popen(list(args), stdout=subprocess.PIPE, text=True)
+    assert proc.stdout.readline() == "ready\n"
+    # Reap it as soon as it exits, or is_running would see the zombie
+    threading.Thread(target=proc.wait, daemon=True).start()
+    return proc
+
+
+def _write_pid(name: str, pid: int) -> None:
+    with open(drain.pid_file(name), "w") as f:
+        f.write(str(pid))
+
+
+def test_pid_file_of_an_exited_process_is_removed(run_dir):
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    _write_pid("agent", proc.pid)
+
+    assert shutdown_agent.drain_process("agent", deadline=1)
+    assert drain.read_pid_file("agent") is None
+
+
+def test_reused_pid_is_never_signalled(run_dir):
+    # The PID now belongs to something that is not the agent
+    proc = _spawn(sys.executable, "-c", DRAINING_PROCESS)
+    try:
+        _write_pid("agent", proc.pid)
+        assert not shutdown_agent.drain_process("agent", deadline=1)
+        time.sleep(0.1)
+        assert proc.poll() is None
+    finally:
+        proc.kill()
+
+
+def test_matching_process_drains_and_exits(run_dir):
+    proc = _spawn(sys.executable, "-c", DRAINING_PROCESS, "web_agnet_server.py")
+    _write_pid("server", proc.pid)
+
+    assert shutdown_agent.drain_process("server", deadline=10)
+    assert proc.wait(timeout=1) == 0
+    with open(run_dir / "drain.json") as f:
+        assert '"state": "exited"' in f.read()
+
+
+def test_server_drains_before_agent(monkeypatch):
+    drained = []
+    monkeypatch.setattr(
+        shutdown_agent, "drain_process", lambda name, deadline: drained.append(name) or True)
+
+    assert shutdown_agent.shutdown_agent_and_server()
+    assert drained == ["server", "agent"]
+
+
+def test_token_server_refuses_visitors_while_draining(monkeypatch):
+    timers = []
+
+    class _Timer:
+        def __init__(self, interval, function):
+            timers.append(interval)
+            self.daemon = False
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(server.threading, "Timer", _Timer)
+    monkeypatch.setattr(server, "draining", False)
+    monkeypatch.setattr(server, "drain_started_at", None)
+    monkeypatch.setattr(server, "rejected_during_drain", 0)
+    client = server.app.test_client()
+    assert client.get("/health").status_code == 200
+
+    server.signal_handler(signal.SIGTERM, None)
+    assert timers == [drain.TOKEN_SERVER_DRAIN_GRACE]
+
+    response = client.get("/getToken?language=en")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "draining"
+    assert response.get_json()["rejected_tokens"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+
+from livekit.agents import ChatContext, ModelSettings, llm
+
+import leaked_calls
+from leaked_calls import LEAK_STATS, LeakedCallFilter, argument_models, evaluate
+from tools import navigate_to_section, open_url
+
+ARGUMENTS = argument_models([open_url, navigate_to_section])
+
+
+def _run(text: str):
+    leak_filter = LeakedCallFilter(ARGUMENTS)
+    spoken, calls = leak_filter.feed(text)
+    rest, more = leak_filter.close()
+    return spoken + rest, calls + more
+
+
+def test_corpus():
+    assert evaluate()
+
+
+def test_arguments_checked_against_tool_parameters():
+    before = LEAK_STATS.copy()
+    _, calls = _run('<function=navigate_to_section>{"url": "https://autonomiq.ai"}</function>')
+    assert calls == []
+    _, calls = _run("<function=open_url>{}</function>")
+    assert calls == []
+    assert (LEAK_STATS - before)["rejected_calls"] == 2
+
+
+def test_valid_call_recovered():
+    text, calls = _run('Sure. <function=navigate_to_section>{"section": "pricing"}</function>')
+    assert text.strip() == "Sure."
+    assert [(c.name, c.arguments) for c in calls] == [("navigate_to_section", '{"section": "pricing"}')]
+
+
+class _LeakyChain:
+    """Stands in for HedgedLLM: every reply leaks a navigation call as text."""
+
+    def stream(self, chat_ctx, tools, tool_choice=None):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield llm.ChatChunk(id="leaky", delta=llm.ChoiceDelta(
+            role="assistant",
+            content='Sure. <function=navigate_to_section>{"section": "careers"}</function>'))
+
+
+def test_argument_models_built_once_per_agent(monkeypatch):
+    from agent import Assistant
+
+    built = []
+    build = leaked_calls.function_arguments_to_pydantic_model
+    monkeypatch.setattr(leaked_calls, "function_arguments_to_pydantic_model",
+                        lambda tool: built.append(tool) or build(tool))
+    agent = Assistant(_LeakyChain())
+    assert len(built) == len(agent.tools)
+
+    async def reply(model_settings):
+        calls = []
+        async for chunk in agent.llm_node(ChatContext(), agent.tools, model_settings):
+            calls += [c.name for c in chunk.delta.tool_calls]
+        return calls
+
+    for _ in range(3):
+        assert asyncio.run(reply(ModelSettings())) == ["navigate_to_section"]
+    assert asyncio.run(reply(ModelSettings(tool_choice="none"))) == []
+    assert len(built) == len(agent.tools)
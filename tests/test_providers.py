@@ -0,0 +1,213 @@
+import asyncio
+
+import pytest
+from livekit.agents import APIConnectionError, llm, utils
+
+import providers
+from fake_providers import FakeLLM, FakeSTT, FakeTTS
+from providers import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_AFTER, PROVIDER_STATS, CircuitBreaker, HedgedLLM,
+    SharedCircuits,
+)
+
+HEDGE_AFTER = 0.05
+# Longer than any test may take: a hedge must never fire on this timer
+NEVER = 60.0
+
+
+@pytest.fixture(autouse=True)
+def reset_providers(monkeypatch, tmp_path):
+    monkeypatch.setattr(providers, "CIRCUIT_STATE_PATH", str(tmp_path / "circuits.json"))
+    monkeypatch.setattr(providers, "_circuits", None)
+    providers._breakers.clear()
+    PROVIDER_STATS.clear()
+    yield
+    providers._breakers.clear()
+    PROVIDER_STATS.clear()
+
+
+def run_turn(hedged: HedgedLLM) -> tuple[str, bool]:
+    """Stream one reply; return its text and whether any content arrived."""
+    async def turn() -> tuple[str, bool]:
+        text = ""
+        async for chunk in hedged.stream(llm.ChatContext.empty(), [], tool_choice="auto"):
+            if chunk.delta and chunk.delta.content:
+                text += chunk.delta.content
+        return text.strip(), bool(text)
+
+    # Fails instead of hanging when a turn waits on the wrong timer
+    return asyncio.run(asyncio.wait_for(turn(), 5.0))
+
+
+def test_primary_answering_in_time_is_not_hedged():
+    primary, backup = FakeLLM("primary", reply="from primary"), FakeLLM("backup")
+    text, _ = run_turn(HedgedLLM([primary, backup], NEVER))
+    assert text == "from primary"
+    assert backup.calls == []
+    assert PROVIDER_STATS["hedge"] == 0
+    assert PROVIDER_STATS["win:groq/primary"] == 1
+
+
+def test_hedge_fires_after_hedge_after():
+    # The primary sends its role chunk and then never answers
+    primary = FakeLLM("primary", hang=True, reply="from primary")
+    backup = FakeLLM("backup", reply="from backup")
+    text, _ = run_turn(HedgedLLM([primary, backup], HEDGE_AFTER))
+    # Finishing at all means the silent primary was abandoned, not waited for
+    assert text == "from backup"
+    assert PROVIDER_STATS["hedge"] == 1
+    assert backup.calls[0] - primary.calls[0] >= HEDGE_AFTER
+    # A role-only chunk must not count as the primary answering
+    assert PROVIDER_STATS["win:groq/backup"] == 1
+
+
+def test_fast_failure_launches_next_candidate():
+    primary = FakeLLM("primary", fail=True)
+    backup = FakeLLM("backup", reply="from backup")
+    # With the hedge timer out of reach, only the failure can start the backup
+    text, _ = run_turn(HedgedLLM([primary, backup], NEVER))
+    assert text == "from backup"
+    assert PROVIDER_STATS["hedge"] == 0
+    assert PROVIDER_STATS["failure:groq/primary"] == 1
+
+
+def test_circuit_opens_after_threshold():
+    primary = FakeLLM("primary", fail=True)
+    backup = FakeLLM("backup", reply="from backup")
+    hedged = HedgedLLM([primary, backup], HEDGE_AFTER)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        assert run_turn(hedged)[0] == "from backup"
+    assert providers.get_breaker("groq/primary").state == "open"
+    assert PROVIDER_STATS["circuit_open:groq/primary"] == 1
+
+    # While open, the primary is not tried at all
+    run_turn(hedged)
+    assert len(primary.calls) == CIRCUIT_FAILURE_THRESHOLD
+    assert len(backup.calls) == CIRCUIT_FAILURE_THRESHOLD + 1
+
+
+def open_primary_circuit(hedged: HedgedLLM) -> None:
+    hedged.llms[0].fail = True
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        run_turn(hedged)
+    breaker = providers.get_breaker("groq/primary")
+    assert breaker.state == "open"
+    # Pretend the reset period has passed
+    breaker.opened_at -= CIRCUIT_RESET_AFTER
+    assert breaker.state == "half-open"
+
+
+def test_half_open_probe_closes_circuit_on_success():
+    primary = FakeLLM("primary", reply="from primary")
+    hedged = HedgedLLM([primary, FakeLLM("backup")], HEDGE_AFTER)
+    open_primary_circuit(hedged)
+
+    primary.fail = False
+    assert run_turn(hedged)[0] == "from primary"
+    breaker = providers.get_breaker("groq/primary")
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_half_open_probe_failure_reopens_circuit():
+    primary = FakeLLM("primary")
+    hedged = HedgedLLM([primary, FakeLLM("backup", reply="from backup")], HEDGE_AFTER)
+    open_primary_circuit(hedged)
+
+    # One failed probe is enough to open it again
+    assert run_turn(hedged)[0] == "from backup"
+    assert providers.get_breaker("groq/primary").state == "open"
+    assert PROVIDER_STATS["circuit_open:groq/primary"] == 2
+
+
+def test_half_open_admits_one_probe_at_a_time():
+    primary = FakeLLM("primary")
+    backup = FakeLLM("backup", reply="from backup")
+    hedged = HedgedLLM([primary, backup], NEVER)
+    open_primary_circuit(hedged)
+    calls_before = len(primary.calls)
+    primary.fail, primary.hang = False, True
+
+    async def concurrent_turns() -> list[str]:
+        async def turn() -> str:
+            text = ""
+            async for chunk in hedged.stream(llm.ChatContext.empty(), [], tool_choice="auto"):
+                if chunk.delta and chunk.delta.content:
+                    text += chunk.delta.content
+            return text.strip()
+
+        # The probe hangs, so the second turn finds the probe taken
+        probe = asyncio.ensure_future(turn())
+        await asyncio.sleep(0.05)
+        other = await asyncio.wait_for(turn(), 5.0)
+        probe.cancel()
+        return [other]
+
+    assert asyncio.run(concurrent_turns()) == ["from backup"]
+    assert len(primary.calls) == calls_before + 1
+    # The cancelled probe gave its slot back
+    assert providers.get_breaker("groq/primary").allow()
+
+
+def test_open_circuit_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.json")
+    # Each breaker has its own SharedCircuits, as separate job processes would
+    first = CircuitBreaker("groq/primary", circuits=SharedCircuits(path))
+    second = CircuitBreaker("groq/primary", circuits=SharedCircuits(path))
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        first.record_failure()
+    assert second.state == "open" and not second.allow()
+
+    first.opened_at -= CIRCUIT_RESET_AFTER
+    assert second.allow()  # the one probe, taken by the second process
+    assert not first.allow()
+    second.record_success()
+    assert first.state == "closed" and first.allow()
+
+
+def test_all_candidates_failing_reraises():
+    hedged = HedgedLLM([FakeLLM("primary", fail=True), FakeLLM("backup", fail=True)], HEDGE_AFTER)
+    with pytest.raises(APIConnectionError):
+        run_turn(hedged)
+    assert PROVIDER_STATS["failure:groq/primary"] == 1
+    assert PROVIDER_STATS["failure:groq/backup"] == 1
+
+
+def test_all_circuits_open_still_tries_every_provider():
+    primary, backup = FakeLLM("primary", fail=True), FakeLLM("backup", fail=True)
+    hedged = HedgedLLM([primary, backup], HEDGE_AFTER)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        with pytest.raises(APIConnectionError):
+            run_turn(hedged)
+
+    backup.fail = False
+    assert run_turn(hedged)[0] == "Happy to help with that."
+    assert len(primary.calls) == CIRCUIT_FAILURE_THRESHOLD + 1
+
+
+def test_stt_falls_back_to_next_provider():
+    from livekit.plugins import silero
+
+    async def recognize() -> str:
+        chain = [FakeSTT("primary", fail=True), FakeSTT("backup", transcript="show me pricing")]
+        adapter = providers.stt_fallback(chain, silero.VAD.load())
+        frame = utils.audio.rtc.AudioFrame.create(16000, 1, 1600)
+        event = await adapter.recognize([frame])
+        await adapter.aclose()
+        return event.alternatives[0].text
+
+    assert asyncio.run(recognize()) == "show me pricing"
+
+
+def test_tts_falls_back_to_next_provider():
+    async def synthesize() -> int:
+        primary, backup = FakeTTS("primary", fail=True), FakeTTS("backup")
+        adapter = providers.tts_fallback([primary, backup])
+        frames = [ev.frame async for ev in adapter.synthesize("Hello")]
+        await adapter.aclose()
+        # The adapter also probes the failed primary in the background
+        assert primary.calls and len(backup.calls) == 1
+        return sum(f.samples_per_channel for f in frames)
+
+    # The backup's audio came through: 50ms per character
+    assert asyncio.run(synthesize()) >= 5 * 24000 // 20
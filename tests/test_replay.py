@@ -0,0 +1,49 @@
+import asyncio
+import gzip
+import json
+import os
+
+from replay import replay
+from session_recorder import EVENTS_FILE
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "data", "replay_capture.jsonl")
+
+
+def _capture(directory, drop_state_times: bool = False) -> str:
+    with open(FIXTURE, encoding="utf-8") as f, \
+            gzip.open(directory / EVENTS_FILE, "wt", encoding="utf-8") as out:
+        for line in f:
+            event = json.loads(line)
+            if drop_state_times:
+                event.pop("at", None)
+            out.write(json.dumps(event) + "\n")
+    return str(directory)
+
+
+def test_replay_runs_a_capture_end_to_end(tmp_path):
+    result = asyncio.run(replay(_capture(tmp_path)))
+
+    assert result.language == "en"
+    assert [t.turn for t in result.turns] == [1, 2, 3, 4]
+    assert [t.text for t in result.turns] == [
+        "Can you show me the careers page?", "Okay.", "Okay.",
+        "How much does the web agent cost?"]
+    # Every LLM request matched a recorded stream and the tools ran for real
+    assert result.unmatched_llm_requests == 0
+    assert result.rpcs == 1
+    for t in result.turns:
+        assert t.tool_calls == t.recorded_tool_calls
+    assert result.turns[0].tool_calls == ["navigate_to_section"]
+    assert result.turns[3].tool_calls == ["get_product_info"]
+    assert result.turns[0].reply == "Here is our careers page. It lists every open role."
+    assert result.turns[3].llm_calls == 2
+    assert all(t.latency is not None for t in result.turns if not t.suppressed)
+    # "Okay." over the agent's reply is dropped; after it went quiet it is answered
+    assert [t.suppressed for t in result.turns] == [False, True, False, False]
+    assert result.turns[2].reply == "Great. Anything else you'd like to see?"
+
+
+def test_replay_without_agent_state_treats_acknowledgements_as_talk_over(tmp_path):
+    result = asyncio.run(replay(_capture(tmp_path, drop_state_times=True)))
+
+    assert [t.suppressed for t in result.turns] == [False, True, True, False]
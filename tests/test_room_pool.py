@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import drain
+import room_pool
+from room_pool import RoomPool, WarmRoom
+
+
+class _PoolLoop:
+    """Runs the pool's event loop on a thread, as RoomPool.start does."""
+
+    def __init__(self, pool: RoomPool) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        pool._loop = self.loop
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def test_lease_skips_rooms_without_an_agent(monkeypatch):
+    listening = {"warm-en-live"}
+    deleted = []
+
+    async def agent_listening(api, room):
+        return room in listening
+
+    async def delete_room(api, name):
+        deleted.append(name)
+
+    monkeypatch.setattr(room_pool, "_agent_listening", agent_listening)
+    monkeypatch.setattr(room_pool, "_delete_room", delete_room)
+    pool = RoomPool(["en"])
+    loop = _PoolLoop(pool)
+    try:
+        now = time.monotonic()
+        pool._ready["en"].extend([WarmRoom("warm-en-gone", "en", now), WarmRoom("warm-en-live", "en", now)])
+        assert asyncio.run(pool.lease("en")) == "warm-en-live"
+        # Nothing left: the caller mints a fresh room with dispatch
+        assert asyncio.run(pool.lease("en")) is None
+        stats = pool.stats()
+        assert (stats["leased"], stats["agent_gone"], stats["misses"]) == (1, 1, 1)
+        time.sleep(0.05)
+        assert deleted == ["warm-en-gone"]
+    finally:
+        loop.close()
+
+
+def test_failed_check_falls_back_and_keeps_the_room(monkeypatch):
+    async def agent_listening(api, room):
+        raise ConnectionError("livekit unreachable")
+
+    monkeypatch.setattr(room_pool, "_agent_listening", agent_listening)
+    pool = RoomPool(["en"])
+    loop = _PoolLoop(pool)
+    try:
+        pool._ready["en"].append(WarmRoom("warm-en-1", "en", time.monotonic()))
+        assert asyncio.run(pool.lease("en")) is None
+        assert [r.name for r in pool._ready["en"]] == ["warm-en-1"]
+    finally:
+        loop.close()
+
+
+def test_idle_jobs_hear_about_the_drain(monkeypatch, tmp_path):
+    monkeypatch.setenv(drain.DRAIN_MARKER_ENV, str(tmp_path / "agent.draining"))
+    monkeypatch.setattr(drain, "DRAIN_POLL_INTERVAL", 0.01)
+    load = drain.drain_aware_load(lambda worker: 0.25)
+    worker = SimpleNamespace(draining=False)
+
+    async def main() -> None:
+        waiting = asyncio.ensure_future(drain.wait_for_worker_drain())
+        assert load(worker) == 0.25
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        worker.draining = True
+        load(worker)
+        await asyncio.wait_for(waiting, 1.0)
+
+    asyncio.run(main())
+
+
+def test_default_load_is_the_frameworks(monkeypatch, tmp_path):
+    from livekit.agents.worker import _DefaultLoadCalc
+
+    monkeypatch.setenv(drain.DRAIN_MARKER_ENV, str(tmp_path / "agent.draining"))
+    seen = []
+
+    def get_load(worker):
+        seen.append(worker)
+        return 0.42
+
+    monkeypatch.setattr(_DefaultLoadCalc, "get_load", get_load)
+    load = drain.drain_aware_load()
+    worker = SimpleNamespace(draining=False)
+    assert load(worker) == 0.42
+    assert seen == [worker]
+    assert not drain.worker_draining()
+
+
+class _FakeRoomService:
+    def __init__(self, agent_state: str | None) -> None:
+        self.agent_state = agent_state
+        self.created, self.deleted = [], []
+
+    async def create_room(self, req):
+        self.created.append(req.name)
+
+    async def delete_room(self, req):
+        self.deleted.append(req.room)
+
+    async def list_participants(self, req):
+        attributes = {"lk.agent.state": self.agent_state} if self.agent_state else {}
+        return SimpleNamespace(participants=[SimpleNamespace(attributes=attributes)])
+
+
+class _FakeDispatchService:
+    def __init__(self) -> None:
+        self.dispatches = []
+
+    async def create_dispatch(self, req):
+        self.dispatches.append((req.agent_name, req.room, req.metadata))
+
+
+def _fake_api(agent_state: str | None) -> SimpleNamespace:
+    return SimpleNamespace(room=_FakeRoomService(agent_state), agent_dispatch=_FakeDispatchService())
+
+
+def test_warm_room_is_ready_once_the_agent_listens():
+    pool = RoomPool(["fr"])
+    api = _fake_api("listening")
+    pool._warming["fr"] += 1
+    asyncio.run(pool._warm(api, "fr"))
+    [room] = pool._ready["fr"]
+    assert api.room.created == [room.name]
+    assert api.agent_dispatch.dispatches[0][1] == room.name
+    assert '"warm": true' in api.agent_dispatch.dispatches[0][2]
+    assert pool._warming["fr"] == 0 and pool.stats()["warmed"] == 1
+
+
+def test_room_whose_agent_never_listens_is_deleted(monkeypatch):
+    monkeypatch.setattr(room_pool, "WARM_TIMEOUT", 0.05)
+    monkeypatch.setattr(room_pool, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(room_pool, "RECONCILE_INTERVAL", 0.0)
+    pool = RoomPool(["en"])
+    api = _fake_api("initializing")
+    pool._warming["en"] += 1
+    asyncio.run(pool._warm(api, "en"))
+    assert not pool._ready["en"]
+    assert api.room.deleted == api.room.created
+    assert pool._warming["en"] == 0 and pool.stats()["warm_failed"] == 1
+
+
+def test_reconcile_recycles_expired_rooms_and_follows_demand():
+    pool = RoomPool(["en"], min_size=1, max_size=4, ttl=600)
+
+    async def main() -> None:
+        now = time.monotonic()
+        pool._ready["en"].append(WarmRoom("warm-en-old", "en", now - 601))
+        # A burst of token requests raises the target above the minimum
+        pool._requests["en"].extend([now] * 300)
+        tasks: set[asyncio.Task] = set()
+        pool._warm = lambda api, lang: asyncio.sleep(0)
+        doomed = pool._reconcile(tasks, api=None)
+        await asyncio.gather(*tasks)
+        assert doomed == ["warm-en-old"]
+        assert pool._target("en", now) == 4
+        assert len(tasks) == pool._warming["en"] == 4
+
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import asyncio
+
+import session_density
+import session_store
+from session_density import SessionResources, _sample
+
+
+def test_leaving_alone_does_not_inflate_the_share(monkeypatch):
+    monkeypatch.setattr(session_density, "current_rss_mb", lambda: 1000.0)
+    monkeypatch.setattr(session_density, "current_pss_mb", lambda: 800.0)
+    monkeypatch.setattr(session_density, "_process_sampled_at", 0.0)
+    records = []
+
+    def record(kind, payload):
+        records.append((kind, payload))
+
+    usage = SessionResources("job-a", "thread", 0.0, 0.0)
+
+    async def run() -> None:
+        monkeypatch.setattr(session_density, "active_sessions", lambda: 4)
+        _sample(usage, record)
+        _sample(usage, record)
+        # The last session out samples the process on its own
+        monkeypatch.setattr(session_density, "active_sessions", lambda: 1)
+        _sample(usage, record, final=True)
+
+    asyncio.run(run())
+    assert usage.mean_pss_share_mb == 200.0
+    assert usage.peak_sessions == 4
+    # One process sample per interval however many sessions sample
+    assert [kind for kind, _ in records] == ["process_resources"]
+    assert records[0][1]["sessions"] == 4
+
+
+def test_report_weights_process_samples_by_sessions(tmp_path, capsys):
+    path = str(tmp_path / "sessions.sqlite3")
+    conn = session_store._connect(path)
+    rows = [
+        ("session_resources", {"job_id": "a", "executor": "thread", "peak_sessions": 4, "peak_tasks": 90}),
+        # One session alone at 700 MiB, then four sharing 1100 MiB
+        ("process_resources", {"executor": "thread", "sessions": 1, "pss_mb": 700.0}),
+        ("process_resources", {"executor": "thread", "sessions": 4, "pss_mb": 1100.0}),
+        ("process_resources", {"executor": "thread", "sessions": 4, "pss_mb": 1100.0}),
+    ]
+    with conn:
+        for kind, payload in rows:
+            conn.execute(session_store._INSERT, session_store._row("s", kind, {"payload": payload}))
+    conn.close()
+
+    session_density.report(path, None)
+    line = next(l for l in capsys.readouterr().out.splitlines() if l.startswith("thread"))
+    # (700 + 1100 + 1100) MiB over 9 session-samples
+    assert line.split()[3] == "322"
+    assert line.split()[4] == "3.2"
+
+
+def test_load_takes_cpu_from_the_framework(monkeypatch):
+    from livekit.agents.worker import _DefaultLoadCalc
+
+    monkeypatch.setattr(_DefaultLoadCalc, "get_load", classmethod(lambda cls, worker: 0.6))
+    monkeypatch.setattr(session_density, "active_sessions", lambda: 2)
+    monkeypatch.setattr(session_density, "current_rss_mb", lambda: 100.0)
+    assert session_density.load() == 0.6
+
+    monkeypatch.setattr(session_density, "active_sessions", lambda: session_density.AGENT_MAX_SESSIONS)
+    assert session_density.load() == 1.0
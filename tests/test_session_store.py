@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import sqlite3
+import time
+
+import session_store
+from session_store import SessionStore
+
+RECORDS = 20_000
+# The loop must keep ticking on time while sessions record: audio frames are
+# 10-20ms apart, so a stall longer than one frame is audible
+MAX_P99_LAG = 0.010
+TICK = 0.005
+
+
+def _rows(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _record(store: SessionStore, i: int) -> None:
+    store.record(
+        f"session-{i % 50}", "message", room=f"room-{i % 50}", language="en",
+        role="user", text="how much does the web agent cost " * 4)
+
+
+def test_recording_does_not_stall_the_event_loop(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SessionStore(path)
+    lags: list[float] = []
+
+    async def monitor(done: asyncio.Event) -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+
+    async def run() -> None:
+        done = asyncio.Event()
+        monitor_task = asyncio.create_task(monitor(done))
+        for i in range(RECORDS):
+            _record(store, i)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        done.set()
+        await monitor_task
+        await store.aclose()
+
+    asyncio.run(run())
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1]
+    assert p99 < MAX_P99_LAG, f"loop lag p99 {p99 * 1000:.1f}ms"
+    # A burst past the buffer may drop records, but every one is accounted for
+    assert store.written + store.dropped == RECORDS
+    assert _rows(path) == store.written
+
+
+class _SlowConnection:
+    """A SQLite connection whose batch inserts take `delay` seconds."""
+
+    def __init__(self, conn: sqlite3.Connection, delay: float) -> None:
+        self._conn = conn
+        self.delay = delay
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        time.sleep(self.delay)
+        return self._conn.executemany(sql, rows)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def test_sustained_overload_drops_and_reports(tmp_path, monkeypatch, caplog):
+    connect = session_store._connect
+    monkeypatch.setattr(session_store, "_connect", lambda path: _SlowConnection(connect(path), 0.005))
+    path = str(tmp_path / "sessions.sqlite3")
+    # At most 50 rows per 5ms: the writer drains 10k rows/s at best
+    store = SessionStore(path, max_buffered=500, batch_size=50)
+    sent = 0
+
+    async def run() -> None:
+        nonlocal sent
+        # About 40k records/s for half a second, four times the writer's rate
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            for _ in range(200):
+                _record(store, sent)
+                sent += 1
+            await asyncio.sleep(0.005)
+        await store.aclose()
+
+    with caplog.at_level(logging.WARNING, logger="session_store"):
+        asyncio.run(run())
+
+    assert store.dropped > 0
+    assert store.written + store.dropped == sent
+    assert _rows(path) == store.written
+    assert any("Buffer full, dropped" in r.getMessage() for r in caplog.records)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import socket
+
+import pytest
+
+import turn_service
+from turn_service import SocketInferenceExecutor, _claim_socket
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "turn.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # the file outlives the process that bound it
+    _claim_socket(path)
+    assert not os.path.exists(path)
+
+
+def test_live_socket_is_not_taken_over(tmp_path):
+    path = str(tmp_path / "turn.sock")
+    live = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    live.bind(path)
+    live.listen()
+    try:
+        with pytest.raises(RuntimeError):
+            _claim_socket(path)
+        assert os.path.exists(path)
+    finally:
+        live.close()
+
+
+def test_socket_path_is_per_worker(monkeypatch):
+    monkeypatch.delenv(turn_service.SOCKET_ENV, raising=False)
+    assert turn_service.socket_path().endswith(f"turn-{os.getpid()}.sock")
+    monkeypatch.setenv(turn_service.SOCKET_ENV, "/tmp/pinned.sock")
+    assert turn_service.socket_path() == "/tmp/pinned.sock"
+
+
+def test_executor_round_trip(tmp_path):
+    path = str(tmp_path / "turn.sock")
+
+    async def handle(reader, writer):
+        # Answers like TurnDetectionService, without the model
+        while line := await reader.readline():
+            msg = json.loads(line)
+            result = json.dumps({"eou_probability": 0.9})
+            writer.write(json.dumps({"id": msg["id"], "result": result}).encode() + b"\n")
+        writer.close()
+
+    async def run() -> bytes:
+        server = await asyncio.start_unix_server(handle, path=path)
+        executor = SocketInferenceExecutor(path)
+        result = await executor.do_inference("eou", json.dumps({"chat_ctx": []}).encode())
+        assert executor._read_task is not None and not executor._read_task.done()
+        await executor.aclose()
+        assert executor._read_task is None
+        server.close()
+        await server.wait_closed()
+        return result
+
+    assert json.loads(asyncio.run(run())) == {"eou_probability": 0.9}
+
+
+class _FakeTokenizer:
+    pad_token_id = 0
+
+    def apply_chat_template(self, chat_ctx, **kwargs):
+        return "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in chat_ctx)
+
+    def __call__(self, text, add_special_tokens, max_length, truncation, return_tensors=None):
+        import numpy as np
+
+        ids = [ord(c) % 50 + 1 for c in text][-max_length:]
+        return {"input_ids": np.array([ids]) if return_tensors == "np" else ids}
+
+
+class _FakeSession:
+    """A causal model: each position's score depends only on the tokens up to it."""
+
+    def __init__(self, per_position: bool) -> None:
+        self.per_position = per_position
+        self.calls = 0
+
+    def run(self, output_names, inputs):
+        import numpy as np
+
+        self.calls += 1
+        ids = inputs["input_ids"]
+        scores = (np.cumsum((ids + 1) * np.arange(1, ids.shape[1] + 1), axis=1) % 97) / 97
+        return [scores if self.per_position else scores[:, -1:]]
+
+
+def _fake_runner(per_position: bool):
+    from livekit.plugins.turn_detector.base import _EUORunnerBase
+
+    runner = turn_service._make_runner_class()()
+    runner._tokenizer = _FakeTokenizer()
+    runner._session = _FakeSession(per_position)
+    runner._per_position = per_position
+    runner._pad_id = 0
+    return runner, _EUORunnerBase.run
+
+
+def _request(*turns: str) -> bytes:
+    roles = ["assistant", "user"] * len(turns)
+    return json.dumps({"chat_ctx": [
+        {"role": role, "content": text} for role, text in zip(roles[-len(turns):], turns)
+    ]}).encode()
+
+
+@pytest.mark.parametrize("per_position", [True, False])
+def test_batch_matches_single_requests(per_position):
+    runner, run_one = _fake_runner(per_position)
+    datas = [
+        _request("how much is it"),
+        _request("Hello! How can I help?", "I was wondering about the web agent"),
+        _request("and"),
+        _request("what about"),  # same length as another, shares its batch when unpadded
+        _request("what abort"),
+        # Fails while being formatted: a message without content
+        json.dumps({"chat_ctx": [{"role": "user"}]}).encode(),
+    ]
+    results = runner.run_batch(datas)
+    assert isinstance(results[-1], KeyError)
+    for data, result in zip(datas[:-1], results):
+        expected = json.loads(run_one(runner, data))
+        got = json.loads(result)
+        assert got["input"] == expected["input"]
+        assert got["eou_probability"] == pytest.approx(expected["eou_probability"])
@@ -2,6 +2,8 @@ from livekit.agents import function_tool, RunContext
 import logging
 import json
 
+import page_index
+
 logger = logging.getLogger(__name__)
 
 # Product catalog — loaded once, served on-demand via tool call instead of
@@ -92,6 +94,36 @@ async def get_product_info(product: str) -> str:
     return f"{info['name']}: {info['description']} Capabilities: {caps}. Best for: {fits}."
 
 
+# Map sections to (path, section_id, description)
+# path = React Router path, section_id = optional id for scroll within that page.
+# What each one shows is described in page_index.PAGES.
+# Home ("/") has NO sections — it's just the avatar landing.
+SECTION_MAP: dict[str, tuple[str, str | None, str]] = {
+    "home": ("/", None, "home page (avatar landing)"),
+    "about": ("/about", None, "About page"),
+    "vision": ("/about", None, "About page (includes company vision)"),
+    "ai-assistants": ("/ai-assistants", None, "AI Assistants page"),
+    "teams": ("/ai-assistants", None, "AI Assistants page"),
+    "products": ("/ai-assistants", None, "AI Assistants page (product overview)"),
+    "voice": ("/ai-assistants", None, "AI Assistants page (Voice/Calling Agent)"),
+    "calling": ("/ai-assistants", None, "AI Assistants page (Voice/Calling Agent)"),
+    "web": ("/ai-assistants", None, "AI Assistants page (Web Agent)"),
+    "whatsapp": ("/ai-assistants", None, "AI Assistants page (WhatsApp Agent)"),
+    "meet-assistants": ("/ai-assistants", None, "AI Assistants page"),
+    "demo": ("/ai-assistants", "demo", "Featured Real Estate Demo section"),
+    "ai-workforce": ("/ai-assistants", "ai-workforce", "AI Workforce grid"),
+    "whatsapp-agent": ("/ai-assistants", "whatsapp-agent", "WhatsApp Agent details section"),
+    "web-agent": ("/ai-assistants", "web-agent", "Web Agent details section"),
+    "industries": ("/ai-assistants", "industries", "Industries section"),
+    "services": ("/solutions", None, "Solutions page"),
+    "solutions": ("/solutions", None, "Solutions page"),
+    "additional-services": ("/solutions", None, "Solutions page"),
+    "testimonials": ("/about", None, "About page (includes testimonials)"),
+    "careers": ("/careers", None, "Careers page"),
+    "blog": ("/blog", None, "Blog page"),
+}
+
+
 def _get_room_and_remote_identity(context: RunContext):
     """Helper to extract room and remote participant identity from context."""
     if not (hasattr(context, 'session') and hasattr(context.session, '_room_io')):
@@ -104,6 +136,14 @@ def _get_room_and_remote_identity(context: RunContext):
     return room, remote_identity
 
 
+def _session_language(context: RunContext) -> str:
+    """Session language set by the entrypoint, defaulting to English."""
+    try:
+        return context.userdata.get("language", "en")
+    except (AttributeError, ValueError):
+        return "en"
+
+
 @function_tool
 async def open_url(url: str, context: RunContext) -> str:
     """
@@ -144,9 +184,6 @@ async def navigate_to_section(section: str, context: RunContext) -> str:
     Navigate to a page on the Autonomiq website.
     Use for all internal navigation. Ask permission first.
 
-    The home page is a fullscreen 3D avatar landing — it has NO content sections.
-    All content lives on separate pages.
-
     section must be one of: home, about, ai-assistants, teams, voice, calling,
     web, whatsapp, demo, ai-workforce, whatsapp-agent, web-agent, industries,
     solutions, additional-services, careers, blog.
@@ -154,40 +191,12 @@ async def navigate_to_section(section: str, context: RunContext) -> str:
     section = section.lower().strip()
     logger.info(f"[TOOL] navigate_to_section called with section: {section}")
 
-    # Map sections to (path, section_id, description)
-    # path = React Router path, section_id = optional id for scroll within that page
-    # Home ("/") has NO sections — it's just the avatar landing.
-    section_map = {
-        "home": ("/", None, "home page (avatar landing)"),
-        "about": ("/about", None, "About page"),
-        "vision": ("/about", None, "About page (includes company vision)"),
-        "ai-assistants": ("/ai-assistants", None, "AI Assistants page"),
-        "teams": ("/ai-assistants", None, "AI Assistants page"),
-        "products": ("/ai-assistants", None, "AI Assistants page (product overview)"),
-        "voice": ("/ai-assistants", None, "AI Assistants page (Voice/Calling Agent)"),
-        "calling": ("/ai-assistants", None, "AI Assistants page (Voice/Calling Agent)"),
-        "web": ("/ai-assistants", None, "AI Assistants page (Web Agent)"),
-        "whatsapp": ("/ai-assistants", None, "AI Assistants page (WhatsApp Agent)"),
-        "meet-assistants": ("/ai-assistants", None, "AI Assistants page"),
-        "demo": ("/ai-assistants", "demo", "Featured Real Estate Demo section"),
-        "ai-workforce": ("/ai-assistants", "ai-workforce", "AI Workforce grid"),
-        "whatsapp-agent": ("/ai-assistants", "whatsapp-agent", "WhatsApp Agent details section"),
-        "web-agent": ("/ai-assistants", "web-agent", "Web Agent details section"),
-        "industries": ("/ai-assistants", "industries", "Industries section"),
-        "services": ("/solutions", None, "Solutions page"),
-        "solutions": ("/solutions", None, "Solutions page"),
-        "additional-services": ("/solutions", None, "Solutions page"),
-        "testimonials": ("/about", None, "About page (includes testimonials)"),
-        "careers": ("/careers", None, "Careers page"),
-        "blog": ("/blog", None, "Blog page"),
-    }
-
-    if section not in section_map:
-        available = ", ".join(section_map.keys())
+    if section not in SECTION_MAP:
+        available = ", ".join(SECTION_MAP.keys())
         logger.warning(f"[TOOL] Unknown section: {section}")
         return f"Unknown section '{section}'. Available sections: {available}"
 
-    path, section_id, description = section_map[section]
+    path, section_id, description = SECTION_MAP[section]
     logger.info(f"[TOOL] Mapped to path={path}, section_id={section_id}")
 
     try:
@@ -214,7 +223,9 @@ async def navigate_to_section(section: str, context: RunContext) -> str:
             payload=json.dumps(payload_data)
         )
         logger.info(f"[TOOL] RPC navigate sent for section: {section}")
-        return f"SUCCESS: Navigating to {description}. Now describe what the user should see on this page and guide them through the content."
+        page_notes = page_index.describe(path, section_id, _session_language(context))
+        return (f"SUCCESS: Navigating to {description}. On this page: {page_notes} "
+                "Describe it briefly in your own words and guide them through the content.")
     except Exception as e:
         logger.error(
             f"[TOOL] Error in navigate_to_section: {str(e)}", exc_info=True)
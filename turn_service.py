@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Shared, batched end-of-turn inference for every session on a worker.
+
+The worker process hosts one `TurnDetectionService` on a Unix socket of its
+own, `turn-<worker pid>.sock` in RUN_DIR, and passes the path to its job
+processes in TURN_SERVICE_SOCKET, so several workers can share a host. Each
+session's `BatchedTurnDetector` sends its end-of-utterance requests there; the
+service collects requests from all sessions into micro-batches (bounded by
+`TURN_SERVICE_MAX_BATCH` and `TURN_SERVICE_MAX_WAIT_MS`) and runs them on one
+ONNX session with `TURN_SERVICE_THREADS` intra-op threads.
+
+It replaces the framework's inference process for the multilingual model,
+which answers one request at a time.
+
+    python turn_service.py bench --sessions 1 10 50
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from drain import RUN_DIR
+
+logger = logging.getLogger(__name__)
+
+TURN_SERVICE_ENABLED = os.getenv("TURN_SERVICE_ENABLED", "1") not in ("0", "false", "no")
+TURN_SERVICE_MAX_BATCH = int(os.getenv("TURN_SERVICE_MAX_BATCH", "16"))
+TURN_SERVICE_MAX_WAIT_MS = float(os.getenv("TURN_SERVICE_MAX_WAIT_MS", "10"))
+TURN_SERVICE_THREADS = int(os.getenv(
+    "TURN_SERVICE_THREADS", str(max(1, min((os.cpu_count() or 2) // 2, 4)))))
+
+# Stats are logged at this interval while the service is busy
+STATS_INTERVAL = 60.0
+
+# Set by the worker for its job processes; set it beforehand to pin the path
+SOCKET_ENV = "TURN_SERVICE_SOCKET"
+
+
+def socket_path() -> str:
+    """This worker's service socket: inherited by job processes, else per worker PID."""
+    return os.getenv(SOCKET_ENV) or os.path.join(RUN_DIR, f"turn-{os.getpid()}.sock")
+
+
+def _claim_socket(path: str) -> None:
+    """Remove a stale socket file, but never one another service is listening on."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"{path} is in use by another turn service")
+
+
+def _remove_socket(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _make_runner_class():
+    # Deferred: importing the plugin pulls in onnxruntime and transformers
+    import numpy as np
+    from livekit.plugins.turn_detector.base import MAX_HISTORY_TOKENS, _download_from_hf_hub
+    from livekit.plugins.turn_detector.models import HG_MODEL, ONNX_FILENAME
+    from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+    class BatchedEOURunner(_EUORunnerMultilingual):
+        """The multilingual EOU model, evaluated on several contexts per call."""
+
+        def initialize_with_threads(self, num_threads: int) -> None:
+            import onnxruntime as ort
+
+            self.initialize()
+            # Rebuild the session with our thread count; the base class sizes
+            # it for one request at a time.
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = num_threads
+            opts.inter_op_num_threads = 1
+            opts.add_session_config_entry("session.dynamic_block_base", "4")
+            path = _download_from_hf_hub(
+                HG_MODEL, ONNX_FILENAME, subfolder="onnx",
+                revision=self.model_revision(), local_files_only=True)
+            self._session = ort.InferenceSession(
+                path, providers=["CPUExecutionProvider"], sess_options=opts)
+            # The model scores every position when its output keeps the
+            # sequence axis; then right-padded batches are exact (the model is
+            # causal). Otherwise only equal-length inputs can share a batch.
+            probe = self._session.run(None, {"input_ids": np.array([[1, 2, 3]], dtype=np.int64)})
+            self._per_position = probe[0].size == 3
+            self._pad_id = self._tokenizer.pad_token_id or 0
+
+        def run_batch(self, datas: list[bytes]) -> list[bytes | Exception]:
+            """One result per request, as `run` would return it, or the
+            exception that request raised; the others are unaffected."""
+            started = time.perf_counter()
+            results: list[bytes | Exception] = [b""] * len(datas)
+            texts: dict[int, str] = {}
+            ids: dict[int, list[int]] = {}
+            for i, data in enumerate(datas):
+                try:
+                    texts[i] = self._format_chat_ctx(json.loads(data)["chat_ctx"])
+                    ids[i] = self._tokenizer(
+                        texts[i], add_special_tokens=False, max_length=MAX_HISTORY_TOKENS,
+                        truncation=True)["input_ids"]
+                except Exception as e:
+                    results[i] = e
+            probs: dict[int, float] = {}
+            if self._per_position:
+                groups = [list(ids)] if ids else []
+            else:
+                by_len: dict[int, list[int]] = {}
+                for i, seq in ids.items():
+                    by_len.setdefault(len(seq), []).append(i)
+                groups = list(by_len.values())
+
+            for group in groups:
+                width = max(len(ids[i]) for i in group)
+                batch = np.full((len(group), width), self._pad_id, dtype=np.int64)
+                for row, i in enumerate(group):
+                    batch[row, :len(ids[i])] = ids[i]
+                out = self._session.run(None, {"input_ids": batch})[0].reshape(len(group), -1)
+                for row, i in enumerate(group):
+                    col = len(ids[i]) - 1 if self._per_position else -1
+                    probs[i] = float(out[row, col])
+
+            duration = round(time.perf_counter() - started, 3)
+            for i, p in probs.items():
+                results[i] = json.dumps(
+                    {"eou_probability": p, "duration": duration, "input": texts[i]}).encode()
+            return results
+
+    return BatchedEOURunner
+
+
+class TurnDetectionService:
+    """Unix-socket server that micro-batches end-of-utterance requests."""
+
+    def __init__(
+        self,
+        path: str | None = None,
+        max_batch: int = TURN_SERVICE_MAX_BATCH,
+        max_wait: float = TURN_SERVICE_MAX_WAIT_MS / 1000,
+        num_threads: int = TURN_SERVICE_THREADS,
+    ) -> None:
+        self.path = path or socket_path()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.num_threads = num_threads
+        self.ready = threading.Event()
+        self.requests = 0
+        self.batches = 0
+        self.connections = 0
+        self.latencies: deque[float] = deque(maxlen=5000)
+        self._queue: asyncio.Queue | None = None
+        # One inference at a time; parallelism comes from intra-op threads
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turn-service")
+        self._runner: Any = None
+        self._server: asyncio.AbstractServer | None = None
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        runner = _make_runner_class()()
+        await loop.run_in_executor(self._executor, runner.initialize_with_threads, self.num_threads)
+        self._runner = runner
+        self._queue = asyncio.Queue()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        _claim_socket(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=2**20)
+        atexit.register(_remove_socket, self.path)
+        logger.info(
+            f"[TURN] Service listening on {self.path} (max_batch={self.max_batch}, "
+            f"max_wait={self.max_wait * 1000:.0f}ms, threads={self.num_threads}, "
+            f"padded={runner._per_position})")
+        self.ready.set()
+        await asyncio.gather(self._batch_loop(), self._stats_loop())
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        self.connections += 1
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                fut = loop.create_future()
+                fut.add_done_callback(lambda f, rid=msg["id"]: self._reply(writer, rid, f))
+                if not json.loads(msg["data"]).get("chat_ctx"):
+                    # Rejected here so one bad request cannot fail a whole batch
+                    fut.set_exception(ValueError("chat_ctx is required on the inference input data"))
+                    continue
+                self._queue.put_nowait((time.perf_counter(), msg["data"].encode(), fut))
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.warning(f"[TURN] Dropping client connection: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, rid: int, fut: asyncio.Future) -> None:
+        if writer.is_closing():
+            return
+        if fut.exception() is not None:
+            msg = {"id": rid, "error": str(fut.exception())}
+        else:
+            msg = {"id": rid, "result": fut.result().decode()}
+        writer.write(json.dumps(msg).encode() + b"\n")
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            # Each session has at most one turn pending, so once every connected
+            # session is in the batch there is nothing left to wait for.
+            while len(batch) < min(self.max_batch, self.connections):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._runner.run_batch, [data for _, data, _ in batch])
+            except Exception as e:
+                logger.exception("[TURN] Batch inference failed")
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            now = time.perf_counter()
+            self.batches += 1
+            self.requests += len(batch)
+            for (queued_at, _, fut), result in zip(batch, results):
+                self.latencies.append(now - queued_at)
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+
+    async def _stats_loop(self) -> None:
+        last_requests = 0
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            if self.requests == last_requests:
+                continue
+            stats = self.stats()
+            logger.info(
+                f"[TURN] {self.requests - last_requests} requests in {STATS_INTERVAL:.0f}s, "
+                f"mean batch {stats['mean_batch']:.1f}, p50 {stats['p50_ms']:.1f}ms, "
+                f"p99 {stats['p99_ms']:.1f}ms")
+            last_requests = self.requests
+
+    def stats(self) -> dict[str, float]:
+        ordered = sorted(self.latencies)
+
+        def pct(q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+        }
+
+
+def start_service_thread(service: TurnDetectionService | None = None) -> TurnDetectionService:
+    """Run the service on its own event loop in a daemon thread."""
+    service = service or TurnDetectionService()
+
+    def _run() -> None:
+        try:
+            asyncio.run(service.serve())
+        except Exception:
+            logger.exception("[TURN] Service stopped")
+
+    threading.Thread(target=_run, name="turn-service", daemon=True).start()
+    return service
+
+
+def install_worker_service() -> TurnDetectionService:
+    """Start the shared service in the worker and retire the framework's own
+    turn-detector runners, so its inference process is not started at all."""
+    from livekit.agents.inference_runner import _InferenceRunner
+    from livekit.plugins.turn_detector.english import _EUORunnerEn
+    from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+    # The English runner is registered by the plugin package but never used here
+    for runner in (_EUORunnerMultilingual, _EUORunnerEn):
+        _InferenceRunner.registered_runners.pop(runner.INFERENCE_METHOD, None)
+    path = socket_path()
+    # Job processes are started after this, so they all inherit the path
+    os.environ[SOCKET_ENV] = path
+    return start_service_thread(TurnDetectionService(path))
+
+
+class SocketInferenceExecutor:
+    """`InferenceExecutor` that forwards requests to the worker's service."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self._path = path or socket_path()
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._connect_lock = asyncio.Lock()
+
+    async def do_inference(self, method: str, data: bytes) -> bytes | None:
+        await self._ensure_connected()
+        self._next_id += 1
+        rid = self._next_id
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        try:
+            self._writer.write(json.dumps({"id": rid, "data": data.decode()}).encode() + b"\n")
+            return await fut
+        finally:
+            self._pending.pop(rid, None)
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+
+    async def _ensure_connected(self) -> None:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, self._writer = await asyncio.open_unix_connection(self._path, limit=2**20)
+            # Held here: the loop only keeps a weak reference to running tasks
+            self._read_task = asyncio.create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                fut = self._pending.get(msg["id"])
+                if fut is None or fut.done():
+                    continue  # the caller timed out already
+                if "error" in msg:
+                    fut.set_exception(RuntimeError(msg["error"]))
+                else:
+                    fut.set_result(msg["result"].encode())
+        finally:
+            self._writer = None
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("turn service connection lost"))
+
+
+def make_turn_detector() -> Any:
+    """Turn detector for a new session: a thin client of the shared service
+    when it is enabled, otherwise the framework's MultilingualModel."""
+    from livekit.agents import get_job_context
+    from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+    if not TURN_SERVICE_ENABLED:
+        return MultilingualModel()
+
+    class BatchedTurnDetector(MultilingualModel):
+        def __init__(self) -> None:
+            super().__init__()
+            self._executor = SocketInferenceExecutor()
+
+    detector = BatchedTurnDetector()
+    get_job_context().add_shutdown_callback(detector._executor.aclose)
+    return detector
+
+
+# ── Benchmark ──
+
+
+_SAMPLE_TURNS = [
+    ("assistant", "Hey there! Welcome to Autonomiq. What are you curious about?"),
+    ("user", "I run a small real estate agency and we miss a lot of calls"),
+    ("assistant", "Our telecalling agent can answer every call around the clock. Want to hear how?"),
+    ("user", "yes and can it also book viewings for"),
+]
+
+
+async def _bench_sessions(path: str, sessions: int, requests_per_session: int) -> float:
+    latencies: list[float] = []
+
+    async def session(n: int) -> None:
+        executor = SocketInferenceExecutor(path)
+        for i in range(requests_per_session):
+            turns = _SAMPLE_TURNS[: 2 + (n + i) % 3]
+            data = json.dumps({"chat_ctx": [{"role": r, "content": c} for r, c in turns]}).encode()
+            started = time.perf_counter()
+            await executor.do_inference("eou", data)
+            latencies.append(time.perf_counter() - started)
+        await executor.aclose()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+    print(f"  {sessions:>3} sessions: {len(latencies) / elapsed:>7.1f} req/s, "
+          f"p50 {ordered[len(ordered) // 2] * 1000:>6.1f}ms, p99 {p99:>6.1f}ms")
+    return p99
+
+
+def _bench(args: argparse.Namespace) -> None:
+    from startup_profile import current_rss_mb
+
+    for max_batch in (1, args.max_batch):
+        label = "unbatched" if max_batch == 1 else f"batched (max {max_batch})"
+        path = os.path.join(RUN_DIR, f"turn-bench-{max_batch}.sock")
+        rss_before = current_rss_mb()
+        service = start_service_thread(TurnDetectionService(
+            path, max_batch=max_batch, max_wait=args.max_wait_ms / 1000,
+            num_threads=args.threads))
+        if not service.ready.wait(120):
+            raise SystemExit("turn service failed to start (are the model files downloaded?)")
+        print(f"{label}: model RSS {current_rss_mb() - rss_before:.0f} MiB, "
+              f"threads={args.threads}")
+        for sessions in args.sessions:
+            asyncio.run(_bench_sessions(path, sessions, args.requests))
+        print(f"  mean batch size {service.stats()['mean_batch']:.1f}")
+
+    print("Shared service: one model copy per worker, no separate inference process.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared end-of-turn inference service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="throughput and p99 at several session counts")
+    bench.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    bench.add_argument("--requests", type=int, default=20, help="requests per session")
+    bench.add_argument("--max-batch", type=int, default=TURN_SERVICE_MAX_BATCH)
+    bench.add_argument("--max-wait-ms", type=float, default=TURN_SERVICE_MAX_WAIT_MS)
+    bench.add_argument("--threads", type=int, default=TURN_SERVICE_THREADS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    _bench(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,29 @@
 import os
-from livekit.api import AccessToken, VideoGrants, LiveKitAPI, ListRoomsRequest, WebhookReceiver
+from livekit.api import (
+    AccessToken,
+    VideoGrants,
+    LiveKitAPI,
+    ListRoomsRequest,
+    RoomAgentDispatch,
+    RoomConfiguration,
+    WebhookReceiver,
+)
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 from flask_cors import CORS
+import json
 import uuid
 import datetime
 import logging
 import signal
 import sys
 import atexit
+import threading
+import time
+import _thread
+from dispatch import AGENT_NAME, EXPLICIT_DISPATCH, session_metadata
+from drain import TOKEN_SERVER_DRAIN_GRACE, write_pid_file
+from room_pool import ROOM_POOL_ENABLED, ROOM_POOL_LANGUAGES, RoomPool
 
 # Set up logging
 logging.basicConfig(
@@ -24,18 +39,38 @@ app = Flask(__name__)
 # Global variable to track server state
 server_running = True
 
+# Agent-warmed rooms handed out by /getToken (ROOM_POOL=1)
+room_pool = RoomPool(ROOM_POOL_LANGUAGES) if ROOM_POOL_ENABLED else None
+
+# Drain state: once set, /getToken refuses new visitors and /health reports
+# "draining" until the process exits TOKEN_SERVER_DRAIN_GRACE seconds later.
+draining = False
+drain_started_at = None
+rejected_during_drain = 0
+
 
 def signal_handler(signum, frame):
-    """Handle shutdown signals gracefully"""
-    global server_running
+    """Enter drain mode on the first signal, exit immediately on the second"""
+    global server_running, draining, drain_started_at
+    if draining:
+        logger.info(f"Received signal {signum} while draining. Exiting now...")
+        server_running = False
+        sys.exit(0)
     logger.info(
-        f"Received signal {signum}. Initiating graceful server shutdown...")
-    server_running = False
-    sys.exit(0)
+        f"Received signal {signum}. Draining for {TOKEN_SERVER_DRAIN_GRACE}s before shutdown...")
+    draining = True
+    drain_started_at = time.monotonic()
+    # Raise KeyboardInterrupt in the main thread once in-flight requests are done
+    timer = threading.Timer(TOKEN_SERVER_DRAIN_GRACE, _thread.interrupt_main)
+    timer.daemon = True
+    timer.start()
 
 
 def cleanup():
     """Cleanup function called on exit"""
+    if room_pool is not None:
+        # Unleased warm rooms would otherwise keep their agents until they time out
+        room_pool.close()
     logger.info("Server cleanup completed")
 
 
@@ -93,25 +128,48 @@ async def get_rooms():
 def health_check():
     """Health check endpoint for load balancers and monitoring"""
     logger.info("Health check endpoint called")
-    return jsonify({"status": "healthy", "service": "avatar-backend"}), 200
+    if draining:
+        return jsonify({
+            "status": "draining",
+            "service": "avatar-backend",
+            "drain_elapsed_s": round(time.monotonic() - drain_started_at, 1),
+            "rejected_tokens": rejected_during_drain,
+        }), 503
+    status = {"status": "healthy", "service": "avatar-backend"}
+    if room_pool is not None:
+        status["room_pool"] = room_pool.stats()
+    return jsonify(status), 200
 
 
 @app.route("/getToken")
 async def get_token():
+    global rejected_during_drain
     logger.info("getToken endpoint called")
+    if draining:
+        rejected_during_drain += 1
+        logger.info("Rejecting token request: server is draining")
+        return jsonify({"error": "Server is restarting, please retry"}), 503, {"Retry-After": "5"}
     try:
         name = request.args.get("name", "my name")
         room = request.args.get("room", None)
-        language = request.args.get("language", "en")
-
-        # Validate language parameter
-        if language not in ("en", "ar", "fr"):
-            language = "en"
+        # Validates the language and stamps the issue time for dispatch timing
+        metadata = session_metadata(
+            request.args.get("language", "en"),
+            campaign=request.args.get("campaign"),
+            page=request.args.get("page"),
+        )
+        language = metadata["language"]
 
         logger.info(
-            f"Token request - Name: {name}, Room: {room}, Language: {language}")
-
-        if not room:
+            f"Token request - Name: {name}, Room: {room}, Language: {language}, "
+            f"Campaign: {metadata['campaign']}, Page: {metadata['page']}")
+
+        # A warm room already has its agent listening; no dispatch needed
+        leased = await room_pool.lease(language) if room_pool is not None and not room else None
+        if leased:
+            room = leased
+            logger.info(f"Leased warm room: {room}")
+        elif not room:
             logger.info("No room specified, generating new room name")
             room = await generate_room_name()
             logger.info(f"Generated room name: {room}")
@@ -141,8 +199,17 @@ async def get_token():
                 room_list=False,
                 room_admin=False,
             ))\
-            .with_attributes({"language": language})\
+            .with_attributes({
+                # The agent in a warm room reads the session settings from here
+                key: str(value) for key, value in metadata.items() if value is not None
+            })\
             .with_ttl(datetime.timedelta(hours=1))
+        if EXPLICIT_DISPATCH and not leased:
+            # Dispatch the agent when the room is created, with the session
+            # settings readable before it connects
+            token = token.with_room_config(RoomConfiguration(agents=[
+                RoomAgentDispatch(agent_name=AGENT_NAME, metadata=json.dumps(metadata)),
+            ]))
 
         jwt_token = token.to_jwt()
         logger.info(
@@ -200,7 +267,12 @@ async def livekit_webhook():
 if __name__ == "__main__":
     try:
         logger.info("Starting Flask server on host 0.0.0.0, port 5001")
-        app.run(host="0.0.0.0", port=5001, debug=True)
+        write_pid_file("server")
+        if room_pool is not None:
+            room_pool.start()
+        # No reloader: its parent process would own the PID file but not the
+        # server, and could not be drained.
+        app.run(host="0.0.0.0", port=5001, debug=True, use_reloader=False)
     except KeyboardInterrupt:
         logger.info("Server interrupted by user")
     except Exception as e: